@@ -0,0 +1,2 @@
+# Loads .env and the settings before any other module of the app
+from . import config  # noqa: F401
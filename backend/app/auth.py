@@ -1,26 +1,59 @@
-import os
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone # Agregamos timezone
+from functools import lru_cache
 from jose import jwt
-from passlib.context import CryptContext
-from dotenv import load_dotenv
 
-load_dotenv()
+from .cache import TTLCache
+from .config import settings
 
 
-SECRET_KEY = os.getenv("SECRET_KEY", "tu_clave_secreta_provisional_123")
-ALGORITHM = os.getenv("ALGORITHM", "HS256") 
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+# Users loaded for endpoints that need the full row; 0 disables the cache
+USER_CACHE_TTL_SECONDS = settings.user_cache_ttl_seconds
+
+user_cache = TTLCache(ttl=USER_CACHE_TTL_SECONDS, maxsize=10000)
+
+
+@dataclass(frozen=True)
+class TokenUser:
+    """Identity carried by the JWT itself, usable without a DB query."""
+
+    id: int
+    user_name: str
+    email: str
+
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """The bcrypt context, built on first use (the lifespan warm-up builds it
+    off the event loop) instead of when the app is imported."""
+    from passlib.context import CryptContext
+
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    # Loads and self-tests the bcrypt backend now rather than on the first hash
+    context.handler().get_backend()
+    return context
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
\ No newline at end of file
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+def create_user_token(user) -> str:
+    return create_access_token(
+        data={"sub": user.email, "uid": user.id, "name": user.user_name}
+    )
+
+def decode_access_token(token: str) -> dict:
+    """Raises jose.JWTError when the token is invalid or expired."""
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -0,0 +1,138 @@
+"""Streaming parser and chunked inserter for the bulk ingestion endpoints.
+
+Bodies are either a JSON array or NDJSON (one object per line). NDJSON is read
+from the request stream as it arrives and inserted every BULK_CHUNK_SIZE items,
+so a large import never has to be held in memory at once. Invalid items are
+reported by position and skipped; the valid ones are committed together.
+"""
+import json
+
+from fastapi import HTTPException, Request, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.exc import IntegrityError
+
+from . import crud_async
+from .config import settings
+
+BULK_CHUNK_SIZE = settings.bulk_chunk_size
+BULK_MAX_ITEMS = settings.bulk_max_items
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+def describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'item'}: {item['msg']}"
+        for item in error.errors()
+    )
+
+
+async def iter_items(request: Request):
+    """Yields (index, raw) pairs: raw is bytes (NDJSON line) or a parsed object."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_TYPES:
+        index = 0
+        pending = b""
+        async for chunk in request.stream():
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, line
+                    index += 1
+        if pending.strip():
+            yield index, pending
+        return
+
+    try:
+        items = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="JSON inválido"
+        )
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Se esperaba una lista JSON o NDJSON",
+        )
+    for index, item in enumerate(items):
+        yield index, item
+
+
+def parse(schema: type[BaseModel], raw):
+    if isinstance(raw, bytes):
+        return schema.model_validate_json(raw)
+    return schema.model_validate(raw)
+
+
+async def ingest(
+    request: Request, db, schema, to_row, insert, prepare=None, throttle=None
+):
+    """Validates the items of `request` against `schema` and inserts them with
+    `insert` (a crud_async bulk function) in chunks, all in one transaction
+    that the caller commits (with its jobs, see jobs.commit).
+
+    `to_row` maps a validated item to its column values. `prepare`, if given,
+    receives each chunk of (index, item) pairs and returns the errors of items
+    that must be dropped before inserting (e.g. unknown foreign keys). With
+    `prepare`, `insert` must run in a savepoint: a chunk whose insert still hits
+    an IntegrityError is checked again and retried once, and the items that
+    keep failing are reported as errors.
+    `throttle`, if given, is awaited before every chunk after the first (the
+    route's rate limit pays for the first one) and may raise to stop the batch."""
+    ids, errors, chunk = [], [], []
+    flushed = 0
+
+    async def flush():
+        nonlocal flushed
+        if not chunk:
+            return
+        if throttle is not None and flushed:
+            await throttle()
+        flushed += 1
+        valid = await drop_rejected(chunk)
+        try:
+            ids.extend(await insert(db, [to_row(item) for _, item in valid]))
+        except IntegrityError:
+            if prepare is None:
+                raise
+            # A row checked by `prepare` went away before the INSERT (`insert`
+            # runs each chunk in a savepoint): check again and retry once
+            valid = await drop_rejected(valid)
+            try:
+                ids.extend(await insert(db, [to_row(item) for _, item in valid]))
+            except IntegrityError:
+                errors.extend(
+                    {"index": index, "detail": "Conflicto de integridad al insertar"}
+                    for index, _ in valid
+                )
+        chunk.clear()
+
+    async def drop_rejected(pairs):
+        if prepare is None:
+            return pairs
+        rejected = await prepare(pairs)
+        errors.extend(rejected)
+        dropped = {error["index"] for error in rejected}
+        return [(index, item) for index, item in pairs if index not in dropped]
+
+    try:
+        async for index, raw in iter_items(request):
+            if index >= BULK_MAX_ITEMS:
+                raise HTTPException(
+                    status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                    detail=f"Máximo {BULK_MAX_ITEMS} elementos por lote",
+                )
+            try:
+                chunk.append((index, parse(schema, raw)))
+            except ValidationError as error:
+                errors.append({"index": index, "detail": describe(error)})
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                await flush()
+        await flush()
+    except BaseException:
+        await crud_async.rollback(db)
+        raise
+
+    errors.sort(key=lambda error: error["index"])
+    return {"inserted": len(ids), "ids": ids, "errors": errors}
@@ -0,0 +1,68 @@
+"""HTTP validators (ETag / Last-Modified) for list pages.
+
+They are computed from the rows the query returned (ids, timestamps and
+counters), not from the serialized body, so a request whose ETag still
+match is answered with 304 before any JSON is built.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+from fastapi import Request, Response, status
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; its CURRENT_TIMESTAMP is UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def page_validators(rows, *extra: str, scope: str = "") -> tuple[str, str | None]:
+    """(ETag, Last-Modified) of a page. The ETag covers the id, created_at and
+    updated_at of every row plus the `extra` columns (e.g. comment_count, which
+    changes without touching updated_at); deletions change it too because the
+    id list changes. `scope` adds whatever else shapes the response besides the
+    rows. Last-Modified is the newest created_at/updated_at, informative only:
+    it cannot see deletions or counter changes, so it never produces a 304."""
+    digest = hashlib.sha1(scope.encode())
+    newest = None
+    for row in rows:
+        digest.update(repr((row.id, row.created_at, row.updated_at)).encode())
+        for name in extra:
+            digest.update(repr(getattr(row, name)).encode())
+        for value in (row.created_at, row.updated_at):
+            if value is not None and (newest is None or _utc(value) > newest):
+                newest = _utc(value)
+    # Weak: compression encodes the same page into different bytes
+    etag = 'W/"' + digest.hexdigest() + '"'
+    return etag, format_datetime(newest, usegmt=True) if newest else None
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    # Weak comparison (RFC 9110 8.8.3.2), the one If-None-Match uses
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def is_fresh(request: Request, etag: str) -> bool:
+    # Only If-None-Match: If-Modified-Since would answer 304 for a list that
+    # lost a row or whose comment_count changed, since neither moves
+    # Last-Modified. Ignoring it is allowed (RFC 9110 13.1.3)
+    return etag_matches(request, etag)
+
+
+def headers(etag: str, last_modified: str | None, next_cursor: str | None = None):
+    result = {"ETag": etag}
+    if last_modified:
+        result["Last-Modified"] = last_modified
+    if next_cursor:
+        result["X-Next-Cursor"] = next_cursor
+    return result
+
+
+def not_modified(response_headers: dict) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=response_headers)
@@ -0,0 +1,169 @@
+"""Settings of the app, read once at startup from the environment.
+
+`.env` is loaded here and only here (app/__init__ imports this module first).
+Modules copy the values they use into their own constants (e.g.
+feed_cache.FEED_CACHE_URL), which tests and benchmarks may override.
+"""
+import os
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+
+
+def _flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class Settings:
+    database_url: str
+    db_async: bool
+    db_pool_size: int
+    db_max_overflow: int
+    db_pool_timeout: float
+    db_pool_recycle: int
+    db_pool_pre_ping: bool
+    db_statement_timeout_ms: int
+    # Connections opened at startup before /readyz reports ready
+    db_pool_warmup: int
+    db_replica_urls: tuple[str, ...]
+    db_replica_health_interval: float
+    db_read_your_writes_seconds: float
+    secret_key: str
+    algorithm: str
+    access_token_expire_minutes: int
+    user_cache_ttl_seconds: float
+    # Tuning of the other modules; see the README for each variable
+    feed_cache_url: str
+    feed_cache_pages: int
+    feed_cache_max_entries: int
+    feed_cache_max_bytes: int
+    feed_cache_ttl_seconds: float
+    compression_min_size: int
+    gzip_level: int
+    brotli_quality: int
+    hash_pool_size: int
+    hash_queue_size: int
+    hash_retry_after_seconds: int
+    rate_limit_url: str
+    rate_limit_max_keys: int
+    # "<requests>/<seconds>" per limiter
+    rate_limit_login: str
+    rate_limit_signup: str
+    rate_limit_messages: str
+    rate_limit_comments: str
+    rate_limit_bulk: str
+    bulk_chunk_size: int
+    bulk_max_items: int
+    jobs_concurrency: int
+    jobs_queue_size: int
+    jobs_max_attempts: int
+    jobs_retry_delay: float
+    jobs_drain_seconds: float
+    jobs_outbox: bool
+    jobs_outbox_poll_seconds: float
+    jobs_outbox_lease_seconds: float
+    timeline_celebrity_followers: int
+    timeline_max_length: int
+    timeline_trim_every: int
+    timeline_backfill: int
+    slow_query_ms: float
+    slow_query_samples: int
+    otel_traces: bool
+    feed_ws_queue_size: int
+    ready_check_timeout: float
+    warmup_retry_max_seconds: float
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        user = os.getenv("DB_USER")
+        password = os.getenv("DB_PASSWORD")
+        db_name = os.getenv("DB_NAME")
+        host = os.getenv("DB_HOST")
+        port = os.getenv("DB_PORT")
+        pool_size = int(os.getenv("DB_POOL_SIZE", 5))
+        return cls(
+            # DATABASE_URL overrides the DB_* parts, e.g. a throwaway SQLite for
+            # tests and benchmarks
+            database_url=os.getenv(
+                "DATABASE_URL",
+                f"postgresql://{user}:{password}@{host}:{port}/{db_name}",
+            ),
+            db_async=_flag("DB_ASYNC"),
+            db_pool_size=pool_size,
+            db_max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+            db_pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 30)),
+            db_pool_recycle=int(os.getenv("DB_POOL_RECYCLE", -1)),
+            db_pool_pre_ping=_flag("DB_POOL_PRE_PING"),
+            db_statement_timeout_ms=int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0)),
+            db_pool_warmup=int(os.getenv("DB_POOL_WARMUP", pool_size)),
+            db_replica_urls=tuple(
+                url.strip()
+                for url in os.getenv("DB_REPLICA_URLS", "").split(",")
+                if url.strip()
+            ),
+            db_replica_health_interval=float(
+                os.getenv("DB_REPLICA_HEALTH_INTERVAL", 10)
+            ),
+            db_read_your_writes_seconds=float(
+                os.getenv("DB_READ_YOUR_WRITES_SECONDS", 5)
+            ),
+            secret_key=os.getenv("SECRET_KEY", "tu_clave_secreta_provisional_123"),
+            algorithm=os.getenv("ALGORITHM", "HS256"),
+            access_token_expire_minutes=int(
+                os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30)
+            ),
+            user_cache_ttl_seconds=float(os.getenv("USER_CACHE_TTL_SECONDS", 30)),
+            feed_cache_url=os.getenv("FEED_CACHE_URL", "memory"),
+            feed_cache_pages=int(os.getenv("FEED_CACHE_PAGES", 3)),
+            feed_cache_max_entries=int(os.getenv("FEED_CACHE_MAX_ENTRIES", 64)),
+            feed_cache_max_bytes=int(
+                os.getenv("FEED_CACHE_MAX_BYTES", 8 * 1024 * 1024)
+            ),
+            feed_cache_ttl_seconds=float(os.getenv("FEED_CACHE_TTL_SECONDS", 30)),
+            compression_min_size=int(os.getenv("COMPRESSION_MIN_SIZE", 500)),
+            gzip_level=int(os.getenv("GZIP_LEVEL", 6)),
+            brotli_quality=int(os.getenv("BROTLI_QUALITY", 4)),
+            hash_pool_size=int(
+                os.getenv("HASH_POOL_SIZE", min(4, os.cpu_count() or 1))
+            ),
+            hash_queue_size=int(os.getenv("HASH_QUEUE_SIZE", 32)),
+            hash_retry_after_seconds=int(os.getenv("HASH_RETRY_AFTER_SECONDS", 1)),
+            rate_limit_url=os.getenv("RATE_LIMIT_URL", "memory"),
+            rate_limit_max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", 100_000)),
+            rate_limit_login=os.getenv("RATE_LIMIT_LOGIN", "10/60"),
+            rate_limit_signup=os.getenv("RATE_LIMIT_SIGNUP", "5/3600"),
+            rate_limit_messages=os.getenv("RATE_LIMIT_MESSAGES", "30/60"),
+            rate_limit_comments=os.getenv("RATE_LIMIT_COMMENTS", "60/60"),
+            rate_limit_bulk=os.getenv("RATE_LIMIT_BULK", "10/60"),
+            bulk_chunk_size=int(os.getenv("BULK_CHUNK_SIZE", 1000)),
+            bulk_max_items=int(os.getenv("BULK_MAX_ITEMS", 100000)),
+            jobs_concurrency=int(os.getenv("JOBS_CONCURRENCY", 4)),
+            jobs_queue_size=int(os.getenv("JOBS_QUEUE_SIZE", 10_000)),
+            jobs_max_attempts=int(os.getenv("JOBS_MAX_ATTEMPTS", 5)),
+            jobs_retry_delay=float(os.getenv("JOBS_RETRY_DELAY", 0.5)),
+            jobs_drain_seconds=float(os.getenv("JOBS_DRAIN_SECONDS", 10)),
+            jobs_outbox=_flag("JOBS_OUTBOX"),
+            jobs_outbox_poll_seconds=float(os.getenv("JOBS_OUTBOX_POLL_SECONDS", 5)),
+            jobs_outbox_lease_seconds=float(
+                os.getenv("JOBS_OUTBOX_LEASE_SECONDS", 60)
+            ),
+            timeline_celebrity_followers=int(
+                os.getenv("TIMELINE_CELEBRITY_FOLLOWERS", 10_000)
+            ),
+            timeline_max_length=int(os.getenv("TIMELINE_MAX_LENGTH", 800)),
+            timeline_trim_every=int(os.getenv("TIMELINE_TRIM_EVERY", 100)),
+            timeline_backfill=int(os.getenv("TIMELINE_BACKFILL", 50)),
+            slow_query_ms=float(os.getenv("SLOW_QUERY_MS", 200)),
+            slow_query_samples=int(os.getenv("SLOW_QUERY_SAMPLES", 50)),
+            otel_traces=_flag("OTEL_TRACES"),
+            feed_ws_queue_size=int(os.getenv("FEED_WS_QUEUE_SIZE", 100)),
+            ready_check_timeout=float(os.getenv("READY_CHECK_TIMEOUT", 2)),
+            warmup_retry_max_seconds=float(
+                os.getenv("WARMUP_RETRY_MAX_SECONDS", 5)
+            ),
+        )
+
+
+load_dotenv()
+settings = Settings.from_env()
@@ -1,5 +1,20 @@
+from datetime import datetime
+from sqlalchemy import (
+    column,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    table,
+    tuple_,
+    union,
+    update,
+)
 from sqlalchemy.orm import Session
-from . import models, schemas, auth
+from . import models, schemas
 
 
 # --- USER LOGIC ---
@@ -7,83 +22,543 @@ def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = auth.get_password_hash(user.password)
+def get_user_by_id(db: Session, user_id: int):
+    return db.get(models.User, user_id)
+
+
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str):
     db_user = models.User(
         user_name=user.user_name, email=user.email, password_hash=hashed_password
     )
     db.add(db_user)
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 
 # --- MESSAGE LOGIC ---
-def get_messages(db: Session, skip: int = 0, limit: int = 100):
-    return (
-        db.query(models.Message)
-        .order_by(models.Message.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+def get_messages(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after: tuple[datetime, int] | None = None,
+    user_id: int | None = None,
+):
+    """Newest first, as rows carrying the author's user_name (one joined query).
+    `after` is the (created_at, id) of the last row already served (keyset
+    mode); otherwise the legacy `skip` offset is applied. `user_id` restricts
+    it to one author's timeline."""
+    query = (
+        db.query(
+            models.Message.id,
+            models.Message.user_id,
+            models.Message.user_message,
+            models.Message.created_at,
+            models.Message.updated_at,
+            models.Message.comment_count,
+            models.User.user_name,
+        )
+        .outerjoin(models.User, models.Message.user_id == models.User.id)
+        .order_by(models.Message.created_at.desc(), models.Message.id.desc())
     )
+    if user_id is not None:
+        query = query.filter(models.Message.user_id == user_id)
+    if after is not None:
+        key = (models.Message.created_at, models.Message.id)
+        query = query.filter(
+            tuple_(*key) < tuple_(*after, types=[col.type for col in key])
+        )
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
 
+def _finish(db: Session, commit: bool):
+    # commit=False leaves the transaction open (flushed, so new rows have their
+    # ids) for the caller to add to it, e.g. outbox rows (see jobs.commit)
+    if commit:
+        db.commit()
+    else:
+        db.flush()
 
-def create_message(db: Session, message: schemas.MessageCreate, user_id: int):
+
+def create_message(
+    db: Session, message: schemas.MessageCreate, user_id: int, commit: bool = True
+):
     db_message = models.Message(user_message=message.user_message, user_id=user_id)
     db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
+    _finish(db, commit)
     return db_message
 
 
+def bulk_insert_messages(db: Session, rows: list[dict]) -> list[int]:
+    """Multi-row INSERT ... RETURNING id, left uncommitted so a whole batch
+    can share one transaction."""
+    if not rows:
+        return []
+    return list(db.scalars(insert(models.Message).returning(models.Message.id), rows))
+
+
+def get_existing_message_ids(db: Session, message_ids) -> set[int]:
+    if not message_ids:
+        return set()
+    query = select(models.Message.id).where(models.Message.id.in_(set(message_ids)))
+    return set(db.scalars(query))
+
+
 def get_message_by_id(db: Session, message_id: int):
     return db.query(models.Message).filter(models.Message.id == message_id).first()
 
 
-def update_message(db: Session, db_message: models.Message, new_text: str):
-    db_message.user_message = new_text
-    db.commit()
-    db.refresh(db_message)
-    return db_message
+def message_exists(db: Session, message_id: int) -> bool:
+    return db.scalar(select(exists().where(models.Message.id == message_id)))
 
 
-def delete_message(db: Session, db_message: models.Message):
-    db.delete(db_message)
-    db.commit()
+# Authorized writes: the ownership check is part of the WHERE clause, so the
+# check and the write are one statement. None means "not found or not yours";
+# the caller tells them apart with message_exists only on that path.
+def update_message(
+    db: Session, message_id: int, user_id: int, new_text: str, commit: bool = True
+):
+    row = db.execute(
+        update(models.Message)
+        .where(models.Message.id == message_id, models.Message.user_id == user_id)
+        .values(user_message=new_text)
+        .returning(
+            models.Message.id,
+            models.Message.user_id,
+            models.Message.user_message,
+            models.Message.comment_count,
+        )
+        .execution_options(synchronize_session=False)
+    ).first()
+    _finish(db, commit)
+    return row
+
+
+def delete_message(db: Session, message_id: int, user_id: int, commit: bool = True):
+    # Its comments and timeline entries go with it (ON DELETE CASCADE)
+    row = db.execute(
+        delete(models.Message)
+        .where(models.Message.id == message_id, models.Message.user_id == user_id)
+        .returning(models.Message.id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    _finish(db, commit)
+    return row
 
 
 # --- COMMENT LOGIC ---
 def get_comments_by_message(db: Session, message_id: int):
+    # Joined projection: the author name comes in the same round trip
     return (
-        db.query(models.Comment)
+        db.query(
+            models.Comment.id,
+            models.Comment.message_id,
+            models.Comment.user_id,
+            models.Comment.comment,
+            models.Comment.created_at,
+            models.Comment.updated_at,
+            models.User.user_name,
+        )
+        .outerjoin(models.User, models.Comment.user_id == models.User.id)
         .filter(models.Comment.message_id == message_id)
         .order_by(models.Comment.created_at.asc())
         .all()
     )
 
 
-def create_comment(db: Session, comment: schemas.CommentCreate, user_id: int):
+def get_comments_for_messages(db: Session, message_ids: list[int], per_message: int):
+    """Comments of several messages in one query, at most `per_message` each
+    (oldest first, like get_comments_by_message)."""
+    ranked = (
+        db.query(
+            models.Comment.id,
+            models.Comment.message_id,
+            models.Comment.user_id,
+            models.Comment.comment,
+            models.Comment.created_at,
+            models.Comment.updated_at,
+            models.User.user_name,
+            func.row_number()
+            .over(
+                partition_by=models.Comment.message_id,
+                order_by=(models.Comment.created_at.asc(), models.Comment.id.asc()),
+            )
+            .label("position"),
+        )
+        .outerjoin(models.User, models.Comment.user_id == models.User.id)
+        .filter(models.Comment.message_id.in_(message_ids))
+        .subquery()
+    )
+    return (
+        db.query(ranked)
+        .filter(ranked.c.position <= per_message)
+        .order_by(ranked.c.message_id, ranked.c.position)
+        .all()
+    )
+
+
+def get_comments_by_user(
+    db: Session,
+    user_id: int,
+    limit: int = 100,
+    after: tuple[datetime, int] | None = None,
+):
+    """One author's comments, newest first, keyset-paginated like get_messages."""
+    query = (
+        db.query(
+            models.Comment.id,
+            models.Comment.message_id,
+            models.Comment.user_id,
+            models.Comment.comment,
+            models.Comment.created_at,
+            models.User.user_name,
+        )
+        .outerjoin(models.User, models.Comment.user_id == models.User.id)
+        .filter(models.Comment.user_id == user_id)
+        .order_by(models.Comment.created_at.desc(), models.Comment.id.desc())
+    )
+    if after is not None:
+        key = (models.Comment.created_at, models.Comment.id)
+        query = query.filter(
+            tuple_(*key) < tuple_(*after, types=[col.type for col in key])
+        )
+    return query.limit(limit).all()
+
+
+def create_comment(
+    db: Session, comment: schemas.CommentCreate, user_id: int, commit: bool = True
+):
     db_comment = models.Comment(
         comment=comment.comment, message_id=comment.message_id, user_id=user_id
     )
     db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
+    _finish(db, commit)
     return db_comment
 
 
+def bulk_insert_comments(db: Session, rows: list[dict]) -> list[int]:
+    if not rows:
+        return []
+    # In a savepoint: a message deleted since the caller checked it fails this
+    # chunk only, not the transaction holding the chunks already inserted
+    with db.begin_nested():
+        return list(
+            db.scalars(insert(models.Comment).returning(models.Comment.id), rows)
+        )
+
+
 def get_comment_by_id(db: Session, comment_id: int):
     return db.query(models.Comment).filter(models.Comment.id == comment_id).first()
 
 
-def update_comment(db: Session, db_comment: models.Comment, new_text: str):
-    db_comment.comment = new_text
+def comment_exists(db: Session, comment_id: int) -> bool:
+    return db.scalar(select(exists().where(models.Comment.id == comment_id)))
+
+
+def update_comment(
+    db: Session, comment_id: int, user_id: int, new_text: str, commit: bool = True
+):
+    row = db.execute(
+        update(models.Comment)
+        .where(models.Comment.id == comment_id, models.Comment.user_id == user_id)
+        .values(comment=new_text)
+        .returning(
+            models.Comment.id,
+            models.Comment.message_id,
+            models.Comment.user_id,
+            models.Comment.comment,
+        )
+        .execution_options(synchronize_session=False)
+    ).first()
+    _finish(db, commit)
+    return row
+
+
+def delete_comment(db: Session, comment_id: int, user_id: int, commit: bool = True):
+    row = db.execute(
+        delete(models.Comment)
+        .where(models.Comment.id == comment_id, models.Comment.user_id == user_id)
+        .returning(models.Comment.id, models.Comment.message_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    _finish(db, commit)
+    return row
+
+
+# --- SEARCH LOGIC ---
+def _fts5_query(query: str) -> str:
+    # Each word as a quoted FTS5 string: implicit AND, no operator injection
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+def _search(db: Session, model, columns, query: str, limit: int, after):
+    """Rows of `model` matching `query`, most relevant first, with a `rank`
+    column (higher is better). `after` is the (rank, id) of the last row served."""
+    name = model.__tablename__
+    if db.get_bind().dialect.name == "postgresql":
+        tsquery = func.websearch_to_tsquery(models.SEARCH_CONFIG, query)
+        vector = literal_column(f"{name}.search_vector")
+        hits = select(*columns, func.ts_rank(vector, tsquery).label("rank")).where(
+            vector.bool_op("@@")(tsquery)
+        )
+    else:
+        fts = table(f"{name}_fts", column("rowid"))
+        # bm25() is lower-is-better; negate it so both backends sort the same way
+        hits = (
+            select(*columns, (-func.bm25(literal_column(fts.name))).label("rank"))
+            .join(fts, fts.c.rowid == model.id)
+            .where(literal_column(fts.name).op("MATCH")(_fts5_query(query)))
+        )
+    hits = (
+        hits.add_columns(models.User.user_name)
+        .outerjoin(models.User, model.user_id == models.User.id)
+        .subquery()
+    )
+
+    statement = select(hits).order_by(hits.c.rank.desc(), hits.c.id.desc())
+    if after is not None:
+        statement = statement.where(tuple_(hits.c.rank, hits.c.id) < tuple_(*after))
+    return db.execute(statement.limit(limit)).all()
+
+
+def search_messages(db: Session, query: str, limit: int = 20, after=None):
+    columns = (models.Message.id, models.Message.user_id, models.Message.user_message)
+    return _search(db, models.Message, columns, query, limit, after)
+
+
+def search_comments(db: Session, query: str, limit: int = 20, after=None):
+    columns = (
+        models.Comment.id,
+        models.Comment.message_id,
+        models.Comment.user_id,
+        models.Comment.comment,
+    )
+    return _search(db, models.Comment, columns, query, limit, after)
+
+
+# --- FOLLOWS AND HOME TIMELINES ---
+def follow_user(db: Session, follower_id: int, followee_id: int, backfill: int = 0):
+    """Idempotent; True when the follow is new. The followee's latest
+    `backfill` messages are then copied into the follower's timeline."""
+    follow = models.Follow
+    new_follow = select(literal(follower_id), literal(followee_id)).where(
+        ~exists().where(
+            follow.follower_id == follower_id, follow.followee_id == followee_id
+        )
+    )
+    created = db.execute(
+        insert(follow).from_select(["follower_id", "followee_id"], new_follow)
+    ).rowcount
+    if created and backfill:
+        latest = (
+            select(literal(follower_id), models.Message.id, models.Message.created_at)
+            .where(models.Message.user_id == followee_id)
+            .order_by(models.Message.created_at.desc(), models.Message.id.desc())
+            .limit(backfill)
+        )
+        db.execute(
+            insert(models.TimelineEntry).from_select(
+                ["user_id", "message_id", "created_at"], latest
+            )
+        )
     db.commit()
-    db.refresh(db_comment)
-    return db_comment
+    return bool(created)
+
+
+def unfollow_user(db: Session, follower_id: int, followee_id: int):
+    """True when there was a follow to remove; its messages leave the timeline."""
+    removed = db.execute(
+        delete(models.Follow).where(
+            models.Follow.follower_id == follower_id,
+            models.Follow.followee_id == followee_id,
+        )
+    ).rowcount
+    if removed:
+        db.execute(
+            delete(models.TimelineEntry)
+            .where(
+                models.TimelineEntry.user_id == follower_id,
+                models.TimelineEntry.message_id.in_(
+                    select(models.Message.id).where(
+                        models.Message.user_id == followee_id
+                    )
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+    return bool(removed)
+
+
+def fan_out_messages(db: Session, message_ids, celebrity_followers: int) -> int:
+    """Copies the messages into the timelines of their authors' followers with
+    one INSERT ... SELECT, left uncommitted. Authors with `celebrity_followers`
+    followers or more are skipped: get_home_timeline pulls theirs on read."""
+    entry = models.TimelineEntry
+    rows = (
+        select(models.Follow.follower_id, models.Message.id, models.Message.created_at)
+        .join(models.Follow, models.Follow.followee_id == models.Message.user_id)
+        .join(models.User, models.User.id == models.Message.user_id)
+        .where(
+            models.Message.id.in_(message_ids),
+            models.User.follower_count < celebrity_followers,
+            # Idempotent: a job delivered twice adds nothing the second time
+            ~exists().where(
+                entry.user_id == models.Follow.follower_id,
+                entry.message_id == models.Message.id,
+            ),
+        )
+    )
+    return db.execute(
+        insert(entry).from_select(["user_id", "message_id", "created_at"], rows)
+    ).rowcount
+
+
+def trim_timelines(db: Session, author_id: int, max_length: int) -> int:
+    """Drops the entries past the newest `max_length` from the timelines of the
+    followers of `author_id`, left uncommitted."""
+    entry = models.TimelineEntry
+    followers = select(models.Follow.follower_id).where(
+        models.Follow.followee_id == author_id
+    )
+    ranked = (
+        select(
+            entry.user_id,
+            entry.message_id,
+            func.row_number()
+            .over(
+                partition_by=entry.user_id,
+                order_by=(entry.created_at.desc(), entry.message_id.desc()),
+            )
+            .label("position"),
+        )
+        .where(entry.user_id.in_(followers))
+        .subquery()
+    )
+    stale = select(ranked.c.user_id, ranked.c.message_id).where(
+        ranked.c.position > max_length
+    )
+    return db.execute(
+        delete(entry)
+        .where(tuple_(entry.user_id, entry.message_id).in_(stale))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def get_home_timeline(
+    db: Session,
+    user_id: int,
+    celebrity_followers: int,
+    limit: int = 20,
+    after: tuple[datetime, int] | None = None,
+):
+    """The messages fanned out to `user_id`, merged with the ones pulled on read
+    from the celebrities they follow and from themselves; newest first, with
+    the same columns and keyset as get_messages."""
+    entry = models.TimelineEntry
+    columns = (
+        models.Message.id,
+        models.Message.user_id,
+        models.Message.user_message,
+        models.Message.created_at,
+        models.Message.updated_at,
+        models.Message.comment_count,
+        models.User.user_name,
+    )
+    fanned = (
+        select(*columns)
+        .join(entry, entry.message_id == models.Message.id)
+        .outerjoin(models.User, models.Message.user_id == models.User.id)
+        .where(entry.user_id == user_id)
+        .order_by(entry.created_at.desc(), entry.message_id.desc())
+    )
+    pulled_authors = (
+        select(models.Follow.followee_id)
+        .join(models.User, models.User.id == models.Follow.followee_id)
+        .where(
+            models.Follow.follower_id == user_id,
+            models.User.follower_count >= celebrity_followers,
+        )
+        .union(select(literal(user_id)))
+    )
+    pulled = (
+        select(*columns)
+        .outerjoin(models.User, models.Message.user_id == models.User.id)
+        .where(models.Message.user_id.in_(pulled_authors))
+        .order_by(models.Message.created_at.desc(), models.Message.id.desc())
+    )
+    if after is not None:
+
+        def older(*key):
+            return tuple_(*key) < tuple_(*after, types=[col.type for col in key])
+
+        fanned = fanned.where(older(entry.created_at, entry.message_id))
+        pulled = pulled.where(older(models.Message.created_at, models.Message.id))
+    # Each branch stops after `limit` rows of its own index; UNION also drops a
+    # message found by both (posted before its author became a celebrity)
+    merged = union(
+        select(fanned.limit(limit).subquery()),
+        select(pulled.limit(limit).subquery()),
+    ).subquery()
+    return db.execute(
+        select(merged)
+        .order_by(merged.c.created_at.desc(), merged.c.id.desc())
+        .limit(limit)
+    ).all()
+
 
+# --- OUTBOX (app/jobs.py) ---
+def add_outbox_job(db: Session, name: str, key, payload: dict, available_at) -> int:
+    job_id = db.scalar(
+        insert(models.OutboxJob)
+        .values(name=name, key=key, payload=payload, available_at=available_at)
+        .returning(models.OutboxJob.id)
+    )
+    # Committed by the caller, together with the write that caused the job
+    return job_id
 
-def delete_comment(db: Session, db_comment: models.Comment):
-    db.delete(db_comment)
+
+def claim_outbox_jobs(db: Session, now, lease_until, max_attempts: int, limit: int):
+    """Leases up to `limit` due jobs (oldest first) until `lease_until`. SKIP
+    LOCKED lets pollers in several workers claim disjoint rows."""
+    job = models.OutboxJob
+    due = (
+        select(job.id)
+        .where(job.available_at <= now, job.attempts < max_attempts)
+        .order_by(job.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = db.execute(
+        update(job)
+        .where(job.id.in_(due))
+        .values(available_at=lease_until)
+        .returning(job.id, job.name, job.key, job.payload, job.attempts)
+        .execution_options(synchronize_session=False)
+    ).all()
     db.commit()
+    return sorted(rows, key=lambda row: row.id)
+
+
+def finish_outbox_job(db: Session, job_id: int):
+    db.execute(delete(models.OutboxJob).where(models.OutboxJob.id == job_id))
+    db.commit()
+
+
+def fail_outbox_job(db: Session, job_id: int, attempts: int, error: str):
+    db.execute(
+        update(models.OutboxJob)
+        .where(models.OutboxJob.id == job_id)
+        .values(attempts=attempts, last_error=error)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def commit(db: Session):
+    db.commit()
+
+
+def rollback(db: Session):
+    db.rollback()
@@ -0,0 +1,63 @@
+"""Awaitable versions of every function in crud.
+
+The queries live once, in crud. With an AsyncSession they run through
+`AsyncSession.run_sync`, which drives the asyncio driver without blocking the
+event loop. With a regular Session (DB_ASYNC off) they run on the threadpool,
+exactly like the sync routes used to.
+"""
+import functools
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, instrumentation
+
+
+async def run_db(db, fn, *args, **kwargs):
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(lambda session: fn(session, *args, **kwargs))
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+def _awaitable(fn):
+    @functools.wraps(fn)
+    async def wrapper(db, *args, **kwargs):
+        with instrumentation.crud_span(fn.__name__):
+            return await run_db(db, fn, *args, **kwargs)
+
+    return wrapper
+
+
+get_user_by_email = _awaitable(crud.get_user_by_email)
+get_user_by_id = _awaitable(crud.get_user_by_id)
+create_user = _awaitable(crud.create_user)
+get_messages = _awaitable(crud.get_messages)
+create_message = _awaitable(crud.create_message)
+bulk_insert_messages = _awaitable(crud.bulk_insert_messages)
+get_existing_message_ids = _awaitable(crud.get_existing_message_ids)
+get_message_by_id = _awaitable(crud.get_message_by_id)
+message_exists = _awaitable(crud.message_exists)
+update_message = _awaitable(crud.update_message)
+delete_message = _awaitable(crud.delete_message)
+get_comments_by_message = _awaitable(crud.get_comments_by_message)
+get_comments_for_messages = _awaitable(crud.get_comments_for_messages)
+get_comments_by_user = _awaitable(crud.get_comments_by_user)
+create_comment = _awaitable(crud.create_comment)
+bulk_insert_comments = _awaitable(crud.bulk_insert_comments)
+get_comment_by_id = _awaitable(crud.get_comment_by_id)
+comment_exists = _awaitable(crud.comment_exists)
+update_comment = _awaitable(crud.update_comment)
+delete_comment = _awaitable(crud.delete_comment)
+search_messages = _awaitable(crud.search_messages)
+search_comments = _awaitable(crud.search_comments)
+follow_user = _awaitable(crud.follow_user)
+unfollow_user = _awaitable(crud.unfollow_user)
+fan_out_messages = _awaitable(crud.fan_out_messages)
+trim_timelines = _awaitable(crud.trim_timelines)
+get_home_timeline = _awaitable(crud.get_home_timeline)
+add_outbox_job = _awaitable(crud.add_outbox_job)
+claim_outbox_jobs = _awaitable(crud.claim_outbox_jobs)
+finish_outbox_job = _awaitable(crud.finish_outbox_job)
+fail_outbox_job = _awaitable(crud.fail_outbox_job)
+commit = _awaitable(crud.commit)
+rollback = _awaitable(crud.rollback)
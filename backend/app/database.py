@@ -1,22 +1,381 @@
-import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+import itertools
+import logging
+import threading
+import time
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
-#Charge the variable from .env
-load_dotenv()
+from . import instrumentation, metrics
+from .cache import TTLCache
+from .config import settings
 
-#Get data from .env
-user = os.getenv("DB_USER")
-password = os.getenv("DB_PASSWORD")
-db_name = os.getenv("DB_NAME")
-host = os.getenv("DB_HOST")
-port = os.getenv("DB_PORT")
+logger = logging.getLogger(__name__)
 
-#Build URL using F-Strings
-SQLALCHEMY_DATABASE_URL = f"postgresql://{user}:{password}@{host}:{port}/{db_name}"
+#Settings come from app.config, which loads .env once for the whole app
+SQLALCHEMY_DATABASE_URL = settings.database_url
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+# DB_ASYNC=true serves every request through an AsyncSession (asyncpg/aiosqlite);
+# the default keeps the original sync engine and threadpool-backed routes.
+DB_ASYNC = settings.db_async
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+#Connection pool tuning (SQLAlchemy defaults unless set in .env)
+DB_POOL_SIZE = settings.db_pool_size
+DB_MAX_OVERFLOW = settings.db_max_overflow
+DB_POOL_TIMEOUT = settings.db_pool_timeout
+DB_POOL_RECYCLE = settings.db_pool_recycle
+DB_POOL_PRE_PING = settings.db_pool_pre_ping
+DB_STATEMENT_TIMEOUT_MS = settings.db_statement_timeout_ms
+
+#Read replicas for GET endpoints (comma separated URLs, empty = primary only)
+DB_REPLICA_URLS = list(settings.db_replica_urls)
+DB_REPLICA_HEALTH_INTERVAL = settings.db_replica_health_interval
+# Users who wrote within this window keep reading from the primary
+DB_READ_YOUR_WRITES_SECONDS = settings.db_read_your_writes_seconds
+
+pool_wait = metrics.Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool",
+    ["pool"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+pool_timeouts = metrics.Counter(
+    "db_pool_timeouts", "Checkouts that gave up after DB_POOL_TIMEOUT", ["pool"]
+)
+_instrumented_engines = {}
+
+
+class _TimedPoolMixin:
+    metrics_name = "primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_timeouts.inc(pool=self.metrics_name)
+            raise
+        finally:
+            pool_wait.observe(time.perf_counter() - started, pool=self.metrics_name)
+
+
+def _timed_pool_class(base, name: str):
+    # A class per engine keeps the label when the engine recreates its pool
+    attrs = {"metrics_name": name}
+    return type(f"Timed{base.__name__}", (_TimedPoolMixin, base), attrs)
+
+
+def _pool_stats(stat):
+    values = {}
+    for name, target in _instrumented_engines.items():
+        pool = getattr(target, "sync_engine", target).pool
+        if isinstance(pool, QueuePool):
+            values[(name,)] = stat(pool)
+    return values
+
+
+def _pool_gauge(name: str, documentation: str, stat):
+    metrics.Gauge(name, documentation, ["pool"], callback=lambda: _pool_stats(stat))
+
+
+_pool_gauge("db_pool_size", "Configured pool size", lambda pool: pool.size())
+_pool_gauge("db_pool_checked_out", "Connections in use", lambda pool: pool.checkedout())
+_pool_gauge("db_pool_idle", "Idle pooled connections", lambda pool: pool.checkedin())
+_pool_gauge(
+    "db_pool_overflow",
+    "Connections open beyond the pool size",
+    lambda pool: max(pool.overflow(), 0),
+)
+
+
+def engine_options(url: str, name: str = "primary", is_async: bool = False) -> dict:
+    """create_engine/create_async_engine keyword arguments for `url`."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    options = {}
+    connect_args = {}
+    if backend == "sqlite":
+        # SQLite connections are shared between the threadpool workers of FastAPI
+        connect_args["check_same_thread"] = False
+    if parsed.database not in (None, "", ":memory:"):
+        options.update(
+            poolclass=_timed_pool_class(
+                AsyncAdaptedQueuePool if is_async else QueuePool, name
+            ),
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    if DB_STATEMENT_TIMEOUT_MS and backend == "postgresql":
+        if is_async:
+            connect_args["server_settings"] = {
+                "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)
+            }
+        else:
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    options["connect_args"] = connect_args
+    return options
+
+
+def instrument_engine(target, name: str):
+    """Exposes the pool and the statements of `target` (sync or async engine)
+    on /metrics."""
+    _instrumented_engines[name] = target
+    instrumentation.instrument_engine(getattr(target, "sync_engine", target))
+    return target
+
+
+class _Lazy:
+    """A value built on first use, once even with concurrent first callers.
+
+    Engines are created this way so importing the app does not load the DB
+    driver nor build pools; the lifespan warm-up (app/health.py) or the first
+    request does.
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._value is not None
+
+    def get(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._build()
+        return self._value
+
+
+class _LazySessionmaker(_Lazy):
+    """Called like the (async_)sessionmaker it builds on first use."""
+
+    def __call__(self, **kwargs):
+        return self.get()(**kwargs)
+
+
+def _sync_sessionmaker(bind):
+    # Writes read server defaults back through RETURNING (eager_defaults in
+    # models), so objects stay usable after commit without a refresh SELECT
+    return sessionmaker(
+        autocommit=False, autoflush=False, expire_on_commit=False, bind=bind
+    )
+
+
+def configure_sqlite(engine):
+    """Foreign keys and write locks on SQLite (tests, benchmarks).
+
+    SQLite only enforces foreign keys (and their ON DELETE CASCADE) on
+    connections that enable them. It also takes the write lock at the first
+    write, so two transactions that read and then write can deadlock, and one
+    fails at once with "database is locked": write sessions start with BEGIN
+    IMMEDIATE so that writers wait on the busy timeout instead. Only connections
+    with the `write` execution option (the Write*SessionLocal factories) do it;
+    readers keep running concurrently.
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        if conn.get_execution_options().get("write"):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+_engine = _Lazy(
+    lambda: instrument_engine(
+        configure_sqlite(
+            create_engine(
+                SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL)
+            )
+        ),
+        "primary",
+    )
+)
+SessionLocal = _LazySessionmaker(lambda: _sync_sessionmaker(get_engine()))
+# Sessions of the routes and jobs that write
+WriteSessionLocal = _LazySessionmaker(
+    lambda: _sync_sessionmaker(get_engine().execution_options(write=True))
+)
+
+
+def get_engine():
+    """The sync engine of the primary, created on first use."""
+    return _engine.get()
+
+
+Base = declarative_base()
+
+
+def async_url(url: str) -> str:
+    """Same database as `url`, through the asyncio driver of its dialect."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def create_async_session_factory(url: str, name: str = "async"):
+    # Imported here so the sync mode does not require asyncpg/aiosqlite
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = instrument_engine(
+        create_async_engine(
+            async_url(url), **engine_options(url, name=name, is_async=True)
+        ),
+        name,
+    )
+    configure_sqlite(async_engine.sync_engine)
+    return async_engine, async_sessionmaker(
+        async_engine, autocommit=False, autoflush=False, expire_on_commit=False
+    )
+
+
+def _async_write_sessionmaker():
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    return async_sessionmaker(
+        get_async_engine().execution_options(write=True),
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+_async_factory = _Lazy(lambda: create_async_session_factory(SQLALCHEMY_DATABASE_URL))
+AsyncSessionLocal = AsyncWriteSessionLocal = None
+if DB_ASYNC:
+    AsyncSessionLocal = _LazySessionmaker(lambda: _async_factory.get()[1])
+    AsyncWriteSessionLocal = _LazySessionmaker(_async_write_sessionmaker)
+
+
+def get_async_engine():
+    """The asyncio engine of the primary (DB_ASYNC only), created on first use."""
+    return _async_factory.get()[0] if DB_ASYNC else None
+
+
+def __getattr__(name):
+    # `from .database import engine` keeps working, building the engine then
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class Replica:
+    def __init__(self, url: str, name: str, is_async: bool = DB_ASYNC):
+        self.name = name
+        # The sync engine also runs the health checks in async mode
+        self._engine = _Lazy(
+            lambda: instrument_engine(
+                create_engine(url, **engine_options(url, name=name)), name
+            )
+        )
+        self.SessionLocal = _LazySessionmaker(lambda: _sync_sessionmaker(self.engine))
+        self.AsyncSessionLocal = None
+        if is_async:
+            self.AsyncSessionLocal = _LazySessionmaker(
+                lambda: create_async_session_factory(url, name=name)[1]
+            )
+        self.healthy = True
+
+    @property
+    def engine(self):
+        return self._engine.get()
+
+    def mark_down(self):
+        if self.healthy:
+            logger.warning("Replica %s marked unhealthy", self.name)
+        self.healthy = False
+
+    def check(self):
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except exc.DBAPIError:
+            self.mark_down()
+        else:
+            if not self.healthy:
+                logger.info("Replica %s is healthy again", self.name)
+            self.healthy = True
+
+
+class ReplicaSet:
+    """Round-robin over healthy replicas, with read-your-writes stickiness."""
+
+    def __init__(
+        self,
+        urls,
+        health_interval=DB_REPLICA_HEALTH_INTERVAL,
+        sticky_seconds=DB_READ_YOUR_WRITES_SECONDS,
+        is_async=DB_ASYNC,
+    ):
+        self.replicas = [
+            Replica(url, f"replica{i}", is_async=is_async)
+            for i, url in enumerate(urls)
+        ]
+        self.health_interval = health_interval
+        self._recent_writers = TTLCache(ttl=sticky_seconds, maxsize=100000)
+        self._counter = itertools.count()
+        self._checker = None
+        self._checker_lock = threading.Lock()
+
+    def note_write(self, user_id):
+        if self.replicas and user_id is not None:
+            self._recent_writers.set(user_id, True)
+
+    def is_sticky(self, user_id) -> bool:
+        """Whether this reader wrote recently and must read from the primary."""
+        return bool(
+            self.replicas
+            and user_id is not None
+            and self._recent_writers.get(user_id)
+        )
+
+    def choose(self, user_id=None):
+        """A healthy replica for this reader, or None to read from the primary."""
+        if not self.replicas:
+            return None
+        self._start_health_checks()
+        if self.is_sticky(user_id):
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def _start_health_checks(self):
+        if self._checker is not None or self.health_interval <= 0:
+            return
+        with self._checker_lock:
+            if self._checker is None:
+                self._checker = threading.Thread(
+                    target=self._health_loop, name="replica-health", daemon=True
+                )
+                self._checker.start()
+
+    def _health_loop(self):
+        while True:
+            time.sleep(self.health_interval)
+            for replica in self.replicas:
+                replica.check()
+
+
+replicas = ReplicaSet(DB_REPLICA_URLS)
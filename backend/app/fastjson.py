@@ -0,0 +1,31 @@
+"""JSON rendering for list endpoints that build their rows themselves.
+
+The list routes already produce plain dicts in the shape of their response
+model, so they return FastJSONResponse directly: FastAPI then skips the
+per-row response_model validation and jsonable_encoder pass, and the body is
+written by orjson. Without orjson installed it falls back to the stdlib
+encoder (same output, just slower).
+"""
+import json
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        # Integer dict keys (comments grouped by message id) become strings,
+        # as the stdlib encoder does
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,198 @@
+"""Cache of the serialized first pages of the public feed.
+
+Pages are stored as the exact JSON bytes sent to clients, together with their
+ETag, Last-Modified and X-Next-Cursor. Any write to messages invalidates every page,
+and a page built from rows read before that invalidation is not stored. The
+default backend lives in the worker process; FEED_CACHE_URL=redis://... shares
+the pages (and their invalidation) between uvicorn workers.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from . import metrics
+from .config import settings
+
+FEED_CACHE_URL = settings.feed_cache_url
+FEED_CACHE_PAGES = settings.feed_cache_pages
+FEED_CACHE_MAX_ENTRIES = settings.feed_cache_max_entries
+FEED_CACHE_MAX_BYTES = settings.feed_cache_max_bytes
+# Upper bound on staleness when pages are rebuilt from a lagging replica
+FEED_CACHE_TTL_SECONDS = settings.feed_cache_ttl_seconds
+
+cache_requests = metrics.Counter(
+    "feed_cache_requests", "Feed page cache lookups", ["result"]
+)
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    body: bytes
+    etag: str
+    next_cursor: str | None = None
+    last_modified: str | None = None
+
+
+def make_page(
+    body: bytes,
+    next_cursor: str | None = None,
+    etag: str | None = None,
+    last_modified: str | None = None,
+) -> CachedPage:
+    if etag is None:
+        etag = 'W/"' + hashlib.sha1(body).hexdigest() + '"'
+    return CachedPage(
+        body=body, etag=etag, next_cursor=next_cursor, last_modified=last_modified
+    )
+
+
+class MemoryFeedCache:
+    """LRU bounded both by number of pages and by their total size."""
+
+    def __init__(
+        self,
+        max_entries=FEED_CACHE_MAX_ENTRIES,
+        max_bytes=FEED_CACHE_MAX_BYTES,
+        ttl=FEED_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_bytes = 0
+        self.generation = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key):
+        with self._lock:
+            item = self._pages.get(key)
+            if item is None:
+                return None
+            expires_at, page = item
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._pages.move_to_end(key)
+            return page
+
+    async def current_generation(self) -> int:
+        return self.generation
+
+    async def set(self, key, page: CachedPage, generation: int):
+        if len(page.body) > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return  # built before an invalidation: its rows may be stale
+            self._remove(key)
+            self._pages[key] = (time.monotonic() + self.ttl, page)
+            self.size_bytes += len(page.body)
+            while (
+                len(self._pages) > self.max_entries or self.size_bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._pages)))
+
+    async def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._pages.clear()
+            self.size_bytes = 0
+
+    def _remove(self, key):
+        item = self._pages.pop(key, None)
+        if item is not None:
+            self.size_bytes -= len(item[1].body)
+
+
+class RedisFeedCache:
+    """Shared backend. Invalidation bumps a generation counter that is part of
+    every page key, so all workers drop their pages with a single INCR."""
+
+    GENERATION_KEY = "feed:generation"
+
+    def __init__(self, url: str, ttl=FEED_CACHE_TTL_SECONDS):
+        import redis.asyncio as redis  # optional dependency: pip install redis
+
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+
+    async def current_generation(self) -> int:
+        return int(await self.client.get(self.GENERATION_KEY) or 0)
+
+    def _page_key(self, key, generation: int):
+        return f"feed:{generation}:{key[0]}:{key[1]}"
+
+    async def get(self, key):
+        page_key = self._page_key(key, await self.current_generation())
+        data = await self.client.hgetall(page_key)
+        if not data:
+            return None
+        cursor = data.get(b"next_cursor") or None
+        last_modified = data.get(b"last_modified") or None
+        return CachedPage(
+            body=data[b"body"],
+            etag=data[b"etag"].decode(),
+            next_cursor=cursor.decode() if cursor else None,
+            last_modified=last_modified.decode() if last_modified else None,
+        )
+
+    async def set(self, key, page: CachedPage, generation: int):
+        # Under the generation read before the query: if a write invalidated
+        # since then, the page lands under a key nobody reads any more
+        page_key = self._page_key(key, generation)
+        fields = {
+            "body": page.body,
+            "etag": page.etag,
+            "next_cursor": page.next_cursor or "",
+            "last_modified": page.last_modified or "",
+        }
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(page_key, mapping=fields)
+            pipe.expire(page_key, max(int(self.ttl), 1))
+            await pipe.execute()
+
+    async def invalidate(self):
+        await self.client.incr(self.GENERATION_KEY)
+
+
+def create_backend(url: str = FEED_CACHE_URL):
+    if url in ("", "off", "none"):
+        return None
+    if url == "memory":
+        return MemoryFeedCache()
+    return RedisFeedCache(url)
+
+
+backend = create_backend()
+
+
+def page_key(skip: int, limit: int, cursor: str | None):
+    """Key of a cacheable request (one of the first FEED_CACHE_PAGES pages)."""
+    if backend is None or cursor or limit <= 0:
+        return None
+    if skip % limit or skip >= FEED_CACHE_PAGES * limit:
+        return None
+    return (skip, limit)
+
+
+async def get_page(key) -> CachedPage | None:
+    page = await backend.get(key)
+    cache_requests.inc(result="hit" if page else "miss")
+    return page
+
+
+async def generation() -> int:
+    """Snapshot to take before querying the rows of a page to store."""
+    return await backend.current_generation()
+
+
+async def store_page(key, page: CachedPage, generation: int):
+    """Stores the page unless the cache was invalidated after `generation`."""
+    await backend.set(key, page, generation)
+
+
+async def invalidate():
+    if backend is not None:
+        await backend.invalidate()
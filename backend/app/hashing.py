@@ -0,0 +1,101 @@
+"""Runs bcrypt on a dedicated, bounded worker pool.
+
+bcrypt releases the GIL while hashing, so threads give real parallelism without
+the pickling and start-up cost of a process pool. When every worker is busy
+and the waiting queue is full, callers get HashingBusy instead of piling up.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import auth, metrics
+from .config import settings
+
+HASH_POOL_SIZE = settings.hash_pool_size
+HASH_QUEUE_SIZE = settings.hash_queue_size
+HASH_RETRY_AFTER_SECONDS = settings.hash_retry_after_seconds
+
+hash_duration = metrics.Histogram(
+    "hash_duration_seconds", "Time spent computing bcrypt per operation", ["op"]
+)
+hash_wait = metrics.Histogram(
+    "hash_queue_wait_seconds", "Time a hashing job waited for a free worker", ["op"]
+)
+hash_rejected = metrics.Counter(
+    "hash_rejected", "Hashing jobs rejected because the queue was full", ["op"]
+)
+
+
+class HashingBusy(Exception):
+    def __init__(self, retry_after: int = HASH_RETRY_AFTER_SECONDS):
+        super().__init__("Hashing pool is saturated")
+        self.retry_after = retry_after
+
+
+class HashingPool:
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._in_flight - self._running
+
+    def submit(self, op: str, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                hash_rejected.inc(op=op)
+                raise HashingBusy()
+            self._in_flight += 1
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            hash_wait.observe(started - submitted, op=op)
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args)
+            finally:
+                hash_duration.observe(time.perf_counter() - started, op=op)
+                with self._lock:
+                    self._running -= 1
+                    self._in_flight -= 1
+
+        try:
+            return self._executor.submit(job)
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+
+
+pool = HashingPool(HASH_POOL_SIZE, HASH_QUEUE_SIZE)
+
+metrics.Gauge(
+    "hash_queue_depth",
+    "Hashing jobs waiting for a worker",
+    callback=lambda: pool.queue_depth,
+)
+metrics.Gauge(
+    "hash_workers_busy",
+    "Hashing workers currently computing",
+    callback=lambda: pool._running,
+)
+
+
+async def hash_password(password: str) -> str:
+    future = pool.submit("hash", auth.get_password_hash, password)
+    return await asyncio.wrap_future(future)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    future = pool.submit("verify", auth.verify_password, password, hashed_password)
+    return await asyncio.wrap_future(future)
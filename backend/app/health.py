@@ -0,0 +1,126 @@
+"""Liveness (GET /healthz) and readiness (GET /readyz) of this worker.
+
+Importing the app neither connects to the database nor builds the bcrypt
+context: the lifespan starts a warm-up task that does both, opening
+DB_POOL_WARMUP pooled connections (at most the pool size) so the first requests
+do not pay for the connects. It retries until the database answers; until then
+/readyz reports 503, so a load balancer or orchestrator keeps traffic away from
+a worker that is still starting while /healthz already says the process is up.
+The realtime LISTEN bridge is started from there too, once the database answers.
+"""
+import asyncio
+import logging
+
+from sqlalchemy import text
+
+from . import auth, database, realtime
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds /readyz waits for its SELECT 1 before reporting the database down
+READY_CHECK_TIMEOUT = settings.ready_check_timeout
+# Longest pause between warm-up attempts while the database is unreachable
+WARMUP_RETRY_MAX_SECONDS = settings.warmup_retry_max_seconds
+
+
+def _warm_sync_pool(connections: int):
+    engine = database.get_engine()
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+            # Held open, but not in a transaction that would block the others
+            conn.rollback()
+    finally:
+        # Returned to the pool, where they stay open for the first requests
+        for conn in opened:
+            conn.close()
+
+
+async def _warm_async_pool(connections: int):
+    engine = database.get_async_engine()
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = await engine.connect()
+            opened.append(conn)
+            await conn.execute(text("SELECT 1"))
+            await conn.rollback()
+    finally:
+        for conn in opened:
+            await conn.close()
+
+
+async def warm_up(connections: int = settings.db_pool_warmup):
+    """Builds the engine and the bcrypt context and fills the pool."""
+    connections = max(1, min(connections, database.DB_POOL_SIZE))
+    await asyncio.to_thread(auth.get_pwd_context)
+    if database.DB_ASYNC:
+        await _warm_async_pool(connections)
+    else:
+        await asyncio.to_thread(_warm_sync_pool, connections)
+
+
+def _ping_sync():
+    with database.get_engine().connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+async def _ping():
+    if database.DB_ASYNC:
+        async with database.get_async_engine().connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    else:
+        await asyncio.to_thread(_ping_sync)
+
+
+class Readiness:
+    def __init__(self):
+        self.ready = False
+        self.task = None
+
+    def start(self):
+        self.ready = False
+        self.task = asyncio.create_task(self._warm_up())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def wait(self):
+        """Waits until the warm-up has finished."""
+        if self.task is not None:
+            await asyncio.shield(self.task)
+
+    async def _warm_up(self):
+        delay = 0.1
+        while True:
+            try:
+                await warm_up()
+            except Exception as error:
+                logger.warning("Startup warm-up failed, retrying: %s", error)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+                continue
+            await realtime.hub.start()
+            self.ready = True
+            return
+
+    async def check(self) -> str | None:
+        """None when this worker can take traffic, otherwise the reason."""
+        if not self.ready:
+            return "starting"
+        try:
+            await asyncio.wait_for(_ping(), READY_CHECK_TIMEOUT)
+        except Exception as error:
+            logger.warning("Readiness check failed: %s", error)
+            return "database unreachable"
+        return None
+
+
+state = Readiness()
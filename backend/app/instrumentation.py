@@ -0,0 +1,176 @@
+"""Per-route request metrics on /metrics: latency, SQL statements and DB time
+per request, plus samples of slow queries.
+
+RequestMetricsMiddleware opens a RequestStats for every HTTP request. The
+engine hooks (installed on every engine by database.instrument_engine) add each
+statement to the stats of the request that issued it, found through a
+contextvar that follows the request into the threadpool and run_sync workers.
+
+With OTEL_TRACES=true and opentelemetry-api installed, every crud_async call is
+also an OpenTelemetry span (exporting them is left to the SDK configuration).
+"""
+import contextlib
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import metrics
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this are counted, logged and sampled on /metrics
+SLOW_QUERY_MS = settings.slow_query_ms
+# Distinct slow statements kept as samples (the oldest go first)
+SLOW_QUERY_SAMPLES = settings.slow_query_samples
+OTEL_TRACES = settings.otel_traces
+
+request_duration = metrics.Histogram(
+    "http_request_duration_seconds",
+    "Time to serve a request, by route template",
+    ["method", "route", "status"],
+)
+request_db_time = metrics.Histogram(
+    "http_request_db_seconds", "Time spent running SQL per request", ["route"]
+)
+request_statements = metrics.Histogram(
+    "http_request_db_statements",
+    "SQL statements executed per request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+slow_queries = metrics.Counter(
+    "db_slow_queries", "Statements slower than SLOW_QUERY_MS", ["route"]
+)
+
+_slow_samples = OrderedDict()
+_slow_lock = threading.Lock()
+metrics.Gauge(
+    "db_slow_query_seconds",
+    "Latest duration of each sampled slow statement (literals redacted)",
+    ["route", "statement"],
+    callback=lambda: dict(_slow_samples),
+)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?")
+
+
+def redact(statement: str, max_length: int = 300) -> str:
+    """The statement text without literal values, on one line. Bound
+    parameters are never included, so this only hides inlined literals."""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    return " ".join(statement.split())[:max_length]
+
+
+class RequestStats:
+    def __init__(self, scope: Scope):
+        self.scope = scope
+        self.statements = 0
+        self.db_time = 0.0
+
+    @property
+    def route(self) -> str:
+        # Set by the router once it matched; a template keeps the labels bounded
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        record_slow_query(statement, elapsed, stats.route if stats else "")
+
+
+def record_slow_query(statement: str, elapsed: float, route: str):
+    sample = redact(statement)
+    slow_queries.inc(route=route)
+    logger.warning("Slow query (%.0f ms) on %s: %s", elapsed * 1000, route, sample)
+    with _slow_lock:
+        _slow_samples[(route, sample)] = elapsed
+        _slow_samples.move_to_end((route, sample))
+        while len(_slow_samples) > SLOW_QUERY_SAMPLES:
+            _slow_samples.popitem(last=False)
+
+
+def instrument_engine(engine):
+    """Times every statement of `engine` (a sync Engine; for an AsyncEngine
+    pass its sync_engine)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_request.reset(token)
+            route = stats.route
+            request_duration.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route,
+                status=status,
+            )
+            request_db_time.observe(stats.db_time, route=route)
+            request_statements.observe(stats.statements, route=route)
+
+
+tracer = None
+if OTEL_TRACES:
+    try:
+        from opentelemetry import trace
+
+        tracer = trace.get_tracer("publishwed.crud")
+    except ImportError:  # pragma: no cover - optional dependency
+        logger.warning("OTEL_TRACES is set but opentelemetry-api is not installed")
+
+
+def crud_span(name: str):
+    """Span around one crud call, or a no-op without OpenTelemetry."""
+    if tracer is None:
+        return contextlib.nullcontext()
+    return tracer.start_as_current_span(f"crud.{name}")
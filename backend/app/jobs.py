@@ -0,0 +1,296 @@
+"""In-process background jobs for the side effects of a write (timeline fan-out,
+realtime events), so they run after the response instead of inside it.
+
+Routes call `enqueue(name, payload, db=db)` before committing their write and
+then `commit(db)`, which queues the jobs once the transaction is committed;
+JOBS_CONCURRENCY worker tasks in the same event loop run the handler
+registered under `name` with the payload as keyword arguments, retrying up to
+JOBS_MAX_ATTEMPTS times with exponential backoff. Jobs sharing a `key` run one
+after another in enqueue order (realtime events must not overtake each other);
+a job waiting to be retried lets the later ones with its key run first.
+
+Jobs only live in memory by default: a crash or restart loses the ones not run
+yet. With JOBS_OUTBOX=true each job is also written to the `outbox` table, in
+the same transaction as the write that caused it, and deleted once it
+succeeds; rows whose lease expired (the worker died, or the in-memory queue was
+full) are claimed again by a poller in any worker, which makes delivery
+at-least-once. Handlers must therefore be idempotent or tolerate repeats.
+"""
+import asyncio
+import logging
+import time
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import exc
+
+from . import crud_async, metrics
+from .config import settings
+from .database import DB_ASYNC, AsyncWriteSessionLocal, WriteSessionLocal
+
+logger = logging.getLogger(__name__)
+
+JOBS_CONCURRENCY = settings.jobs_concurrency
+JOBS_QUEUE_SIZE = settings.jobs_queue_size
+JOBS_MAX_ATTEMPTS = settings.jobs_max_attempts
+JOBS_RETRY_DELAY = settings.jobs_retry_delay
+# Seconds given to queued jobs on shutdown before the workers are cancelled
+JOBS_DRAIN_SECONDS = settings.jobs_drain_seconds
+JOBS_OUTBOX = settings.jobs_outbox
+JOBS_OUTBOX_POLL_SECONDS = settings.jobs_outbox_poll_seconds
+# A claimed outbox row is hidden from other pollers for this long
+JOBS_OUTBOX_LEASE_SECONDS = settings.jobs_outbox_lease_seconds
+
+jobs_processed = metrics.Counter(
+    "jobs_processed", "Background job runs by outcome", ["job", "result"]
+)
+job_duration = metrics.Histogram(
+    "job_duration_seconds", "Time to run a background job", ["job"]
+)
+jobs_inline = metrics.Counter(
+    "jobs_run_inline", "Jobs run in the request because the queue was full", ["job"]
+)
+
+_handlers = {}
+
+
+def handler(name: str):
+    """Registers an async function as the handler of the jobs called `name`."""
+
+    def register(fn):
+        _handlers[name] = fn
+        return fn
+
+    return register
+
+
+@asynccontextmanager
+async def session():
+    """A write session outside of a request, of the kind the routes use."""
+    if DB_ASYNC:
+        async with AsyncWriteSessionLocal() as db:
+            yield db
+    else:
+        db = WriteSessionLocal()
+        try:
+            yield db
+        finally:
+            try:
+                db.close()
+            except exc.IllegalStateChangeError:
+                # Cancelled (shutdown) while a threadpool call still uses the
+                # session: let the CancelledError through instead of this; the
+                # connection is reclaimed once that call ends and db is collected
+                pass
+
+
+@dataclass
+class Job:
+    name: str
+    payload: dict
+    key: str | None = None
+    outbox_id: int | None = None
+    attempts: int = 0
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class JobQueue:
+    """`eager=True` runs every job inside enqueue() (tests and scripts)."""
+
+    def __init__(
+        self,
+        concurrency: int = JOBS_CONCURRENCY,
+        max_size: int = JOBS_QUEUE_SIZE,
+        outbox: bool = JOBS_OUTBOX,
+        eager: bool = False,
+    ):
+        self.concurrency = concurrency
+        self.max_size = max_size
+        self.outbox = outbox and not eager
+        self.eager = eager
+        self.queue = None
+        self.tasks = []
+        self._key_locks = weakref.WeakValueDictionary()
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def start(self):
+        if self.eager:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+        self.tasks = [
+            asyncio.create_task(self._work()) for _ in range(self.concurrency)
+        ]
+        if self.outbox:
+            self.tasks.append(asyncio.create_task(self._poll_outbox()))
+
+    async def stop(self, drain_seconds: float = JOBS_DRAIN_SECONDS):
+        if self.queue is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), drain_seconds)
+            except asyncio.TimeoutError:
+                logger.warning("%d background jobs not run at shutdown", self.depth)
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.queue = None
+
+    async def enqueue(self, name: str, payload: dict, key: str | None = None, db=None):
+        """Queues a job. With `db`, the job belongs to that session's open
+        transaction: its outbox row is written there and it is only queued by
+        `commit(db)`, so a rolled back write leaves no job behind."""
+        if name not in _handlers:
+            raise KeyError(f"No handler registered for job {name!r}")
+        job = Job(name, payload, key)
+        if db is not None:
+            if self.outbox:
+                job.outbox_id = await self._add_to_outbox(db, job)
+            db.info.setdefault("jobs", []).append(job)
+            return
+        if self.outbox and self.queue is not None:
+            async with session() as db:
+                job.outbox_id = await self._add_to_outbox(db, job)
+                await crud_async.commit(db)
+        await self._submit(job)
+
+    async def commit(self, db):
+        """Commits `db` and queues the jobs enqueued in its transaction."""
+        await crud_async.commit(db)
+        for job in db.info.pop("jobs", []):
+            await self._submit(job)
+
+    async def _add_to_outbox(self, db, job: Job) -> int:
+        # Leased from the start: the poller only takes it if this worker dies
+        # (or its queue is full) before running it
+        return await crud_async.add_outbox_job(
+            db,
+            job.name,
+            job.key,
+            job.payload,
+            _now() + timedelta(seconds=JOBS_OUTBOX_LEASE_SECONDS),
+        )
+
+    async def _submit(self, job: Job):
+        if self.queue is None:
+            # Eager, or no running workers (e.g. the app without its lifespan)
+            await self._run(job)
+            return
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            if job.outbox_id is not None:
+                return  # the poller picks it up once the lease expires
+            jobs_inline.inc(job=job.name)
+            await self._run(job)
+
+    async def join(self):
+        """Waits until every queued job has run."""
+        if self.queue is not None:
+            await self.queue.join()
+
+    async def _work(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job: Job):
+        while True:
+            if job.key is None:
+                retry_in = await self._attempt(job)
+            else:
+                lock = self._key_locks.get(job.key)
+                if lock is None:
+                    lock = self._key_locks[job.key] = asyncio.Lock()
+                async with lock:
+                    retry_in = await self._attempt(job)
+            if retry_in is None:
+                return
+            # Outside the key's lock: the jobs queued behind this one run meanwhile
+            await asyncio.sleep(retry_in)
+
+    async def _attempt(self, job: Job) -> float | None:
+        """Runs the job once; returns the delay before retrying it, if any."""
+        job.attempts += 1
+        started = time.perf_counter()
+        try:
+            await _handlers[job.name](**job.payload)
+        except Exception as error:
+            job_duration.observe(time.perf_counter() - started, job=job.name)
+            if job.attempts < JOBS_MAX_ATTEMPTS:
+                jobs_processed.inc(job=job.name, result="retried")
+                return JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+            jobs_processed.inc(job=job.name, result="failed")
+            logger.exception("Job %s failed after %d attempts", job.name, job.attempts)
+            await self._settle(job, error)
+            return None
+        job_duration.observe(time.perf_counter() - started, job=job.name)
+        jobs_processed.inc(job=job.name, result="ok")
+        await self._settle(job)
+        return None
+
+    async def _settle(self, job: Job, error: Exception | None = None):
+        if job.outbox_id is None:
+            return
+        try:
+            async with session() as db:
+                if error is None:
+                    await crud_async.finish_outbox_job(db, job.outbox_id)
+                else:
+                    # Kept as a dead letter (attempts at the maximum) for inspection
+                    await crud_async.fail_outbox_job(
+                        db, job.outbox_id, job.attempts, repr(error)
+                    )
+        except Exception:
+            logger.exception("Could not update outbox job %s", job.outbox_id)
+
+    async def claim_outbox(self, limit: int = 100) -> int:
+        """Queues the outbox rows that are due; returns how many."""
+        now = _now()
+        async with session() as db:
+            rows = await crud_async.claim_outbox_jobs(
+                db,
+                now,
+                now + timedelta(seconds=JOBS_OUTBOX_LEASE_SECONDS),
+                JOBS_MAX_ATTEMPTS,
+                limit,
+            )
+        for row in rows:
+            job = Job(row.name, row.payload, row.key, row.id, row.attempts)
+            await self.queue.put(job)
+        return len(rows)
+
+    async def _poll_outbox(self):
+        while True:
+            try:
+                await self.claim_outbox()
+            except Exception:
+                logger.exception("Outbox poll failed")
+            await asyncio.sleep(JOBS_OUTBOX_POLL_SECONDS)
+
+
+queue = JobQueue()
+
+metrics.Gauge(
+    "jobs_queue_depth",
+    "Background jobs waiting for a worker",
+    callback=lambda: queue.depth,
+)
+
+
+async def enqueue(name: str, payload: dict, key: str | None = None, db=None):
+    await queue.enqueue(name, payload, key, db=db)
+
+
+async def commit(db):
+    await queue.commit(db)
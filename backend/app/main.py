@@ -1,19 +1,49 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Literal
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import exc
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
-from jose import jwt, JWTError
+from jose import JWTError
 
-from . import models, schemas, crud, auth
-from .database import SessionLocal, engine
+from . import models, schemas, crud_async, auth, bulk, feed_cache, hashing, jobs, metrics
+from . import conditional, health, pagination, ratelimit, realtime, timelines
+from .compression import CompressionMiddleware
+from .instrumentation import RequestMetricsMiddleware
+from .fastjson import FastJSONResponse, dumps as dump_json
+from .database import AsyncSessionLocal, AsyncWriteSessionLocal, DB_ASYNC
+from .database import SessionLocal, WriteSessionLocal, replicas
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+# Public reads accept an optional token, only to route the author to the primary
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
+
+# El esquema lo crean y actualizan las migraciones (`alembic upgrade head`),
+# no el arranque: los workers empiezan a servir sin tocar el catálogo.
+# El engine y el contexto de bcrypt se crean en el calentamiento de app/health.py
+# (o en la primera petición), no al importar la app.
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The warm-up also starts the realtime bridge: nothing here waits for the DB
+    health.state.start()
+    await jobs.queue.start()
+    yield
+    # First, so that an unfinished warm-up does not start the bridge afterwards
+    await health.state.stop()
+    await jobs.queue.stop()
+    await realtime.hub.stop()
 
-# Drop tables and create (If you strictly need fresh start to avoid alembic or migrations)
-# It's better to keep it as create_all, skipping drops so we don't break logic. PostgreSQL creates what is missing.
-models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Social Network Backend API (FastAPI + PostgreSQL)")
+app = FastAPI(
+    title="Social Network Backend API (FastAPI + PostgreSQL)", lifespan=lifespan
+)
 
 # Configuración de CORS
 app.add_middleware(
@@ -22,10 +52,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Next-Cursor",
+        "ETag",
+        "RateLimit-Limit",
+        "RateLimit-Remaining",
+        "RateLimit-Reset",
+        "Retry-After",
+    ],
 )
+# gzip/brotli para las respuestas de más de COMPRESSION_MIN_SIZE bytes
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ratelimit.RateLimitHeadersMiddleware)
+# Latencia, sentencias SQL y tiempo de base de datos por ruta (en /metrics)
+app.add_middleware(RequestMetricsMiddleware)
+
+
+@app.exception_handler(hashing.HashingBusy)
+def hashing_busy_handler(request: Request, exc: hashing.HashingBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Servidor ocupado, inténtalo de nuevo en unos segundos"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 
-def get_db():
+@app.exception_handler(ratelimit.RateLimited)
+def rate_limited_handler(request: Request, exc: ratelimit.RateLimited):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Demasiadas peticiones, inténtalo de nuevo más tarde"},
+        headers=ratelimit.headers(exc.decision),
+    )
+
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
@@ -33,41 +94,232 @@ def get_db():
         db.close()
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="No se pudo validar el token",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Routes only talk to the session through crud_async, which accepts both kinds
+get_db = get_async_db if DB_ASYNC else get_sync_db
+
+
+def get_sync_write_db():
+    db = WriteSessionLocal()
     try:
-        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_write_db():
+    async with AsyncWriteSessionLocal() as db:
+        yield db
+
+
+# Routes that write: on SQLite their transactions take the write lock up front
+get_write_db = get_async_write_db if DB_ASYNC else get_sync_write_db
+
+
+def reader_id(token: str | None = Depends(optional_oauth2_scheme)):
+    if not token:
+        return None
+    try:
+        return auth.decode_access_token(token).get("uid")
     except JWTError:
+        return None
+
+
+def get_sync_read_db(user_id: int | None = Depends(reader_id)):
+    replica = replicas.choose(user_id)
+    if replica is None:
+        yield from get_sync_db()
+        return
+    db = replica.SessionLocal()
+    try:
+        yield db
+    except exc.DBAPIError as error:
+        if error.connection_invalidated:
+            replica.mark_down()
+        raise
+    finally:
+        db.close()
+
+
+async def get_async_read_db(user_id: int | None = Depends(reader_id)):
+    replica = replicas.choose(user_id)
+    if replica is None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    async with replica.AsyncSessionLocal() as db:
+        try:
+            yield db
+        except exc.DBAPIError as error:
+            if error.connection_invalidated:
+                replica.mark_down()
+            raise
+
+
+# Read-only endpoints: a replica when configured, the primary right after a write
+get_read_db = get_async_read_db if DB_ASYNC else get_sync_read_db
+
+
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="No se pudo validar el token",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+def decode_token(token: str = Depends(oauth2_scheme)) -> dict:
+    try:
+        payload = auth.decode_access_token(token)
+    except JWTError:
+        raise credentials_exception
+    if payload.get("sub") is None:
         raise credentials_exception
+    return payload
 
-    user = crud.get_user_by_email(db, email=email)
+
+async def get_current_user(
+    payload: dict = Depends(decode_token), db: Session = Depends(get_read_db)
+):
+    """Loads the full user row (cached for a few seconds) for endpoints that need it."""
+    user_id = payload.get("uid")
+    cache_key = user_id if user_id is not None else payload["sub"]
+    user = auth.user_cache.get(cache_key)
     if user is None:
-        raise credentials_exception
+        if user_id is not None:
+            user = await crud_async.get_user_by_id(db, user_id)
+        else:
+            # Tokens issued before uid/name were added only carry the email
+            user = await crud_async.get_user_by_email(db, email=payload["sub"])
+        if user is None:
+            raise credentials_exception
+        auth.user_cache.set(cache_key, user)
     return user
 
 
+async def token_identity(payload: dict, db: Session) -> auth.TokenUser:
+    """Trusts the identity signed into the token, without touching the DB."""
+    if payload.get("uid") is None or payload.get("name") is None:
+        user = await get_current_user(payload, db)
+        return auth.TokenUser(id=user.id, user_name=user.user_name, email=user.email)
+    return auth.TokenUser(
+        id=payload["uid"], user_name=payload["name"], email=payload["sub"]
+    )
+
+
+async def get_token_user(
+    payload: dict = Depends(decode_token), db: Session = Depends(get_write_db)
+):
+    """The token's user for the write routes. The read-your-writes window is
+    only opened once the write commits (commit_write)."""
+    return await token_identity(payload, db)
+
+
+async def get_token_reader(
+    payload: dict = Depends(decode_token), db: Session = Depends(get_read_db)
+):
+    """The token's user for authenticated reads, which leave the
+    read-your-writes window as it is."""
+    return await token_identity(payload, db)
+
+
+def limit_by_ip(limiter: ratelimit.Limiter):
+    """Rate limit for anonymous routes (login, signup), keyed by client IP."""
+
+    async def dependency(request: Request):
+        client_ip = request.client.host if request.client else "unknown"
+        request.state.rate_limit = await ratelimit.check(limiter, f"ip:{client_ip}")
+
+    return dependency
+
+
+def limit_by_user(limiter: ratelimit.Limiter):
+    """Rate limit for authenticated writes, keyed by the token's user id."""
+
+    async def dependency(
+        request: Request, current_user: auth.TokenUser = Depends(get_token_user)
+    ):
+        await take_token(request, limiter, current_user)
+
+    return dependency
+
+
+async def take_token(
+    request: Request, limiter: ratelimit.Limiter, current_user: auth.TokenUser
+):
+    request.state.rate_limit = await ratelimit.check(
+        limiter, f"user:{current_user.id}"
+    )
+
+
+async def commit_write(db, user_id: int, feed_changed: bool = True):
+    """Commits a write route's transaction and its jobs, then keeps the user's
+    reads on the primary and drops the cached feed pages."""
+    await jobs.commit(db)
+    replicas.note_write(user_id)
+    if feed_changed:
+        await feed_cache.invalidate()
+
+
+@app.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    description="Métricas internas en formato de texto de Prometheus",
+)
+def read_metrics():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get(
+    "/healthz",
+    description="Liveness: el proceso responde (no consulta la base de datos)",
+)
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get(
+    "/readyz",
+    description=(
+        "Readiness: 200 cuando el pool está caliente y la base de datos responde, "
+        "503 mientras el worker arranca o si la base de datos no está disponible"
+    ),
+    responses={503: {"description": "El worker no puede recibir tráfico"}},
+)
+async def readyz():
+    reason = await health.state.check()
+    if reason is not None:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "unavailable", "reason": reason},
+        )
+    return {"status": "ready"}
+
+
 # --- AUTENTICACIÓN Y USUARIOS ---
-@app.post("/login", description="Inicia sesión y obtiene un token Bearer")
-def login(
+@app.post(
+    "/login",
+    description="Inicia sesión y obtiene un token Bearer",
+    dependencies=[Depends(limit_by_ip(ratelimit.login))],
+)
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
 ):
-    user = crud.get_user_by_email(db, email=form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.password_hash):
+    user = await crud_async.get_user_by_email(db, email=form_data.username)
+    if not user or not await hashing.verify_password(
+        form_data.password, user.password_hash
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Correo o contraseña incorrectos",
         )
 
-    access_token = auth.create_access_token(data={"sub": user.email})
+    access_token = auth.create_user_token(user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -76,15 +328,24 @@ def login(
     response_model=schemas.UserOut,
     status_code=status.HTTP_201_CREATED,
     description="Registra un nuevo usuario",
+    dependencies=[Depends(limit_by_ip(ratelimit.signup))],
 )
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_write_db)):
+    db_user = await crud_async.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El email ya está registrado",
         )
-    return crud.create_user(db=db, user=user)
+    # Ends the lookup's transaction (and its SQLite write lock) before bcrypt
+    await crud_async.rollback(db)
+    hashed_password = await hashing.hash_password(user.password)
+    new_user = await crud_async.create_user(
+        db, user=user, hashed_password=hashed_password
+    )
+    auth.user_cache.invalidate(new_user.email)
+    replicas.note_write(new_user.id)
+    return new_user
 
 
 @app.get(
@@ -92,29 +353,90 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     response_model=schemas.UserOut,
     description="Obtiene los datos del usuario logueado actualmente",
 )
-def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: models.User = Depends(get_current_user)):
     return current_user
 
 
 # --- MENSAJES (POSTS) ---
+def page_response(request: Request, page: feed_cache.CachedPage) -> Response:
+    headers = conditional.headers(page.etag, page.last_modified, page.next_cursor)
+    if conditional.is_fresh(request, page.etag):
+        return conditional.not_modified(headers)
+    return Response(content=page.body, media_type="application/json", headers=headers)
+
+
+def keyset_after(cursor: str | None):
+    if not cursor:
+        return None
+    try:
+        return pagination.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido"
+        )
+
+
 @app.get(
     "/messages/",
     response_model=list[schemas.MessageOut],
-    description="Obtiene la lista de los últimos mensajes del feed incorporando el nombre del usuario",
+    description=(
+        "Obtiene la lista de los últimos mensajes del feed incorporando el nombre "
+        "del usuario. Para paginar envía el valor de la cabecera X-Next-Cursor en "
+        "`cursor` (skip queda por compatibilidad)"
+    ),
 )
-def read_messages(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    messages = crud.get_messages(db, skip=skip, limit=limit)
+async def read_messages(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    db: Session = Depends(get_read_db),
+    user_id: int | None = Depends(reader_id),
+):
+    cache_key = feed_cache.page_key(skip, limit, cursor)
+    # Tras escribir se lee del primario: una página cacheada desde una réplica
+    # atrasada (tras la invalidación) ocultaría el mensaje recién publicado
+    if cache_key is not None and not replicas.is_sticky(user_id):
+        page = await feed_cache.get_page(cache_key)
+        if page is not None:
+            return page_response(request, page)
+    if cache_key is not None:
+        # Antes de la consulta: si una escritura invalida la caché mientras tanto,
+        # esta página (con filas viejas) ya no se guarda
+        generation = await feed_cache.generation()
+
+    after = keyset_after(cursor)
+    messages = await crud_async.get_messages(
+        db, skip=skip, limit=limit, after=after
+    )
+    next_cursor = None
+    if messages and len(messages) == limit:
+        last = messages[-1]
+        next_cursor = pagination.encode_cursor(last.created_at, last.id)
+    # Validadores a partir de las filas: un 304 no llega a serializar nada
+    etag, last_modified = conditional.page_validators(messages, "comment_count")
+    if conditional.is_fresh(request, etag):
+        return conditional.not_modified(
+            conditional.headers(etag, last_modified, next_cursor)
+        )
     response_list = []
     for msg in messages:
-        # Transformamos el objeto ORM en dict para inyectarle dinámicamente el user_name
+        # Cada fila ya trae el user_name del JOIN, sin cargar la relación por fila
         response_data = {
             "id": msg.id,
             "user_id": msg.user_id,
             "user_message": msg.user_message,
-            "user_name": msg.user.user_name if msg.user else "Usuario Desconocido",
+            "user_name": msg.user_name or "Usuario Desconocido",
+            "comment_count": msg.comment_count,
         }
         response_list.append(response_data)
-    return response_list
+
+    page = feed_cache.make_page(
+        dump_json(response_list), next_cursor, etag=etag, last_modified=last_modified
+    )
+    if cache_key is not None:
+        await feed_cache.store_page(cache_key, page, generation)
+    return page_response(request, page)
 
 
 @app.post(
@@ -122,19 +444,65 @@ def read_messages(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
     response_model=schemas.MessageOut,
     status_code=status.HTTP_201_CREATED,
     description="Publica un nuevo mensaje en el feed",
+    dependencies=[Depends(limit_by_user(ratelimit.messages))],
 )
-def create_message(
+async def create_message(
     message_input: schemas.MessageCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_write_db),
+    current_user: auth.TokenUser = Depends(get_token_user),
 ):
-    new_msg = crud.create_message(db=db, message=message_input, user_id=current_user.id)
-    return {
+    new_msg = await crud_async.create_message(
+        db=db, message=message_input, user_id=current_user.id, commit=False
+    )
+    message_out = {
         "id": new_msg.id,
         "user_id": new_msg.user_id,
         "user_message": new_msg.user_message,
         "user_name": current_user.user_name,
+        "comment_count": 0,
     }
+    # Los efectos secundarios se confirman en la misma transacción que el mensaje
+    await timelines.enqueue_fan_out(current_user.id, [new_msg.id], db)
+    await realtime.enqueue("message.created", message_out, db)
+    await commit_write(db, current_user.id)
+    return message_out
+
+
+@app.post(
+    "/messages/bulk",
+    response_model=schemas.BulkResult,
+    description=(
+        "Publica muchos mensajes en una sola transacción. El cuerpo es una lista JSON "
+        "o NDJSON (application/x-ndjson, un objeto por línea) de MessageCreate; los "
+        "elementos inválidos se informan en `errors` por posición"
+    ),
+    dependencies=[Depends(limit_by_user(ratelimit.bulk))],
+)
+async def bulk_create_messages(
+    request: Request,
+    db: Session = Depends(get_write_db),
+    current_user: auth.TokenUser = Depends(get_token_user),
+):
+    result = await bulk.ingest(
+        request,
+        db,
+        schemas.MessageCreate,
+        to_row=lambda item: {
+            "user_message": item.user_message,
+            "user_id": current_user.id,
+        },
+        insert=crud_async.bulk_insert_messages,
+        throttle=lambda: take_token(request, ratelimit.bulk, current_user),
+    )
+    if result["inserted"]:
+        await timelines.enqueue_fan_out(current_user.id, result["ids"], db)
+        await realtime.enqueue(
+            "message.bulk_created",
+            {"user_id": current_user.id, "count": result["inserted"]},
+            db,
+        )
+    await commit_write(db, current_user.id, feed_changed=bool(result["inserted"]))
+    return result
 
 
 @app.put(
@@ -142,31 +510,36 @@ def create_message(
     response_model=schemas.MessageOut,
     description="Edita un mensaje existente (Solamente el creador)",
 )
-def update_message(
+async def update_message(
     message_id: int,
     message_update: schemas.MessageUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_write_db),
+    current_user: auth.TokenUser = Depends(get_token_user),
 ):
-    db_message = crud.get_message_by_id(db, message_id)
-    if not db_message:
+    updated_msg = await crud_async.update_message(
+        db, message_id, current_user.id, message_update.user_message, commit=False
+    )
+    if updated_msg is None:
+        # Solo en el camino de error: ¿no existe o no es suyo?
+        if await crud_async.message_exists(db, message_id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tienes permiso para modificar este mensaje",
+            )
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Mensaje no encontrado"
         )
 
-    if db_message.user_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="No tienes permiso para modificar este mensaje",
-        )
-
-    updated_msg = crud.update_message(db, db_message, message_update.user_message)
-    return {
+    message_out = {
         "id": updated_msg.id,
         "user_id": updated_msg.user_id,
         "user_message": updated_msg.user_message,
         "user_name": current_user.user_name,
+        "comment_count": updated_msg.comment_count,
     }
+    await realtime.enqueue("message.updated", message_out, db)
+    await commit_write(db, current_user.id)
+    return message_out
 
 
 @app.delete(
@@ -174,23 +547,28 @@ def update_message(
     status_code=status.HTTP_204_NO_CONTENT,
     description="Elimina un mensaje existente (Solamente el creador)",
 )
-def delete_message(
+async def delete_message(
     message_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_write_db),
+    current_user: auth.TokenUser = Depends(get_token_user),
 ):
-    db_message = crud.get_message_by_id(db, message_id)
-    if not db_message:
+    deleted = await crud_async.delete_message(
+        db, message_id, current_user.id, commit=False
+    )
+    if deleted is None:
+        if await crud_async.message_exists(db, message_id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tienes permiso para eliminar este mensaje",
+            )
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Mensaje no encontrado"
         )
-    if db_message.user_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="No tienes permiso para eliminar este mensaje",
-        )
 
-    crud.delete_message(db, db_message)
+    await realtime.enqueue(
+        "message.deleted", {"id": message_id, "user_id": current_user.id}, db
+    )
+    await commit_write(db, current_user.id)
     return None
 
 
@@ -200,8 +578,14 @@ def delete_message(
     response_model=list[schemas.CommentOut],
     description="Obtiene todos los comentarios de un mensaje",
 )
-def read_comments(message_id: int, db: Session = Depends(get_db)):
-    comments = crud.get_comments_by_message(db, message_id=message_id)
+async def read_comments(
+    message_id: int, request: Request, db: Session = Depends(get_read_db)
+):
+    comments = await crud_async.get_comments_by_message(db, message_id=message_id)
+    etag, last_modified = conditional.page_validators(comments)
+    headers = conditional.headers(etag, last_modified)
+    if conditional.is_fresh(request, etag):
+        return conditional.not_modified(headers)
     response_list = []
     for comment in comments:
         response_list.append(
@@ -210,10 +594,69 @@ def read_comments(message_id: int, db: Session = Depends(get_db)):
                 "message_id": comment.message_id,
                 "user_id": comment.user_id,
                 "comment": comment.comment,
-                "user_name": comment.user.user_name if comment.user else "Usuario",
+                "user_name": comment.user_name or "Usuario",
+            }
+        )
+    return FastJSONResponse(response_list, headers=headers)
+
+
+MAX_BATCH_MESSAGES = 100
+
+
+@app.get(
+    "/comments/",
+    response_model=dict[int, list[schemas.CommentOut]],
+    description=(
+        "Obtiene los comentarios de varios mensajes en una sola petición "
+        "(?message_ids=1,2,3), agrupados por mensaje y limitados a `limit` por mensaje"
+    ),
+)
+async def read_comments_batch(
+    request: Request,
+    message_ids: str,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+):
+    try:
+        ids = [int(raw) for raw in message_ids.split(",") if raw.strip()]
+        ids = list(dict.fromkeys(ids))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="message_ids debe ser una lista de enteros separados por comas",
+        )
+    if not ids or len(ids) > MAX_BATCH_MESSAGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Se requieren entre 1 y {MAX_BATCH_MESSAGES} message_ids",
+        )
+    if any(not 0 <= message_id <= pagination.MAX_ROW_ID for message_id in ids):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="message_ids fuera de rango",
+        )
+
+    comments = await crud_async.get_comments_for_messages(db, ids, per_message=limit)
+    # Los ids pedidos forman parte de la respuesta aunque no tengan comentarios
+    etag, last_modified = conditional.page_validators(
+        comments, scope=",".join(map(str, ids))
+    )
+    headers = conditional.headers(etag, last_modified)
+    if conditional.is_fresh(request, etag):
+        return conditional.not_modified(headers)
+
+    grouped = {message_id: [] for message_id in ids}
+    for comment in comments:
+        grouped[comment.message_id].append(
+            {
+                "id": comment.id,
+                "message_id": comment.message_id,
+                "user_id": comment.user_id,
+                "comment": comment.comment,
+                "user_name": comment.user_name or "Usuario",
             }
         )
-    return response_list
+    return FastJSONResponse(grouped, headers=headers)
 
 
 @app.post(
@@ -221,20 +664,78 @@ def read_comments(message_id: int, db: Session = Depends(get_db)):
     response_model=schemas.CommentOut,
     status_code=status.HTTP_201_CREATED,
     description="Agrega un comentario a un mensaje",
+    dependencies=[Depends(limit_by_user(ratelimit.comments))],
 )
-def post_comment(
+async def post_comment(
     comment: schemas.CommentCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_write_db),
+    current_user: auth.TokenUser = Depends(get_token_user),
 ):
-    new_comment = crud.create_comment(db=db, comment=comment, user_id=current_user.id)
-    return {
+    new_comment = await crud_async.create_comment(
+        db=db, comment=comment, user_id=current_user.id, commit=False
+    )
+    comment_out = {
         "id": new_comment.id,
         "message_id": new_comment.message_id,
         "user_id": new_comment.user_id,
         "comment": new_comment.comment,
         "user_name": current_user.user_name,
     }
+    await realtime.enqueue("comment.created", comment_out, db)
+    # El comment_count del mensaje cambió: las páginas cacheadas ya no valen
+    await commit_write(db, current_user.id)
+    return comment_out
+
+
+@app.post(
+    "/comments/bulk",
+    response_model=schemas.BulkResult,
+    description=(
+        "Agrega muchos comentarios en una sola transacción (lista JSON o NDJSON de "
+        "CommentCreate). Los comentarios a mensajes inexistentes se informan en "
+        "`errors`"
+    ),
+    dependencies=[Depends(limit_by_user(ratelimit.bulk))],
+)
+async def bulk_create_comments(
+    request: Request,
+    db: Session = Depends(get_write_db),
+    current_user: auth.TokenUser = Depends(get_token_user),
+):
+    async def reject_unknown_messages(chunk):
+        existing = await crud_async.get_existing_message_ids(
+            db, [item.message_id for _, item in chunk]
+        )
+        return [
+            {
+                "index": index,
+                "detail": f"message_id: el mensaje {item.message_id} no existe",
+            }
+            for index, item in chunk
+            if item.message_id not in existing
+        ]
+
+    result = await bulk.ingest(
+        request,
+        db,
+        schemas.CommentCreate,
+        to_row=lambda item: {
+            "comment": item.comment,
+            "message_id": item.message_id,
+            "user_id": current_user.id,
+        },
+        insert=crud_async.bulk_insert_comments,
+        prepare=reject_unknown_messages,
+        throttle=lambda: take_token(request, ratelimit.bulk, current_user),
+    )
+    if result["inserted"]:
+        await realtime.enqueue(
+            "comment.bulk_created",
+            {"user_id": current_user.id, "count": result["inserted"]},
+            db,
+        )
+    await commit_write(db, current_user.id, feed_changed=bool(result["inserted"]))
+    return result
 
 
 @app.put(
@@ -242,32 +743,35 @@ def post_comment(
     response_model=schemas.CommentOut,
     description="Edita un comentario existente (Solamente el creador)",
 )
-def update_comment(
+async def update_comment(
     comment_id: int,
     comment_update: schemas.CommentUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_write_db),
+    current_user: auth.TokenUser = Depends(get_token_user),
 ):
-    db_comment = crud.get_comment_by_id(db, comment_id)
-    if not db_comment:
+    updated_comment = await crud_async.update_comment(
+        db, comment_id, current_user.id, comment_update.comment, commit=False
+    )
+    if updated_comment is None:
+        if await crud_async.comment_exists(db, comment_id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tienes permiso para modificar este comentario",
+            )
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Comentario no encontrado"
         )
 
-    if db_comment.user_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="No tienes permiso para modificar este comentario",
-        )
-
-    updated_comment = crud.update_comment(db, db_comment, comment_update.comment)
-    return {
+    comment_out = {
         "id": updated_comment.id,
         "message_id": updated_comment.message_id,
         "user_id": updated_comment.user_id,
         "comment": updated_comment.comment,
         "user_name": current_user.user_name,
     }
+    await realtime.enqueue("comment.updated", comment_out, db)
+    await commit_write(db, current_user.id, feed_changed=False)
+    return comment_out
 
 
 @app.delete(
@@ -275,21 +779,282 @@ def update_comment(
     status_code=status.HTTP_204_NO_CONTENT,
     description="Elimina un comentario existente (Solamente el creador)",
 )
-def delete_comment(
+async def delete_comment(
     comment_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_write_db),
+    current_user: auth.TokenUser = Depends(get_token_user),
 ):
-    db_comment = crud.get_comment_by_id(db, comment_id)
-    if not db_comment:
+    deleted = await crud_async.delete_comment(
+        db, comment_id, current_user.id, commit=False
+    )
+    if deleted is None:
+        if await crud_async.comment_exists(db, comment_id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tienes permiso para eliminar este comentario",
+            )
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Comentario no encontrado"
         )
-    if db_comment.user_id != current_user.id:
+
+    await realtime.enqueue(
+        "comment.deleted",
+        {
+            "id": comment_id,
+            "message_id": deleted.message_id,
+            "user_id": current_user.id,
+        },
+        db,
+    )
+    await commit_write(db, current_user.id)
+    return None
+
+
+# --- PERFILES ---
+async def ensure_user_exists(db, user_id: int):
+    # Solo se consulta cuando la página sale vacía
+    if await crud_async.get_user_by_id(db, user_id) is None:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="No tienes permiso para eliminar este comentario",
+            status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado"
         )
 
-    crud.delete_comment(db, db_comment)
+
+@app.get(
+    "/users/{user_id}/messages/",
+    response_model=list[schemas.MessageOut],
+    description=(
+        "Mensajes de un usuario, del más nuevo al más antiguo. Para paginar envía "
+        "el valor de la cabecera X-Next-Cursor en `cursor`"
+    ),
+)
+async def read_user_messages(
+    user_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    db: Session = Depends(get_read_db),
+):
+    after = keyset_after(cursor)
+    messages = await crud_async.get_messages(
+        db, limit=limit, after=after, user_id=user_id
+    )
+    if not messages and after is None:
+        await ensure_user_exists(db, user_id)
+    headers = {}
+    if len(messages) == limit:
+        last = messages[-1]
+        headers["X-Next-Cursor"] = pagination.encode_cursor(last.created_at, last.id)
+    body = [
+        {
+            "id": msg.id,
+            "user_id": msg.user_id,
+            "user_message": msg.user_message,
+            "user_name": msg.user_name or "Usuario Desconocido",
+            "comment_count": msg.comment_count,
+        }
+        for msg in messages
+    ]
+    return FastJSONResponse(body, headers=headers)
+
+
+@app.get(
+    "/users/{user_id}/comments/",
+    response_model=list[schemas.CommentOut],
+    description=(
+        "Comentarios de un usuario, del más nuevo al más antiguo. Para paginar envía "
+        "el valor de la cabecera X-Next-Cursor en `cursor`"
+    ),
+)
+async def read_user_comments(
+    user_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    db: Session = Depends(get_read_db),
+):
+    after = keyset_after(cursor)
+    comments = await crud_async.get_comments_by_user(
+        db, user_id, limit=limit, after=after
+    )
+    if not comments and after is None:
+        await ensure_user_exists(db, user_id)
+    headers = {}
+    if len(comments) == limit:
+        last = comments[-1]
+        headers["X-Next-Cursor"] = pagination.encode_cursor(last.created_at, last.id)
+    body = [
+        {
+            "id": comment.id,
+            "message_id": comment.message_id,
+            "user_id": comment.user_id,
+            "comment": comment.comment,
+            "user_name": comment.user_name or "Usuario",
+        }
+        for comment in comments
+    ]
+    return FastJSONResponse(body, headers=headers)
+
+
+# --- SEGUIDORES Y TIMELINE ---
+@app.post(
+    "/users/{user_id}/follow",
+    status_code=status.HTTP_204_NO_CONTENT,
+    description="Sigue a un usuario: sus mensajes aparecen en tu timeline",
+)
+async def follow_user(
+    user_id: int,
+    db: Session = Depends(get_write_db),
+    current_user: auth.TokenUser = Depends(get_token_user),
+):
+    if user_id == current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No puedes seguirte a ti mismo",
+        )
+    await ensure_user_exists(db, user_id)
+    await timelines.follow(db, current_user.id, user_id)
+    replicas.note_write(current_user.id)
     return None
+
+
+@app.delete(
+    "/users/{user_id}/follow",
+    status_code=status.HTTP_204_NO_CONTENT,
+    description="Deja de seguir a un usuario",
+)
+async def unfollow_user(
+    user_id: int,
+    db: Session = Depends(get_write_db),
+    current_user: auth.TokenUser = Depends(get_token_user),
+):
+    await timelines.unfollow(db, current_user.id, user_id)
+    replicas.note_write(current_user.id)
+    return None
+
+
+@app.get(
+    "/timeline/",
+    response_model=list[schemas.MessageOut],
+    description=(
+        "Tu timeline: tus mensajes y los de quienes sigues, del más nuevo al más "
+        "antiguo. Para paginar envía el valor de la cabecera X-Next-Cursor en `cursor`"
+    ),
+)
+async def read_timeline(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    db: Session = Depends(get_read_db),
+    current_user: auth.TokenUser = Depends(get_token_reader),
+):
+    after = keyset_after(cursor)
+    messages = await timelines.read(db, current_user.id, limit=limit, after=after)
+    headers = {}
+    if len(messages) == limit:
+        last = messages[-1]
+        headers["X-Next-Cursor"] = pagination.encode_cursor(last.created_at, last.id)
+    body = [
+        {
+            "id": msg.id,
+            "user_id": msg.user_id,
+            "user_message": msg.user_message,
+            "user_name": msg.user_name or "Usuario Desconocido",
+            "comment_count": msg.comment_count,
+        }
+        for msg in messages
+    ]
+    return FastJSONResponse(body, headers=headers)
+
+
+# --- BÚSQUEDA ---
+@app.get(
+    "/search",
+    response_model=list[schemas.SearchHit],
+    description=(
+        "Búsqueda de texto completo en mensajes (type=messages) o comentarios "
+        "(type=comments), ordenada por relevancia. Para paginar envía el valor de "
+        "la cabecera X-Next-Cursor en `cursor`"
+    ),
+)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: Literal["messages", "comments"] = "messages",
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    db: Session = Depends(get_read_db),
+):
+    after = None
+    if cursor:
+        try:
+            after = pagination.decode_rank_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido"
+            )
+    if not q.split():
+        return []
+
+    if type == "messages":
+        rows = await crud_async.search_messages(db, q, limit=limit, after=after)
+        hits = [
+            {
+                "type": "message",
+                "id": row.id,
+                "message_id": row.id,
+                "user_id": row.user_id,
+                "user_name": row.user_name or "Usuario Desconocido",
+                "text": row.user_message,
+                "rank": row.rank,
+            }
+            for row in rows
+        ]
+    else:
+        rows = await crud_async.search_comments(db, q, limit=limit, after=after)
+        hits = [
+            {
+                "type": "comment",
+                "id": row.id,
+                "message_id": row.message_id,
+                "user_id": row.user_id,
+                "user_name": row.user_name or "Usuario",
+                "text": row.comment,
+                "rank": row.rank,
+            }
+            for row in rows
+        ]
+
+    headers = {}
+    if len(rows) == limit:
+        last = rows[-1]
+        headers["X-Next-Cursor"] = pagination.encode_rank_cursor(last.rank, last.id)
+    return FastJSONResponse(hits, headers=headers)
+
+
+# --- TIEMPO REAL ---
+@app.websocket("/ws/feed")
+async def feed_socket(websocket: WebSocket):
+    """Envía como JSON cada alta, edición o baja de mensajes y comentarios."""
+    await websocket.accept()
+    queue = realtime.hub.subscribe()
+    # Clients are not expected to send anything; receiving notices the disconnect
+    incoming = asyncio.ensure_future(websocket.receive())
+    next_event = asyncio.ensure_future(queue.get())
+    try:
+        while True:
+            await asyncio.wait(
+                {next_event, incoming}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if incoming.done():
+                if incoming.result()["type"] == "websocket.disconnect":
+                    break
+                incoming = asyncio.ensure_future(websocket.receive())
+            if next_event.done():
+                payload = next_event.result()
+                if payload is realtime.OVERFLOW:
+                    await websocket.close(code=1013)
+                    break
+                await websocket.send_text(payload)
+                next_event = asyncio.ensure_future(queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        incoming.cancel()
+        next_event.cancel()
+        realtime.hub.unsubscribe(queue)
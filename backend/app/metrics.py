@@ -0,0 +1,148 @@
+"""Minimal in-process metrics registry rendered in the Prometheus text format."""
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_lock = threading.Lock()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in pairs
+    )
+    return "{" + inner + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, labelvalues, extra, value in self.samples():
+            labels = _format_labels(self.labelnames, labelvalues, extra)
+            lines.append(f"{self.name}{suffix}{labels} {value}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with _lock:
+            items = list(self._values.items())
+        return [("_total", key, (), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """Set directly, or computed at scrape time from `callback` returning
+    {labelvalues_tuple: value} (or a plain number without labels)."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with _lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        if self.callback is not None:
+            values = self.callback()
+            items = values.items() if isinstance(values, dict) else [((), values)]
+        else:
+            with _lock:
+                items = list(self._values.items())
+        return [("", key, (), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            counts, total = self._values.get(key) or (
+                [0] * (len(self.buckets) + 1),
+                0.0,
+            )
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels)) or ([0], 0.0)
+        return sum(counts)
+
+    def total(self, **labels):
+        _, total = self._values.get(self._key(labels)) or ([0], 0.0)
+        return total
+
+    def samples(self):
+        with _lock:
+            items = [
+                (key, (list(counts), total))
+                for key, (counts, total) in self._values.items()
+            ]
+        out = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                out.append(("_bucket", key, (("le", le),), cumulative))
+            out.append(("_sum", key, (), total))
+            out.append(("_count", key, (), cumulative))
+        return out
+
+
+def render() -> str:
+    with _lock:
+        metrics = list(_registry)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
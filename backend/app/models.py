@@ -1,10 +1,38 @@
-from sqlalchemy import Column, Integer, Text, ForeignKey, func, DateTime
+from sqlalchemy import (
+    DDL,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    JSON,
+    Text,
+    event,
+    func,
+    null,
+)
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
 from .database import Base
 
+# SQLite's CURRENT_TIMESTAMP has second precision; storing bound values with the
+# same format keeps keyset comparisons on created_at consistent in the SQLite fallback.
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(
+        storage_format=(
+            "%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+        ),
+        regexp=r"(\d+)-(\d+)-(\d+) (\d+):(\d+):(\d+)",
+    ),
+    "sqlite",
+)
+
 
 class User(Base):
     __tablename__ = "users"
+    # created_at/updated_at come back in the INSERT/UPDATE ... RETURNING itself;
+    # server_default=null() keeps updated_at out of a follow-up SELECT on insert
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     user_name = Column(
@@ -12,7 +40,9 @@ class User(Base):
     )  # Removido el mapeo a "name" para usar el nombre de columna real "user_name"
     password_hash = Column(Text, nullable=False)
     email = Column(Text, unique=True, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
+    # Maintained by the follows triggers below (fan-out skips celebrities)
+    follower_count = Column(Integer, nullable=False, server_default="0")
 
     messages = relationship("Message", back_populates="user")
     comments = relationship("Comment", back_populates="user")
@@ -20,30 +50,256 @@ class User(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     user_message = Column(
         Text, nullable=False
     )  # Removido el mapeo a "message" para usar "user_message"
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, server_default=null(), onupdate=func.now())
+    # Maintained by the comments triggers below, so the feed never counts rows
+    comment_count = Column(Integer, nullable=False, server_default="0")
 
     user = relationship("User", back_populates="messages")
+    # The database deletes them (ON DELETE CASCADE), the ORM does not load them
     comments = relationship(
-        "Comment", back_populates="message_to_comment", cascade="all, delete-orphan"
+        "Comment",
+        back_populates="message_to_comment",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        # Keyset pagination of the feed walks (created_at, id) backwards
+        Index("ix_messages_created_at_id", created_at.desc(), id.desc()),
+        # Same walk restricted to one author (GET /users/{id}/messages/)
+        Index(
+            "ix_messages_user_id_created_at_id", user_id, created_at.desc(), id.desc()
+        ),
     )
 
 
 class Comment(Base):
     __tablename__ = "comments"
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
-    message_id = Column(Integer, ForeignKey("messages.id"), nullable=False)
+    message_id = Column(
+        Integer, ForeignKey("messages.id", ondelete="CASCADE"), nullable=False
+    )
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     comment = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, server_default=null(), onupdate=func.now())
 
     user = relationship("User", back_populates="comments")
     message_to_comment = relationship("Message", back_populates="comments")
+
+    __table_args__ = (
+        # A message's thread, oldest first (get_comments_by_message and the batch)
+        Index("ix_comments_message_id_created_at", message_id, created_at),
+        # One author's comments, newest first (GET /users/{id}/comments/)
+        Index(
+            "ix_comments_user_id_created_at_id", user_id, created_at.desc(), id.desc()
+        ),
+    )
+
+
+class Follow(Base):
+    __tablename__ = "follows"
+
+    follower_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    followee_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    created_at = Column(Timestamp, server_default=func.now())
+
+    __table_args__ = (
+        # Fan-out reads the followers of an author (index-only in PostgreSQL)
+        Index("ix_follows_followee_id_follower_id", followee_id, follower_id),
+    )
+
+
+class TimelineEntry(Base):
+    """A message fanned out into the home timeline of one follower of its
+    author. created_at is copied from the message so a page is one index walk."""
+
+    __tablename__ = "timeline_entries"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    message_id = Column(
+        Integer, ForeignKey("messages.id", ondelete="CASCADE"), primary_key=True
+    )
+    created_at = Column(Timestamp, nullable=False)
+
+    __table_args__ = (
+        Index(
+            "ix_timeline_entries_user_id_created_at_message_id",
+            user_id,
+            created_at.desc(),
+            message_id.desc(),
+        ),
+    )
+
+
+class OutboxJob(Base):
+    """A background job waiting to run (JOBS_OUTBOX=true, see app/jobs.py)."""
+
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(Text, nullable=False)
+    key = Column(Text)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, server_default="0")
+    # Not claimed by a poller before this (the lease of the worker running it)
+    available_at = Column(Timestamp, nullable=False)
+    created_at = Column(Timestamp, server_default=func.now())
+    last_error = Column(Text)
+
+    __table_args__ = (Index("ix_outbox_available_at", available_at),)
+
+
+# comment_count is kept by the database itself: every path that inserts or
+# deletes comments (ORM, bulk INSERT, the ownership-checked DELETE) updates it
+# in the same transaction, without an extra statement from the application.
+event.listen(
+    Comment.__table__,
+    "after_create",
+    DDL(
+        """
+        CREATE OR REPLACE FUNCTION messages_comment_count() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE messages SET comment_count = comment_count + 1
+                WHERE id = NEW.message_id;
+            ELSE
+                UPDATE messages SET comment_count = comment_count - 1
+                WHERE id = OLD.message_id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+        CREATE TRIGGER comments_count AFTER INSERT OR DELETE ON comments
+        FOR EACH ROW EXECUTE FUNCTION messages_comment_count();
+        """
+    ).execute_if(dialect="postgresql"),
+)
+for ddl in (
+    """
+    CREATE TRIGGER comments_count_insert AFTER INSERT ON comments BEGIN
+        UPDATE messages SET comment_count = comment_count + 1
+        WHERE id = NEW.message_id;
+    END
+    """,
+    """
+    CREATE TRIGGER comments_count_delete AFTER DELETE ON comments BEGIN
+        UPDATE messages SET comment_count = comment_count - 1
+        WHERE id = OLD.message_id;
+    END
+    """,
+):
+    # SQLite runs one statement per execute
+    event.listen(
+        Comment.__table__, "after_create", DDL(ddl).execute_if(dialect="sqlite")
+    )
+
+
+# follower_count, same approach as comment_count
+event.listen(
+    Follow.__table__,
+    "after_create",
+    DDL(
+        """
+        CREATE OR REPLACE FUNCTION users_follower_count() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE users SET follower_count = follower_count + 1
+                WHERE id = NEW.followee_id;
+            ELSE
+                UPDATE users SET follower_count = follower_count - 1
+                WHERE id = OLD.followee_id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+        CREATE TRIGGER follows_count AFTER INSERT OR DELETE ON follows
+        FOR EACH ROW EXECUTE FUNCTION users_follower_count();
+        """
+    ).execute_if(dialect="postgresql"),
+)
+for ddl in (
+    """
+    CREATE TRIGGER follows_count_insert AFTER INSERT ON follows BEGIN
+        UPDATE users SET follower_count = follower_count + 1
+        WHERE id = NEW.followee_id;
+    END
+    """,
+    """
+    CREATE TRIGGER follows_count_delete AFTER DELETE ON follows BEGIN
+        UPDATE users SET follower_count = follower_count - 1
+        WHERE id = OLD.followee_id;
+    END
+    """,
+):
+    event.listen(
+        Follow.__table__, "after_create", DDL(ddl).execute_if(dialect="sqlite")
+    )
+
+# --- Full-text search ---
+# PostgreSQL: a generated tsvector column per table (so every write keeps it in
+# sync) behind a GIN index. It is not mapped: only crud.search_* reads it.
+SEARCH_CONFIG = "spanish"
+
+for table, text_column in (("messages", "user_message"), ("comments", "comment")):
+    event.listen(
+        Base.metadata.tables[table],
+        "after_create",
+        DDL(
+            f"""
+            ALTER TABLE {table} ADD COLUMN search_vector tsvector
+                GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', {text_column})) STORED;
+            CREATE INDEX ix_{table}_search_vector ON {table} USING GIN (search_vector);
+            """
+        ).execute_if(dialect="postgresql"),
+    )
+
+    # SQLite fallback: an external-content FTS5 table fed by triggers
+    fts = f"{table}_fts"
+    for ddl in (
+        f"""
+        CREATE VIRTUAL TABLE {fts} USING fts5(
+            {text_column}, content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        f"""
+        CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {text_column}) VALUES (NEW.id, NEW.{text_column});
+        END
+        """,
+        f"""
+        CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {text_column})
+            VALUES ('delete', OLD.id, OLD.{text_column});
+        END
+        """,
+        f"""
+        CREATE TRIGGER {fts}_update AFTER UPDATE OF {text_column} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {text_column})
+            VALUES ('delete', OLD.id, OLD.{text_column});
+            INSERT INTO {fts}(rowid, {text_column}) VALUES (NEW.id, NEW.{text_column});
+        END
+        """,
+    ):
+        event.listen(
+            Base.metadata.tables[table],
+            "after_create",
+            DDL(ddl).execute_if(dialect="sqlite"),
+        )
+    # The virtual table is not part of the metadata; drop it with its source
+    event.listen(
+        Base.metadata.tables[table],
+        "before_drop",
+        DDL(f"DROP TABLE IF EXISTS {fts}").execute_if(dialect="sqlite"),
+    )
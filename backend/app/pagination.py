@@ -0,0 +1,55 @@
+import base64
+import json
+import math
+from datetime import datetime
+
+# Ids are BIGINT at most; larger values cannot match a row (and overflow drivers)
+MAX_ROW_ID = 2**63 - 1
+# What a tampered cursor can raise while being decoded (besides ValueError)
+MALFORMED = (KeyError, TypeError, AttributeError, OverflowError, json.JSONDecodeError)
+
+
+# Opaque keyset cursors: base64url(JSON) of the sort key of the last row served.
+def _encode(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> dict:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def _row_id(value) -> int:
+    if type(value) is not int or not -MAX_ROW_ID - 1 <= value <= MAX_ROW_ID:
+        raise ValueError("Invalid cursor")
+    return value
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return _encode({"c": created_at.isoformat(), "i": row_id})
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Returns (created_at, id); raises ValueError for malformed cursors."""
+    try:
+        data = _decode(cursor)
+        return datetime.fromisoformat(data["c"]), _row_id(data["i"])
+    except MALFORMED as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+# Search results are ordered by relevance, so their key is (rank, id)
+def encode_rank_cursor(rank: float, row_id: int) -> str:
+    return _encode({"r": rank, "i": row_id})
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        data = _decode(cursor)
+        rank = data["r"]
+        if type(rank) not in (int, float) or not math.isfinite(rank):
+            raise ValueError("Invalid cursor")
+        return float(rank), _row_id(data["i"])
+    except MALFORMED as exc:
+        raise ValueError("Invalid cursor") from exc
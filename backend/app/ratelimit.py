@@ -0,0 +1,205 @@
+"""Token-bucket rate limiting for the expensive endpoints (bcrypt and writes).
+
+Each limiter allows bursts of `capacity` requests and refills at
+capacity / period tokens per second. A bucket is just (tokens, last update);
+one that has been idle long enough to be full again is indistinguishable from
+a missing one, so idle buckets are evicted. The default store lives in the
+worker process; RATE_LIMIT_URL=redis://... shares the buckets between
+uvicorn workers.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import metrics
+from .config import settings
+
+RATE_LIMIT_URL = settings.rate_limit_url
+# Hard cap per limiter on buckets kept in memory; the oldest go first
+RATE_LIMIT_MAX_KEYS = settings.rate_limit_max_keys
+
+rate_limited = metrics.Counter(
+    "rate_limited", "Requests rejected by a rate limiter", ["limiter"]
+)
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int  # seconds until the bucket is full again
+    retry_after: int = 0  # seconds until the next request fits (when denied)
+
+
+class RateLimited(Exception):
+    def __init__(self, decision: Decision):
+        super().__init__("Rate limit exceeded")
+        self.decision = decision
+
+
+@dataclass(frozen=True)
+class Limiter:
+    name: str
+    capacity: int
+    period: float  # seconds to refill an empty bucket
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    def decide(self, tokens: float, allowed: bool) -> Decision:
+        return Decision(
+            allowed=allowed,
+            limit=self.capacity,
+            remaining=max(int(tokens), 0),
+            reset=math.ceil((self.capacity - tokens) / self.rate),
+            retry_after=0 if allowed else math.ceil((1 - tokens) / self.rate),
+        )
+
+
+def parse_limiter(name: str, spec: str) -> Limiter:
+    """RATE_LIMIT_<NAME>="<requests>/<seconds>", e.g. "10/60"."""
+    capacity, _, period = spec.partition("/")
+    return Limiter(name, int(capacity), float(period or 1))
+
+
+class MemoryStore:
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        # One LRU per limiter: all its buckets take the same time to refill, so
+        # least recently used is also first to be full (and evictable)
+        self._buckets: dict[str, OrderedDict] = {}
+        self._lock = threading.Lock()
+
+    async def hit(self, limiter: Limiter, key: str) -> Decision:
+        now = self.clock()
+        with self._lock:
+            buckets = self._buckets.setdefault(limiter.name, OrderedDict())
+            tokens, updated = buckets.pop(key, (limiter.capacity, now))
+            tokens = min(limiter.capacity, tokens + (now - updated) * limiter.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            buckets[key] = (tokens, now)
+            self._evict(limiter, buckets, now)
+        return limiter.decide(tokens, allowed)
+
+    def _evict(self, limiter: Limiter, buckets: OrderedDict, now: float):
+        while buckets:
+            tokens, updated = next(iter(buckets.values()))
+            idle_full = tokens + (now - updated) * limiter.rate >= limiter.capacity
+            if not idle_full and len(buckets) <= self.max_keys:
+                break
+            buckets.popitem(last=False)
+
+    def size(self, limiter_name: str) -> int:
+        return len(self._buckets.get(limiter_name, ()))
+
+
+# Refill, take and expire in one atomic step, on Redis' clock so that workers
+# with skewed clocks agree
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisStore:
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # optional dependency: pip install redis
+
+        self.client = redis.from_url(url)
+        self.script = self.client.register_script(TOKEN_BUCKET_LUA)
+
+    async def hit(self, limiter: Limiter, key: str) -> Decision:
+        allowed, tokens = await self.script(
+            keys=[f"ratelimit:{limiter.name}:{key}"],
+            args=[limiter.capacity, limiter.rate],
+        )
+        return limiter.decide(float(tokens), bool(allowed))
+
+
+def create_store(url: str = RATE_LIMIT_URL):
+    if url in ("", "off", "none"):
+        return None
+    if url == "memory":
+        return MemoryStore()
+    return RedisStore(url)
+
+
+store = create_store()
+
+login = parse_limiter("login", settings.rate_limit_login)
+signup = parse_limiter("signup", settings.rate_limit_signup)
+messages = parse_limiter("messages", settings.rate_limit_messages)
+comments = parse_limiter("comments", settings.rate_limit_comments)
+# Bulk endpoints: one token per chunk of up to BULK_CHUNK_SIZE items
+bulk = parse_limiter("bulk", settings.rate_limit_bulk)
+
+
+def headers(decision: Decision) -> dict[str, str]:
+    result = {
+        "RateLimit-Limit": str(decision.limit),
+        "RateLimit-Remaining": str(decision.remaining),
+        "RateLimit-Reset": str(decision.reset),
+    }
+    if not decision.allowed:
+        result["Retry-After"] = str(decision.retry_after)
+    return result
+
+
+class RateLimitHeadersMiddleware:
+    """Adds the RateLimit-* headers of the decision a route's limiter stored in
+    request.state, also on error responses (e.g. a failed login)."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                decision = scope.get("state", {}).get("rate_limit")
+                if decision is not None:
+                    response_headers = MutableHeaders(scope=message)
+                    for name, value in headers(decision).items():
+                        response_headers.setdefault(name, value)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+async def check(limiter: Limiter, key: str) -> Decision | None:
+    """Takes a token for `key`; raises RateLimited when the bucket is empty.
+    Returns None when rate limiting is off."""
+    if store is None:
+        return None
+    decision = await store.hit(limiter, key)
+    if not decision.allowed:
+        rate_limited.inc(limiter=limiter.name)
+        raise RateLimited(decision)
+    return decision
@@ -0,0 +1,173 @@
+"""Pushes feed changes to connected clients over /ws/feed.
+
+Each connection is a bounded asyncio.Queue plus the coroutine serving it, so
+idle sockets cost a few kilobytes and no polling. Events are serialized once
+and the same string is fanned out to every subscriber. With PostgreSQL, events
+go through NOTIFY and every worker (this one included) LISTENs and fans them
+out to its own connections, so clients see writes handled by any worker.
+"""
+import asyncio
+import json
+import logging
+
+from sqlalchemy.engine import make_url
+
+from . import jobs, metrics
+from .config import settings
+from .database import SQLALCHEMY_DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+FEED_WS_QUEUE_SIZE = settings.feed_ws_queue_size
+NOTIFY_CHANNEL = "feed_events"
+# NOTIFY payloads must stay under 8000 bytes; bigger events are sent without text
+NOTIFY_MAX_PAYLOAD = 7900
+BRIDGE_RETRY_SECONDS = 5
+
+events_published = metrics.Counter(
+    "realtime_events", "Feed events published to connected clients", ["type"]
+)
+subscribers_dropped = metrics.Counter(
+    "realtime_subscribers_dropped", "Connections closed for falling behind"
+)
+
+# Sentinel queued for a subscriber that fell too far behind
+OVERFLOW = None
+
+
+class FeedHub:
+    def __init__(self, queue_size: int = FEED_WS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.bridge = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def broadcast(self, payload: str):
+        """Fans a serialized event out to this worker's connections."""
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # The client is too slow: it gets closed and resyncs on reconnect
+                self.unsubscribe(queue)
+                subscribers_dropped.inc()
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(OVERFLOW)
+
+    async def publish(self, event_type: str, data: dict):
+        events_published.inc(type=event_type)
+        payload = json.dumps({"type": event_type, "data": data}, default=str)
+        delivered = self.bridge is not None and await self.bridge.notify(
+            event_type, data, payload
+        )
+        if not delivered:
+            self.broadcast(payload)
+
+    async def start(self, database_url: str = SQLALCHEMY_DATABASE_URL):
+        if make_url(database_url).get_backend_name() == "postgresql":
+            self.bridge = PostgresBridge(self, database_url)
+            await self.bridge.start()
+
+    async def stop(self):
+        if self.bridge is not None:
+            await self.bridge.stop()
+            self.bridge = None
+
+
+class PostgresBridge:
+    """LISTEN/NOTIFY relay between the workers sharing the database."""
+
+    def __init__(self, hub: FeedHub, database_url: str):
+        self.hub = hub
+        url = make_url(database_url).set(drivername="postgresql")
+        self.dsn = url.render_as_string(hide_password=False)
+        self.connection = None
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    async def start(self):
+        """Connects in the background: until LISTEN is up, events are
+        broadcast locally (see notify)."""
+        self._task = asyncio.create_task(self._keep_listening())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+
+    async def _connect(self):
+        import asyncpg
+
+        try:
+            self.connection = await asyncpg.connect(self.dsn)
+            await self.connection.add_listener(NOTIFY_CHANNEL, self._on_notify)
+            logger.info("Listening for feed events on %s", NOTIFY_CHANNEL)
+        except (OSError, asyncpg.PostgresError):
+            logger.exception("Feed LISTEN connection failed, retrying")
+            self.connection = None
+
+    async def _keep_listening(self):
+        while True:
+            if self.connection is None or self.connection.is_closed():
+                await self._connect()
+            await asyncio.sleep(BRIDGE_RETRY_SECONDS)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.hub.broadcast(payload)
+
+    async def notify(self, event_type: str, data: dict, payload: str) -> bool:
+        """Returns False when NOTIFY is unavailable, so the caller falls back
+        to a local broadcast."""
+        if self.connection is None or self.connection.is_closed():
+            return False
+        if len(payload.encode()) > NOTIFY_MAX_PAYLOAD:
+            keys = ("id", "message_id", "user_id")
+            slim = {key: data[key] for key in keys if key in data}
+            payload = json.dumps({"type": event_type, "data": slim, "partial": True})
+        try:
+            async with self._lock:
+                await self.connection.execute(
+                    "SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, payload
+                )
+        except Exception:
+            logger.exception("NOTIFY failed, broadcasting locally")
+            return False
+        return True
+
+
+hub = FeedHub()
+
+
+@jobs.handler("realtime.publish")
+async def _publish_job(type: str, data: dict):
+    await hub.publish(type, data)
+
+
+async def enqueue(event_type: str, data: dict, db):
+    """Publishes the event from a background job once the transaction of `db`
+    commits (see jobs.commit); the shared key keeps events in order."""
+    await jobs.enqueue(
+        "realtime.publish",
+        {"type": event_type, "data": data},
+        key="realtime",
+        db=db,
+    )
+
+
+metrics.Gauge(
+    "realtime_connections",
+    "Open /ws/feed connections in this worker",
+    callback=lambda: len(hub.subscribers),
+)
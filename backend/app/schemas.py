@@ -49,6 +49,28 @@ class MessageOut(BaseModel):
     user_id: int
     user_message: str
     user_name: str | None = None  # Agregamos esto para devolver el nombre
+    comment_count: int = 0  # Mantenido por la base de datos, sin contar por post
 
     class Config:
         from_attributes = True
+
+
+class BulkError(BaseModel):
+    index: int  # Posición del elemento (o línea NDJSON) dentro del lote
+    detail: str
+
+
+class BulkResult(BaseModel):
+    inserted: int
+    ids: list[int]
+    errors: list[BulkError]
+
+
+class SearchHit(BaseModel):
+    type: str  # "message" o "comment"
+    id: int
+    message_id: int  # Para un mensaje es su propio id
+    user_id: int
+    user_name: str | None = None
+    text: str
+    rank: float  # Relevancia, mayor es mejor
@@ -0,0 +1,65 @@
+"""Home timelines (GET /timeline/): fan-out on write with a fan-out-on-read
+fallback for celebrities.
+
+A new message is copied into the timeline_entries of every follower of its
+author by a background job (app/jobs.py), so reading a timeline is one index
+walk instead of a join over everyone the reader follows. Authors with TIMELINE_CELEBRITY_FOLLOWERS
+followers or more are not fanned out (one post would mean that many writes);
+their messages, and the reader's own, are merged in when the timeline is read.
+
+Timelines keep roughly the newest TIMELINE_MAX_LENGTH entries: trimming is a
+window-function DELETE, so it runs once every TIMELINE_TRIM_EVERY messages
+instead of on every post.
+"""
+
+from . import crud_async, jobs
+from .config import settings
+
+TIMELINE_CELEBRITY_FOLLOWERS = settings.timeline_celebrity_followers
+TIMELINE_MAX_LENGTH = settings.timeline_max_length
+TIMELINE_TRIM_EVERY = settings.timeline_trim_every
+# Messages of a newly followed user copied into the follower's timeline
+TIMELINE_BACKFILL = settings.timeline_backfill
+
+
+async def fan_out(db, author_id: int, message_ids: list[int]):
+    """Fans out freshly committed messages of `author_id`, in chunks of ids."""
+    for start in range(0, len(message_ids), 1000):
+        await crud_async.fan_out_messages(
+            db, message_ids[start : start + 1000], TIMELINE_CELEBRITY_FOLLOWERS
+        )
+    if any(message_id % TIMELINE_TRIM_EVERY == 0 for message_id in message_ids):
+        await crud_async.trim_timelines(db, author_id, TIMELINE_MAX_LENGTH)
+    await crud_async.commit(db)
+
+
+@jobs.handler("timeline.fan_out")
+async def _fan_out_job(author_id: int, message_ids: list[int]):
+    async with jobs.session() as db:
+        await fan_out(db, author_id, message_ids)
+
+
+async def enqueue_fan_out(author_id: int, message_ids: list[int], db):
+    """Fans the messages out in the background, once the transaction of `db`
+    that inserts them commits (see jobs.commit)."""
+    await jobs.enqueue(
+        "timeline.fan_out",
+        {"author_id": author_id, "message_ids": message_ids},
+        db=db,
+    )
+
+
+async def follow(db, follower_id: int, followee_id: int) -> bool:
+    return await crud_async.follow_user(
+        db, follower_id, followee_id, backfill=TIMELINE_BACKFILL
+    )
+
+
+async def unfollow(db, follower_id: int, followee_id: int) -> bool:
+    return await crud_async.unfollow_user(db, follower_id, followee_id)
+
+
+async def read(db, user_id: int, limit: int, after=None):
+    return await crud_async.get_home_timeline(
+        db, user_id, TIMELINE_CELEBRITY_FOLLOWERS, limit=limit, after=after
+    )
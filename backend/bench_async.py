@@ -0,0 +1,123 @@
+"""Load test of the feed and comment endpoints with DB_ASYNC off and on.
+
+    python bench_async.py --requests 2000 --concurrency 50
+
+Each mode runs in its own process against the same seeded database (a
+throwaway SQLite file unless DATABASE_URL is set; its tables are recreated).
+Requests go straight to the ASGI app through httpx, so the numbers measure the
+app and the database, not the network. The feed cache is off.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--requests", type=int, default=2000)
+parser.add_argument("--concurrency", type=int, default=50)
+parser.add_argument("--messages", type=int, default=500)
+parser.add_argument("--comments", type=int, default=20, help="comments per message")
+parser.add_argument("--worker", choices=["sync", "async"], help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db"
+)
+# Every feed request must reach the database, not the cached first pages
+os.environ["FEED_CACHE_URL"] = "off"
+
+
+def seed():
+    from app import models
+    from app.database import engine
+
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            models.User.__table__.insert(),
+            [
+                {"id": i, "user_name": f"user{i}", "email": f"u{i}@example.com", "password_hash": "x"}
+                for i in range(1, 51)
+            ],
+        )
+        conn.execute(
+            models.Message.__table__.insert(),
+            [{"user_id": i % 50 + 1, "user_message": f"message {i}"} for i in range(args.messages)],
+        )
+        conn.execute(
+            models.Comment.__table__.insert(),
+            [
+                {"message_id": m, "user_id": c % 50 + 1, "comment": f"comment {c}"}
+                for m in range(1, args.messages + 1)
+                for c in range(args.comments)
+            ],
+        )
+
+
+async def drive(path_for):
+    import httpx
+
+    from app.main import app
+
+    latencies = []
+    counter = iter(range(args.requests))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def worker():
+            for i in counter:
+                started = time.perf_counter()
+                response = await client.get(path_for(i))
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+async def run_worker():
+    return {
+        "feed": await drive(lambda i: "/messages/?limit=100"),
+        "comments": await drive(lambda i: f"/messages/{i % args.messages + 1}/comments/"),
+    }
+
+
+def main():
+    if args.worker:
+        print(json.dumps(asyncio.run(run_worker())))
+        return
+
+    seed()
+    results = {}
+    for mode in ("sync", "async"):
+        env = dict(os.environ, DB_ASYNC="true" if mode == "async" else "false")
+        out = subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], "--worker", mode],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        results[mode] = json.loads(out.strip().splitlines()[-1])
+
+    print(f"{args.requests} requests per endpoint, concurrency {args.concurrency}")
+    print(f"{'endpoint':<10} {'mode':<6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for endpoint in ("feed", "comments"):
+        for mode, result in results.items():
+            r = result[endpoint]
+            print(f"{endpoint:<10} {mode:<6} {r['rps']:>9} {r['p50_ms']:>9} {r['p99_ms']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+"""Load test of every HTTP route of app.main against a freshly seeded database.
+
+    python bench_load.py --users 50 --messages 2000 --comments 5 \
+        --requests 500 --concurrency 20 --output bench-results.json
+    python bench_load.py ... --compare bench-results-previous.json
+
+Seeds a throwaway SQLite file unless DATABASE_URL is set (its tables are
+recreated, never point it at a database you care about). Requests go to the
+ASGI app in-process through an async httpx client, so the SQL statements of
+each request can be counted; with --url they go to a running server instead
+and the SQL count is left out. Rate limiting is turned off for the run.
+
+For every route it reports throughput, p50/p95/p99 latency (ms), errors and
+SQL statements per request, and writes them as JSON. --compare exits with
+status 1 when any route's p95 grew more than --max-regression times.
+"""
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+PASSWORD = "bench-password"
+
+# Route being measured by the current request (copied into the threadpool
+# and run_sync workers, so SQL executed for it can be attributed)
+current_route = contextvars.ContextVar("current_route", default=None)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--comments", type=int, default=5, help="comments per message")
+    parser.add_argument("--follows", type=int, default=10, help="followees per user")
+    parser.add_argument("--requests", type=int, default=500, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--auth-requests",
+        type=int,
+        default=50,
+        help="requests for /login and /users/ (each one runs bcrypt)",
+    )
+    parser.add_argument("--url", help="benchmark a running server instead")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=1.25)
+    return parser.parse_args(argv)
+
+
+def seed(args):
+    """Bulk inserts through Core (one bcrypt hash shared by every user). Also
+    seeds rows reserved for the destructive routes so each request gets its own."""
+    from app import auth, crud, models, timelines
+    from app.database import SessionLocal, engine
+
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    password_hash = auth.get_password_hash(PASSWORD)
+    users = [
+        {
+            "id": i,
+            "user_name": f"user{i}",
+            "email": f"user{i}@example.com",
+            "password_hash": password_hash,
+        }
+        for i in range(1, args.users + 1)
+    ]
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(), users)
+        follows = [
+            {"follower_id": i, "followee_id": (i - 1 + j) % args.users + 1}
+            for i in range(1, args.users + 1)
+            for j in range(1, min(args.follows, args.users - 1) + 1)
+        ]
+        if follows:
+            conn.execute(models.Follow.__table__.insert(), follows)
+        conn.execute(
+            models.Message.__table__.insert(),
+            [
+                {"user_id": i % args.users + 1, "user_message": f"mensaje {i} del feed"}
+                for i in range(args.messages)
+            ],
+        )
+        conn.execute(
+            models.Comment.__table__.insert(),
+            [
+                {"message_id": m, "user_id": c % args.users + 1, "comment": f"comentario {c}"}
+                for m in range(1, args.messages + 1)
+                for c in range(args.comments)
+            ],
+        )
+        # Owned by user 1 and without comments: targets for DELETE /messages/{id}
+        first = conn.execute(
+            models.Message.__table__.insert().returning(models.Message.id),
+            [{"user_id": 1, "user_message": "para borrar"} for _ in range(args.requests)],
+        ).scalars().all()
+        doomed_comments = conn.execute(
+            models.Comment.__table__.insert().returning(models.Comment.id),
+            [
+                {"message_id": 1, "user_id": 1, "comment": "para borrar"}
+                for _ in range(args.requests)
+            ],
+        ).scalars().all()
+    # Home timelines as POST /messages/ would have left them
+    with SessionLocal() as db:
+        for start in range(1, args.messages + 1, 1000):
+            crud.fan_out_messages(
+                db,
+                range(start, min(start + 1000, args.messages + 1)),
+                timelines.TIMELINE_CELEBRITY_FOLLOWERS,
+            )
+        db.commit()
+    return {
+        "users": [user["id"] for user in users],
+        "messages": list(range(1, args.messages + 1)),
+        "doomed_messages": sorted(first),
+        "doomed_comments": sorted(doomed_comments),
+    }
+
+
+def scenarios(args, data, token):
+    """(method, route path, request builder) for every route. The builder turns
+    the request number into (url, keyword arguments for httpx)."""
+    from app import pagination
+
+    auth = {"headers": {"Authorization": f"Bearer {token}"}}
+    messages = data["messages"]
+    owned = [m for m in messages if (m - 1) % args.users == 0]  # user 1's
+    deep_cursor = pagination.encode_cursor(
+        datetime.now(timezone.utc), messages[len(messages) // 2]
+    )
+    bulk_messages = [{"user_message": f"masivo {i}"} for i in range(100)]
+
+    def pick(items, i):
+        return items[i % len(items)]
+
+    return {
+        "signup": (
+            "POST",
+            "/users/",
+            lambda i: (
+                "/users/",
+                {
+                    "json": {
+                        "user_name": f"nuevo{i}",
+                        "email": f"nuevo{i}@example.com",
+                        "password": PASSWORD,
+                    }
+                },
+            ),
+        ),
+        "login": (
+            "POST",
+            "/login",
+            lambda i: (
+                "/login",
+                {
+                    "data": {
+                        "username": f"user{pick(data['users'], i)}@example.com",
+                        "password": PASSWORD,
+                    }
+                },
+            ),
+        ),
+        "me": ("GET", "/users/me/", lambda i: ("/users/me/", auth)),
+        "home_timeline": ("GET", "/timeline/", lambda i: ("/timeline/", auth)),
+        "metrics": ("GET", "/metrics", lambda i: ("/metrics", {})),
+        "healthz": ("GET", "/healthz", lambda i: ("/healthz", {})),
+        "readyz": ("GET", "/readyz", lambda i: ("/readyz", {})),
+        "feed_first_page": ("GET", "/messages/", lambda i: ("/messages/?limit=20", {})),
+        "feed_deep_page": (
+            "GET",
+            "/messages/",
+            lambda i: (f"/messages/?limit=20&cursor={deep_cursor}", {}),
+        ),
+        "message_comments": (
+            "GET",
+            "/messages/{message_id}/comments/",
+            lambda i: (f"/messages/{pick(messages, i)}/comments/", {}),
+        ),
+        "comments_batch": (
+            "GET",
+            "/comments/",
+            lambda i: (
+                "/comments/?message_ids="
+                + ",".join(str(pick(messages, i + j)) for j in range(20)),
+                {},
+            ),
+        ),
+        "user_messages": (
+            "GET",
+            "/users/{user_id}/messages/",
+            lambda i: (f"/users/{pick(data['users'], i)}/messages/", {}),
+        ),
+        "user_comments": (
+            "GET",
+            "/users/{user_id}/comments/",
+            lambda i: (f"/users/{pick(data['users'], i)}/comments/", {}),
+        ),
+        "search": (
+            "GET",
+            "/search",
+            lambda i: (f"/search?q=mensaje {pick(messages, i)}", {}),
+        ),
+        "create_message": (
+            "POST",
+            "/messages/",
+            lambda i: ("/messages/", {"json": {"user_message": f"nuevo {i}"}, **auth}),
+        ),
+        "update_message": (
+            "PUT",
+            "/messages/{message_id}",
+            lambda i: (
+                f"/messages/{pick(owned, i)}",
+                {"json": {"user_message": f"editado {i}"}, **auth},
+            ),
+        ),
+        "bulk_messages": (
+            "POST",
+            "/messages/bulk",
+            lambda i: ("/messages/bulk", {"json": bulk_messages, **auth}),
+        ),
+        "create_comment": (
+            "POST",
+            "/comments/",
+            lambda i: (
+                "/comments/",
+                {"json": {"message_id": pick(messages, i), "comment": f"c {i}"}, **auth},
+            ),
+        ),
+        "bulk_comments": (
+            "POST",
+            "/comments/bulk",
+            lambda i: (
+                "/comments/bulk",
+                {
+                    "json": [
+                        {"message_id": pick(messages, i + j), "comment": f"masivo {j}"}
+                        for j in range(100)
+                    ],
+                    **auth,
+                },
+            ),
+        ),
+        "update_comment": (
+            "PUT",
+            "/comments/{comment_id}",
+            lambda i: (
+                f"/comments/{pick(data['doomed_comments'], i)}",
+                {"json": {"comment": f"editado {i}"}, **auth},
+            ),
+        ),
+        "delete_comment": (
+            "DELETE",
+            "/comments/{comment_id}",
+            lambda i: (f"/comments/{data['doomed_comments'][i]}", auth),
+        ),
+        "follow": (
+            "POST",
+            "/users/{user_id}/follow",
+            lambda i: (f"/users/{pick(data['users'][1:], i)}/follow", auth),
+        ),
+        "unfollow": (
+            "DELETE",
+            "/users/{user_id}/follow",
+            lambda i: (f"/users/{pick(data['users'][1:], i)}/follow", auth),
+        ),
+        "delete_message": (
+            "DELETE",
+            "/messages/{message_id}",
+            lambda i: (f"/messages/{data['doomed_messages'][i]}", auth),
+        ),
+    }
+
+
+class SQLCounter:
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def __call__(self, conn, cursor, statement, *args):
+        route = current_route.get()
+        if route is not None:
+            with self._lock:
+                self.counts[route] += 1
+
+    def install(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        # On the Engine class: covers the primary, replicas and async engines
+        event.listen(Engine, "before_cursor_execute", self)
+
+    def uninstall(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        event.remove(Engine, "before_cursor_execute", self)
+
+
+def percentile(samples, q):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1]
+
+
+async def run_route(client, name, method, build, total, concurrency):
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        current_route.set(name)
+        for i in counter:
+            url, kwargs = build(i)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+async def run(args, data):
+    import httpx
+
+    from app import auth, models
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        token = auth.create_user_token(db.get(models.User, 1))
+    routes = scenarios(args, data, token)
+
+    counter = None
+    lifespan = contextlib.nullcontext()
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        from app.main import app
+
+        counter = SQLCounter()
+        counter.install()
+        lifespan = app.router.lifespan_context(app)
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60
+        )
+
+    results = {}
+    async with lifespan, client:
+        if counter is not None:
+            from app import health
+
+            # The pool warm-up would otherwise race the first measured routes
+            await health.state.wait()
+        for name, (method, _, build) in routes.items():
+            total = args.requests
+            if name in ("login", "signup"):
+                total = min(total, args.auth_requests)
+            result = await run_route(
+                client, name, method, build, total, args.concurrency
+            )
+            if counter is not None:
+                result["sql_per_request"] = round(counter.counts[name] / total, 2)
+            results[name] = result
+            print(
+                f"{name:<18} {result['throughput_rps']:>9.1f} {result['p50_ms']:>8.2f}"
+                f" {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+                f" {result.get('sql_per_request', '-'):>6} {result['errors']:>6}"
+            )
+    if counter is not None:
+        counter.uninstall()
+    return results
+
+
+def compare(results, previous_path, max_regression):
+    with open(previous_path) as f:
+        previous = json.load(f)["routes"]
+    regressions = []
+    for name, result in results.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        ratio = result["p95_ms"] / before["p95_ms"] if before["p95_ms"] else 1
+        flag = "  <-- regression" if ratio > max_regression else ""
+        print(f"{name:<18} p95 {before['p95_ms']:>8.2f} -> {result['p95_ms']:>8.2f} ms{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault(
+        "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db"
+    )
+
+    from app import ratelimit
+
+    ratelimit.store = None
+    data = seed(args)
+    print(
+        f"{args.users} users, {args.messages} messages x {args.comments} comments,"
+        f" {args.requests} requests per route, concurrency {args.concurrency}"
+    )
+    print(
+        f"{'route':<18} {'req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8}"
+        f" {'sql':>6} {'errors':>6}"
+    )
+    results = asyncio.run(run(args, data))
+
+    report = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+            "target": args.url or "in-process",
+            "python": platform.python_version(),
+            **{
+                key: getattr(args, key)
+                for key in ("users", "messages", "comments", "requests", "concurrency")
+            },
+        },
+        "routes": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.max_regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Compares OFFSET vs keyset (cursor) pagination of the feed at increasing page depth.
+
+    python bench_pagination.py --rows 50000 --limit 20
+
+Seeds a throwaway SQLite database unless DATABASE_URL points somewhere else
+(never point it at a database you care about: the tables are recreated).
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=50000)
+parser.add_argument("--limit", type=int, default=20)
+parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000, 2500])
+parser.add_argument("--repeat", type=int, default=20)
+args = parser.parse_args()
+
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db"
+)
+
+from app import crud, models  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+
+
+def seed():
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(
+            models.User.__table__.insert(),
+            [{"id": 1, "user_name": "bench", "email": "bench@example.com", "password_hash": "x"}],
+        )
+        conn.execute(
+            models.Message.__table__.insert(),
+            [
+                {"user_id": 1, "user_message": f"message {i}", "created_at": start + timedelta(seconds=i)}
+                for i in range(args.rows)
+            ],
+        )
+
+
+def timed(fn):
+    samples = []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    seed()
+    db = SessionLocal()
+    print(f"{args.rows} rows, limit={args.limit}, median of {args.repeat} runs (ms)")
+    print(f"{'page':>6} {'offset':>10} {'cursor':>10}")
+    for page in args.pages:
+        skip = (page - 1) * args.limit
+        if skip >= args.rows:
+            continue
+        after = None
+        if skip:
+            # The cursor a client would hold after reading the previous page
+            last = crud.get_messages(db, skip=skip - 1, limit=1)[0]
+            after = (last.created_at, last.id)
+        offset_ms = timed(lambda: crud.get_messages(db, skip=skip, limit=args.limit))
+        cursor_ms = timed(lambda: crud.get_messages(db, limit=args.limit, after=after))
+        print(f"{page:>6} {offset_ms:>10.2f} {cursor_ms:>10.2f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Serialization cost of a list response per 1k rows, for the messages and
+comments shapes: FastAPI's default path (response_model validation +
+serialization + JSONResponse) against FastJSONResponse with orjson and with
+its stdlib fallback.
+
+    python bench_serialization.py --rows 1000 --repeat 200
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=1000)
+parser.add_argument("--repeat", type=int, default=200)
+args = parser.parse_args()
+
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db"
+)
+
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app import fastjson  # noqa: E402
+from app.main import app  # noqa: E402
+
+SHAPES = {
+    "/users/{user_id}/messages/": lambda i: {
+        "id": i,
+        "user_id": i % 50,
+        "user_message": f"mensaje número {i} con algo de texto para el feed",
+        "user_name": f"usuario{i % 50}",
+        "comment_count": i % 7,
+    },
+    "/users/{user_id}/comments/": lambda i: {
+        "id": i,
+        "message_id": i // 3,
+        "user_id": i % 50,
+        "comment": f"comentario {i}",
+        "user_name": f"usuario{i % 50}",
+    },
+}
+
+
+def response_field(path):
+    return next(route.response_field for route in app.routes if route.path == path)
+
+
+def default_path(field, rows):
+    # What FastAPI does with a list returned from a route with response_model
+    value, errors = field.validate(rows, {}, loc=("response",))
+    assert not errors
+    return JSONResponse(field.serialize(value)).body
+
+
+def stdlib_path(rows):
+    return json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def timed(fn):
+    samples = []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples) * 1000 / args.rows
+
+
+def main():
+    print(f"{args.rows} rows, median of {args.repeat} runs (ms per 1k rows)")
+    print(f"{'endpoint':<28} {'response_model':>14} {'orjson':>8} {'stdlib':>8}")
+    for path, make_row in SHAPES.items():
+        rows = [make_row(i) for i in range(args.rows)]
+        field = response_field(path)
+        assert json.loads(default_path(field, rows)) == json.loads(fastjson.dumps(rows))
+        default_ms = timed(lambda: default_path(field, rows))
+        orjson_ms = (
+            timed(lambda: fastjson.FastJSONResponse(rows).body)
+            if fastjson.orjson is not None
+            else float("nan")
+        )
+        stdlib_ms = timed(lambda: stdlib_path(rows))
+        print(f"{path:<28} {default_ms:>14.3f} {orjson_ms:>8.3f} {stdlib_ms:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
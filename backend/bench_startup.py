@@ -0,0 +1,124 @@
+"""Startup time of a worker: import, lifespan warm-up and first requests.
+
+    python bench_startup.py --runs 10 --output startup.json
+
+Every run is a fresh interpreter (like a new uvicorn worker) against the same
+database (a throwaway SQLite file unless DATABASE_URL is set; its tables are
+recreated). It reports, in ms:
+
+- process: from spawning the interpreter until the worker is ready
+- import: `import app.main` (settings, models and routes; no engine, no bcrypt)
+- ready: lifespan start until /readyz would answer 200 (engine, bcrypt context
+  and DB_POOL_WARMUP pooled connections)
+- first_readyz, first_feed: the first GET /readyz and GET /messages/ afterwards
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--runs", type=int, default=10)
+parser.add_argument("--output", help="write the runs and the summary as JSON")
+parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db"
+)
+
+METRICS = ("process", "import", "ready", "first_readyz", "first_feed")
+
+
+def seed():
+    from app import models
+    from app.database import engine
+
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            models.User.__table__.insert(),
+            [{"id": 1, "user_name": "user1", "email": "u1@example.com", "password_hash": "x"}],
+        )
+        conn.execute(
+            models.Message.__table__.insert(),
+            [{"user_id": 1, "user_message": f"message {i}"} for i in range(100)],
+        )
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+async def warm_up(app, timings):
+    import httpx
+
+    from app import health
+
+    started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        await health.state.wait()
+        timings["ready"] = elapsed_ms(started)
+        # Wall clock, compared with the parent's spawn time
+        timings["ready_at"] = time.time()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, path in (("first_readyz", "/readyz"), ("first_feed", "/messages/")):
+                started = time.perf_counter()
+                response = await client.get(path)
+                timings[name] = elapsed_ms(started)
+                assert response.status_code == 200, response.text
+
+
+def run_worker():
+    timings = {}
+    started = time.perf_counter()
+    from app.main import app
+
+    timings["import"] = elapsed_ms(started)
+    asyncio.run(warm_up(app, timings))
+    print(json.dumps(timings))
+
+
+def main():
+    if args.worker:
+        run_worker()
+        return
+
+    seed()
+    runs = []
+    for _ in range(args.runs):
+        spawned = time.time()
+        out = subprocess.run(
+            [sys.executable, __file__, "--worker"],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        timings = json.loads(out.strip().splitlines()[-1])
+        # The interpreter's own start-up is part of what a new worker costs
+        timings["process"] = round((timings.pop("ready_at") - spawned) * 1000, 2)
+        runs.append(timings)
+
+    summary = {
+        name: {
+            "median_ms": round(statistics.median(run[name] for run in runs), 2),
+            "max_ms": max(run[name] for run in runs),
+        }
+        for name in METRICS
+    }
+    print(f"{args.runs} runs, {os.environ['DATABASE_URL'].split(':', 1)[0]}")
+    print(f"{'phase':<14} {'median ms':>10} {'max ms':>10}")
+    for name, result in summary.items():
+        print(f"{name:<14} {result['median_ms']:>10} {result['max_ms']:>10}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"runs": runs, "summary": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Keyset and per-author indexes for the feed, timelines and comment threads
+
+On PostgreSQL the indexes are built CONCURRENTLY (outside the migration
+transaction), so existing tables keep accepting writes while they build.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_messages_created_at_id": (
+        "messages",
+        [sa.text("created_at DESC"), sa.text("id DESC")],
+    ),
+    "ix_messages_user_id_created_at_id": (
+        "messages",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+    ),
+    "ix_comments_message_id_created_at": ("comments", ["message_id", "created_at"]),
+    "ix_comments_user_id_created_at_id": (
+        "comments",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+    ),
+}
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            for name, (table, columns) in INDEXES.items():
+                op.create_index(
+                    name,
+                    table,
+                    columns,
+                    postgresql_concurrently=True,
+                    if_not_exists=True,
+                )
+    else:
+        for name, (table, columns) in INDEXES.items():
+            op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            for name, (table, _) in INDEXES.items():
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, (table, _) in INDEXES.items():
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,78 @@
+"""messages.comment_count, backfilled and maintained by triggers on comments
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+POSTGRES_TRIGGER = """
+CREATE OR REPLACE FUNCTION messages_comment_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE messages SET comment_count = comment_count + 1
+        WHERE id = NEW.message_id;
+    ELSE
+        UPDATE messages SET comment_count = comment_count - 1
+        WHERE id = OLD.message_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER comments_count AFTER INSERT OR DELETE ON comments
+FOR EACH ROW EXECUTE FUNCTION messages_comment_count();
+"""
+
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER comments_count_insert AFTER INSERT ON comments BEGIN
+        UPDATE messages SET comment_count = comment_count + 1
+        WHERE id = NEW.message_id;
+    END
+    """,
+    """
+    CREATE TRIGGER comments_count_delete AFTER DELETE ON comments BEGIN
+        UPDATE messages SET comment_count = comment_count - 1
+        WHERE id = OLD.message_id;
+    END
+    """,
+]
+
+
+def upgrade():
+    op.add_column(
+        "messages",
+        sa.Column("comment_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    # Triggers first, then the backfill, in the same transaction: no comment
+    # written in between is counted twice or missed
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(POSTGRES_TRIGGER)
+    else:
+        for ddl in SQLITE_TRIGGERS:
+            op.execute(ddl)
+    op.execute(
+        """
+        UPDATE messages SET comment_count = (
+            SELECT count(*) FROM comments WHERE comments.message_id = messages.id
+        )
+        """
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP TRIGGER IF EXISTS comments_count ON comments")
+        op.execute("DROP FUNCTION IF EXISTS messages_comment_count()")
+    else:
+        op.execute("DROP TRIGGER IF EXISTS comments_count_insert")
+        op.execute("DROP TRIGGER IF EXISTS comments_count_delete")
+    with op.batch_alter_table("messages") as batch:
+        batch.drop_column("comment_count")
@@ -0,0 +1,86 @@
+"""Full-text search: tsvector + GIN on PostgreSQL, FTS5 tables on SQLite
+
+Adding a STORED generated column rewrites the table under an exclusive lock;
+run it in a quiet window on large databases. The GIN indexes are then built
+CONCURRENTLY.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+SEARCH_CONFIG = "spanish"
+TABLES = {"messages": "user_message", "comments": "comment"}
+
+
+def sqlite_fts(table, text_column):
+    fts = f"{table}_fts"
+    return [
+        f"""
+        CREATE VIRTUAL TABLE {fts} USING fts5(
+            {text_column}, content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        f"""
+        CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {text_column}) VALUES (NEW.id, NEW.{text_column});
+        END
+        """,
+        f"""
+        CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {text_column})
+            VALUES ('delete', OLD.id, OLD.{text_column});
+        END
+        """,
+        f"""
+        CREATE TRIGGER {fts}_update AFTER UPDATE OF {text_column} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {text_column})
+            VALUES ('delete', OLD.id, OLD.{text_column});
+            INSERT INTO {fts}(rowid, {text_column}) VALUES (NEW.id, NEW.{text_column});
+        END
+        """,
+        # Index the rows that already exist
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        for table, text_column in TABLES.items():
+            op.execute(
+                f"""
+                ALTER TABLE {table} ADD COLUMN search_vector tsvector
+                GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', {text_column})) STORED
+                """
+            )
+        with op.get_context().autocommit_block():
+            for table in TABLES:
+                op.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_search_vector "
+                    f"ON {table} USING GIN (search_vector)"
+                )
+    else:
+        for table, text_column in TABLES.items():
+            for ddl in sqlite_fts(table, text_column):
+                op.execute(ddl)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        for table in TABLES:
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_search_vector")
+            op.execute(f"ALTER TABLE {table} DROP COLUMN search_vector")
+    else:
+        for table in TABLES:
+            fts = f"{table}_fts"
+            for suffix in ("insert", "delete", "update"):
+                op.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+            op.execute(f"DROP TABLE IF EXISTS {fts}")
@@ -0,0 +1,102 @@
+"""Follows, users.follower_count (kept by triggers) and home timeline entries
+
+New tables only, plus a column with a constant default: no rewrite of the
+existing ones.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+POSTGRES_TRIGGER = """
+CREATE OR REPLACE FUNCTION users_follower_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE users SET follower_count = follower_count + 1
+        WHERE id = NEW.followee_id;
+    ELSE
+        UPDATE users SET follower_count = follower_count - 1
+        WHERE id = OLD.followee_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER follows_count AFTER INSERT OR DELETE ON follows
+FOR EACH ROW EXECUTE FUNCTION users_follower_count();
+"""
+
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER follows_count_insert AFTER INSERT ON follows BEGIN
+        UPDATE users SET follower_count = follower_count + 1
+        WHERE id = NEW.followee_id;
+    END
+    """,
+    """
+    CREATE TRIGGER follows_count_delete AFTER DELETE ON follows BEGIN
+        UPDATE users SET follower_count = follower_count - 1
+        WHERE id = OLD.followee_id;
+    END
+    """,
+]
+
+
+def upgrade():
+    op.add_column(
+        "users",
+        sa.Column("follower_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.create_table(
+        "follows",
+        sa.Column(
+            "follower_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True
+        ),
+        sa.Column(
+            "followee_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_follows_followee_id_follower_id", "follows", ["followee_id", "follower_id"]
+    )
+    op.create_table(
+        "timeline_entries",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column(
+            "message_id", sa.Integer(), sa.ForeignKey("messages.id"), primary_key=True
+        ),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index(
+        "ix_timeline_entries_user_id_created_at_message_id",
+        "timeline_entries",
+        ["user_id", sa.text("created_at DESC"), sa.text("message_id DESC")],
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(POSTGRES_TRIGGER)
+    else:
+        for ddl in SQLITE_TRIGGERS:
+            op.execute(ddl)
+
+
+def downgrade():
+    op.drop_table("timeline_entries")
+    # Dropping the table drops its triggers too
+    op.drop_table("follows")
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP FUNCTION IF EXISTS users_follower_count()")
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("follower_count")
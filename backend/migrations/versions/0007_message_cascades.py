@@ -0,0 +1,83 @@
+"""ON DELETE CASCADE from messages to their comments and timeline entries
+
+Deleting a message becomes a single DELETE. On PostgreSQL the foreign keys are
+replaced in place (a short lock on each table while they are validated). On
+SQLite batch mode copies comments and timeline_entries into new tables, which
+drops the triggers on comments: they are created again right after.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+TABLES = ("comments", "timeline_entries")
+# The foreign keys of 0001 and 0005 have no name: SQLite reflects them under
+# this convention, PostgreSQL named them <table>_message_id_fkey
+NAMING_CONVENTION = {
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"
+}
+
+# Same as 0003 (comment_count) and 0004 (FTS5)
+SQLITE_COMMENTS_TRIGGERS = [
+    """
+    CREATE TRIGGER comments_count_insert AFTER INSERT ON comments BEGIN
+        UPDATE messages SET comment_count = comment_count + 1
+        WHERE id = NEW.message_id;
+    END
+    """,
+    """
+    CREATE TRIGGER comments_count_delete AFTER DELETE ON comments BEGIN
+        UPDATE messages SET comment_count = comment_count - 1
+        WHERE id = OLD.message_id;
+    END
+    """,
+    """
+    CREATE TRIGGER comments_fts_insert AFTER INSERT ON comments BEGIN
+        INSERT INTO comments_fts(rowid, comment) VALUES (NEW.id, NEW.comment);
+    END
+    """,
+    """
+    CREATE TRIGGER comments_fts_delete AFTER DELETE ON comments BEGIN
+        INSERT INTO comments_fts(comments_fts, rowid, comment)
+        VALUES ('delete', OLD.id, OLD.comment);
+    END
+    """,
+    """
+    CREATE TRIGGER comments_fts_update AFTER UPDATE OF comment ON comments BEGIN
+        INSERT INTO comments_fts(comments_fts, rowid, comment)
+        VALUES ('delete', OLD.id, OLD.comment);
+        INSERT INTO comments_fts(rowid, comment) VALUES (NEW.id, NEW.comment);
+    END
+    """,
+]
+
+
+def replace_foreign_keys(ondelete):
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    for table in TABLES:
+        name = (
+            f"fk_{table}_message_id_messages" if sqlite else f"{table}_message_id_fkey"
+        )
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch:
+            batch.drop_constraint(name, type_="foreignkey")
+            batch.create_foreign_key(
+                name, "messages", ["message_id"], ["id"], ondelete=ondelete
+            )
+    if sqlite:
+        for ddl in SQLITE_COMMENTS_TRIGGERS:
+            op.execute(ddl)
+
+
+def upgrade():
+    replace_foreign_keys("CASCADE")
+
+
+def downgrade():
+    replace_foreign_keys(None)
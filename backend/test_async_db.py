@@ -0,0 +1,66 @@
+import pytest
+
+from app import database, main
+
+
+@pytest.fixture
+def async_client(client):
+    async_engine, session_factory = database.create_async_session_factory(
+        database.SQLALCHEMY_DATABASE_URL
+    )
+
+    async def get_async_db():
+        async with session_factory() as db:
+            yield db
+
+    main.app.dependency_overrides[main.get_db] = get_async_db
+    main.app.dependency_overrides[main.get_read_db] = get_async_db
+    yield client
+    main.app.dependency_overrides.clear()
+    client.portal.call(async_engine.dispose)
+
+
+def test_async_url_switches_driver():
+    url = database.async_url("postgresql://u:p@h:5432/d")
+    assert url == "postgresql+asyncpg://u:p@h:5432/d"
+    assert database.async_url("sqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+
+
+def test_full_flow_on_async_session(async_client, auth_headers):
+    headers = auth_headers()
+    message = async_client.post("/messages/", json={"user_message": "hola"}, headers=headers)
+    assert message.status_code == 201
+    message_id = message.json()["id"]
+
+    comment = async_client.post(
+        "/comments/", json={"message_id": message_id, "comment": "c"}, headers=headers
+    )
+    assert comment.status_code == 201
+    comment_id = comment.json()["id"]
+
+    feed = async_client.get("/messages/").json()
+    assert feed[0]["user_name"] == "tester"
+    assert async_client.get(f"/messages/{message_id}/comments/").json()[0]["comment"] == "c"
+    assert async_client.get("/comments/", params={"message_ids": message_id}).status_code == 200
+    assert async_client.get("/users/me/", headers=headers).json()["user_name"] == "tester"
+
+    updated = async_client.put(
+        f"/comments/{comment_id}", json={"comment": "editado"}, headers=headers
+    )
+    assert updated.json()["comment"] == "editado"
+    assert async_client.delete(f"/comments/{comment_id}", headers=headers).status_code == 204
+    updated = async_client.put(
+        f"/messages/{message_id}", json={"user_message": "editado"}, headers=headers
+    )
+    assert updated.json()["user_message"] == "editado"
+    assert async_client.delete(f"/messages/{message_id}", headers=headers).status_code == 204
+    assert async_client.get("/messages/").json() == []
+
+
+def test_statements_are_attributed_to_the_route(async_client):
+    from app import instrumentation
+
+    route = "/messages/{message_id}/comments/"
+    before = instrumentation.request_statements.total(route=route)
+    async_client.get("/messages/1/comments/")
+    assert instrumentation.request_statements.total(route=route) > before
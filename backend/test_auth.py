@@ -0,0 +1,42 @@
+from app import auth
+
+
+def test_token_carries_identity(client, auth_headers):
+    headers = auth_headers(user_name="ana")
+    payload = auth.decode_access_token(headers["Authorization"].split()[1])
+    assert payload["name"] == "ana"
+    assert payload["uid"] == client.get("/users/me/", headers=headers).json()["id"]
+
+
+def test_writes_do_not_query_users(client, auth_headers, count_queries):
+    headers = auth_headers()
+    with count_queries() as statements:
+        response = client.post("/messages/", json={"user_message": "hola"}, headers=headers)
+    assert response.status_code == 201
+    assert response.json()["user_name"] == "tester"
+    assert not [s for s in statements if "FROM users" in s]
+
+
+def test_users_me_is_cached(client, auth_headers, count_queries):
+    headers = auth_headers()
+    client.get("/users/me/", headers=headers)
+    with count_queries() as statements:
+        assert client.get("/users/me/", headers=headers).status_code == 200
+    assert statements == []
+
+
+def test_legacy_email_only_token_still_accepted(client, auth_headers):
+    auth_headers(user_name="old")
+    token = auth.create_access_token(data={"sub": "old@example.com"})
+    response = client.post(
+        "/messages/", json={"user_message": "hola"}, headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 201
+    assert response.json()["user_name"] == "old"
+
+
+def test_invalid_token_rejected(client):
+    response = client.post(
+        "/messages/", json={"user_message": "x"}, headers={"Authorization": "Bearer nope"}
+    )
+    assert response.status_code == 401
@@ -0,0 +1,70 @@
+def test_update_and_delete_are_one_statement(client, auth_headers, count_queries):
+    headers = auth_headers()
+    message_id = client.post(
+        "/messages/", json={"user_message": "hola"}, headers=headers
+    ).json()["id"]
+    comment_id = client.post(
+        "/comments/", json={"message_id": message_id, "comment": "c"}, headers=headers
+    ).json()["id"]
+
+    with count_queries() as statements:
+        response = client.put(
+            f"/comments/{comment_id}", json={"comment": "editado"}, headers=headers
+        )
+    assert response.json()["comment"] == "editado"
+    assert len(statements) == 1
+
+    with count_queries() as statements:
+        response = client.put(
+            f"/messages/{message_id}", json={"user_message": "editado"}, headers=headers
+        )
+    assert response.json()["user_message"] == "editado"
+    assert len(statements) == 1
+
+    with count_queries() as statements:
+        assert client.delete(f"/comments/{comment_id}", headers=headers).status_code == 204
+    assert len(statements) == 1
+
+
+def test_delete_message_removes_its_comments(client, auth_headers, count_queries):
+    headers = auth_headers()
+    message_id = client.post(
+        "/messages/", json={"user_message": "hola"}, headers=headers
+    ).json()["id"]
+    client.post("/comments/", json={"message_id": message_id, "comment": "c"}, headers=headers)
+
+    # ON DELETE CASCADE: the comments go with the message in the same statement
+    with count_queries() as statements:
+        assert client.delete(f"/messages/{message_id}", headers=headers).status_code == 204
+    assert len(statements) == 1
+    assert client.get(f"/messages/{message_id}/comments/").json() == []
+    assert client.get("/search", params={"q": "c", "type": "comments"}).json() == []
+    assert client.delete(f"/messages/{message_id}", headers=headers).status_code == 404
+
+
+def test_not_found_and_forbidden_are_distinguished(client, auth_headers):
+    owner = auth_headers(user_name="owner")
+    other = auth_headers(user_name="other")
+    message_id = client.post(
+        "/messages/", json={"user_message": "hola"}, headers=owner
+    ).json()["id"]
+    comment_id = client.post(
+        "/comments/", json={"message_id": message_id, "comment": "c"}, headers=owner
+    ).json()["id"]
+
+    assert client.put(
+        f"/messages/{message_id}", json={"user_message": "x"}, headers=other
+    ).status_code == 403
+    assert client.delete(f"/messages/{message_id}", headers=other).status_code == 403
+    assert client.put(
+        f"/comments/{comment_id}", json={"comment": "x"}, headers=other
+    ).status_code == 403
+    assert client.delete(f"/comments/{comment_id}", headers=other).status_code == 403
+    assert client.put(
+        "/messages/999", json={"user_message": "x"}, headers=other
+    ).status_code == 404
+    assert client.delete("/comments/999", headers=other).status_code == 404
+
+    # Nothing was changed by the rejected attempts
+    comments = client.get(f"/messages/{message_id}/comments/").json()
+    assert [c["comment"] for c in comments] == ["c"]
@@ -0,0 +1,51 @@
+import json
+
+from fastapi.routing import APIRoute
+
+import bench_load
+
+
+def test_scenarios_cover_every_route():
+    from app.main import app
+
+    args = bench_load.parse_args([])
+    data = {"users": [1], "messages": [1], "doomed_messages": [2], "doomed_comments": [1]}
+    covered = {
+        (method, path)
+        for method, path, _ in bench_load.scenarios(args, data, "token").values()
+    }
+    routes = {
+        (method, route.path)
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+    assert routes - covered == set()
+
+
+def test_run_writes_json_report(tmp_path):
+    from app import ratelimit
+
+    output = tmp_path / "results.json"
+    argv = [
+        "--users", "3", "--messages", "20", "--comments", "2", "--requests", "4",
+        "--auth-requests", "1", "--concurrency", "2", "--output", str(output),
+    ]
+    try:
+        assert bench_load.main(argv) == 0
+        report = json.loads(output.read_text())
+        for name, result in report["routes"].items():
+            assert result["errors"] == 0, name
+            assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+            assert result["sql_per_request"] >= 0
+        assert report["routes"]["message_comments"]["sql_per_request"] == 1
+
+        # Same numbers as the baseline: no regression
+        assert bench_load.main(argv + ["--compare", str(output)]) == 0
+        baseline = tmp_path / "baseline.json"
+        for result in report["routes"].values():
+            result["p95_ms"] = 0.001
+        baseline.write_text(json.dumps(report))
+        assert bench_load.main(argv + ["--compare", str(baseline)]) == 1
+    finally:
+        ratelimit.store = ratelimit.create_store()
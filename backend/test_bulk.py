@@ -0,0 +1,117 @@
+import json
+
+from app import bulk, ratelimit
+
+
+def test_bulk_messages_json_array(client, auth_headers, count_queries):
+    headers = auth_headers()
+    items = [{"user_message": f"m{i}"} for i in range(50)] + [{"nope": 1}]
+    with count_queries() as statements:
+        response = client.post("/messages/bulk", json=items, headers=headers)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["inserted"] == 50
+    assert len(set(body["ids"])) == 50
+    assert [error["index"] for error in body["errors"]] == [50]
+    inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT INTO MESSAGES")]
+    assert len(inserts) == 1
+    assert len(client.get("/messages/").json()) == 50
+
+
+def test_bulk_messages_ndjson_stream_in_chunks(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_CHUNK_SIZE", 7)
+    headers = auth_headers()
+    lines = [json.dumps({"user_message": f"m{i}"}) for i in range(30)]
+    lines.insert(3, "{not json")
+
+    def body():
+        for line in lines:
+            yield (line + "\n").encode()
+
+    response = client.post(
+        "/messages/bulk",
+        content=body(),
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    result = response.json()
+    assert result["inserted"] == 30
+    assert [error["index"] for error in result["errors"]] == [3]
+
+
+def test_bulk_comments_reject_unknown_messages(client, auth_headers):
+    headers = auth_headers()
+    message_id = client.post(
+        "/messages/", json={"user_message": "m"}, headers=headers
+    ).json()["id"]
+    items = [
+        {"message_id": message_id, "comment": "ok"},
+        {"message_id": 999, "comment": "huérfano"},
+        {"message_id": message_id, "comment": "ok 2"},
+    ]
+    result = client.post("/comments/bulk", json=items, headers=headers).json()
+    assert result["inserted"] == 2
+    assert result["errors"][0]["index"] == 1
+    assert len(client.get(f"/messages/{message_id}/comments/").json()) == 2
+
+
+def test_bulk_comments_on_a_message_deleted_meanwhile(
+    client, auth_headers, monkeypatch
+):
+    from app import crud_async
+
+    headers = auth_headers()
+    message_id = client.post(
+        "/messages/", json={"user_message": "m"}, headers=headers
+    ).json()["id"]
+    get_existing = crud_async.get_existing_message_ids
+    checks = []
+
+    async def deleted_after_the_check(db, ids):
+        checks.append(ids)
+        if len(checks) == 1:
+            return set(ids)  # 999 still existed when the chunk was checked
+        return await get_existing(db, ids)
+
+    monkeypatch.setattr(crud_async, "get_existing_message_ids", deleted_after_the_check)
+    items = [
+        {"message_id": message_id, "comment": "ok"},
+        {"message_id": 999, "comment": "huérfano"},
+    ]
+    response = client.post("/comments/bulk", json=items, headers=headers)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 1
+    assert [error["index"] for error in result["errors"]] == [1]
+    assert len(client.get(f"/messages/{message_id}/comments/").json()) == 1
+
+
+def test_bulk_requires_auth_and_a_list(client, auth_headers):
+    assert client.post("/messages/bulk", json=[]).status_code == 401
+    response = client.post("/messages/bulk", json={"x": 1}, headers=auth_headers())
+    assert response.status_code == 400
+
+
+def test_bulk_limit(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_MAX_ITEMS", 2)
+    headers = auth_headers()
+    items = [{"user_message": "m"}] * 3
+    assert client.post("/messages/bulk", json=items, headers=headers).status_code == 413
+    assert client.get("/messages/").json() == []
+
+
+def test_bulk_rate_limit_per_chunk(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_CHUNK_SIZE", 2)
+    headers = auth_headers()
+    # All but one token of the bucket, one per chunk of two items
+    items = [{"user_message": "m"}] * (2 * (ratelimit.bulk.capacity - 1))
+    ok = client.post("/messages/bulk", json=items, headers=headers)
+    assert ok.status_code == 200
+    assert ok.headers["RateLimit-Remaining"] == "1"
+
+    # Three chunks with one token left: the whole batch is rolled back
+    items = [{"user_message": "n"}] * 6
+    throttled = client.post("/messages/bulk", json=items, headers=headers)
+    assert throttled.status_code == 429
+    assert "Retry-After" in throttled.headers
+    assert {m["user_message"] for m in client.get("/messages/").json()} == {"m"}
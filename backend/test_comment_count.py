@@ -0,0 +1,42 @@
+def comment_counts(client):
+    return {m["id"]: m["comment_count"] for m in client.get("/messages/").json()}
+
+
+def test_comment_count_follows_every_write_path(client, auth_headers):
+    headers = auth_headers()
+    first, second = (
+        client.post("/messages/", json={"user_message": text}, headers=headers).json()
+        for text in ("uno", "dos")
+    )
+    assert first["comment_count"] == 0
+    assert comment_counts(client) == {first["id"]: 0, second["id"]: 0}
+
+    comment_id = client.post(
+        "/comments/", json={"message_id": first["id"], "comment": "c"}, headers=headers
+    ).json()["id"]
+    # The cached first page is invalidated by the comment write
+    assert comment_counts(client) == {first["id"]: 1, second["id"]: 0}
+
+    client.post(
+        "/comments/bulk",
+        json=[{"message_id": second["id"], "comment": f"c{i}"} for i in range(3)],
+        headers=headers,
+    )
+    assert comment_counts(client) == {first["id"]: 1, second["id"]: 3}
+
+    client.delete(f"/comments/{comment_id}", headers=headers)
+    assert comment_counts(client) == {first["id"]: 0, second["id"]: 3}
+
+    updated = client.put(
+        f"/messages/{second['id']}", json={"user_message": "editado"}, headers=headers
+    ).json()
+    assert updated["comment_count"] == 3
+
+
+def test_feed_does_not_count_comments_per_row(client, seed, count_queries):
+    seed(users=2, messages=10, comments_per_message=2)
+    with count_queries() as statements:
+        messages = client.get("/messages/").json()
+    assert {m["comment_count"] for m in messages} == {2}
+    assert len(statements) == 1
+    assert "count(" not in statements[0].lower()
@@ -0,0 +1,23 @@
+def test_batch_groups_and_caps_comments(client, seed, count_queries):
+    _, (first, second, empty) = seed(users=3, messages=3, comments_per_message=[5, 2, 0])
+
+    with count_queries() as statements:
+        response = client.get(
+            "/comments/", params={"message_ids": f"{first},{second},{empty}", "limit": 3}
+        )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [len(body[str(mid)]) for mid in (first, second, empty)] == [3, 2, 0]
+    assert [c["comment"] for c in body[str(first)]] == ["comment 0", "comment 1", "comment 2"]
+    assert all(c["user_name"] for c in body[str(first)])
+    assert len(statements) == 1
+
+
+def test_batch_rejects_bad_ids(client):
+    assert client.get("/comments/", params={"message_ids": "1,abc"}).status_code == 400
+    assert client.get("/comments/", params={"message_ids": ""}).status_code == 400
+    too_many = ",".join(str(i) for i in range(1, 102))
+    assert client.get("/comments/", params={"message_ids": too_many}).status_code == 400
+    out_of_range = {"message_ids": f"1,{2**64}"}
+    assert client.get("/comments/", params=out_of_range).status_code == 422
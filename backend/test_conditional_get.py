@@ -0,0 +1,81 @@
+import pytest
+
+from app import compression, feed_cache
+
+
+@pytest.mark.parametrize(
+    "path", ["/messages/", "/messages/{id}/comments/", "/comments/?message_ids={id}"]
+)
+def test_unchanged_lists_answer_304(client, auth_headers, path):
+    headers = auth_headers()
+    message_id = client.post(
+        "/messages/", json={"user_message": "hola"}, headers=headers
+    ).json()["id"]
+    client.post(
+        "/comments/", json={"message_id": message_id, "comment": "c"}, headers=headers
+    )
+    url = path.format(id=message_id)
+
+    first = client.get(url)
+    assert first.headers["ETag"] and first.headers["Last-Modified"]
+    again = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.content == b""
+    # Last-Modified cannot see deletions or comment_count changes: no 304 by date
+    since = client.get(url, headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert since.status_code == 200
+
+    # A new comment changes every one of these lists
+    client.post(
+        "/comments/", json={"message_id": message_id, "comment": "d"}, headers=headers
+    )
+    changed = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != first.headers["ETag"]
+
+
+def test_304_does_not_serialize_the_page(client, seed, monkeypatch):
+    seed(users=1, messages=3)
+    etag = client.get("/messages/").headers["ETag"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("serialized a 304")
+
+    # Without the page cache the request goes through the query path
+    monkeypatch.setattr(feed_cache, "backend", None)
+    monkeypatch.setattr("app.main.dump_json", fail)
+    response = client.get("/messages/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_large_responses_are_compressed(client, seed):
+    seed(users=1, messages=30)
+    plain = client.get("/messages/", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+
+    gzipped = client.get("/messages/", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.content == plain.content  # httpx decodes it transparently
+    # Different bytes, same page: only a weak validator may be shared
+    assert gzipped.headers["ETag"] == plain.headers["ETag"]
+    assert plain.headers["ETag"].startswith('W/"')
+
+
+def test_brotli_preferred_when_available(client, seed):
+    pytest.importorskip("brotli")
+    seed(users=1, messages=30)
+    plain = client.get("/messages/", headers={"Accept-Encoding": "identity"})
+    br = client.get("/messages/", headers={"Accept-Encoding": "gzip, br"})
+    assert br.headers["Content-Encoding"] == "br"
+    assert br.content == plain.content
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get("/messages/", headers={"Accept-Encoding": "gzip, br"})
+    assert response.content == b"[]"
+    assert "Content-Encoding" not in response.headers
+
+
+def test_accept_encoding_quality_zero_is_refused():
+    assert compression.accepted_encodings("gzip;q=0, br;q=0.5") == {"br"}
+    assert compression.accepted_encodings("") == set()
@@ -0,0 +1,15 @@
+import json
+
+from app import fastjson
+
+
+def test_dumps_matches_stdlib_json():
+    content = {1: [{"comment": "¿qué tal?", "rank": 0.25, "user_name": None}], 2: []}
+    assert json.loads(fastjson.dumps(content)) == json.loads(json.dumps(content))
+
+
+def test_list_endpoints_keep_their_documented_schema(client):
+    paths = client.get("/openapi.json").json()["paths"]
+    schema = paths["/users/{user_id}/comments/"]["get"]["responses"]["200"]
+    ref = schema["content"]["application/json"]["schema"]["items"]["$ref"]
+    assert ref.endswith("/CommentOut")
@@ -0,0 +1,78 @@
+import asyncio
+
+from app import feed_cache
+
+
+def test_first_page_served_from_cache(client, seed, count_queries):
+    seed(users=1, messages=3)
+    first = client.get("/messages/")
+    with count_queries() as statements:
+        second = client.get("/messages/")
+    assert statements == []
+    assert second.content == first.content
+    assert second.headers["ETag"] == first.headers["ETag"]
+
+
+def test_writes_invalidate_cached_pages(client, auth_headers):
+    headers = auth_headers()
+    assert client.get("/messages/").json() == []
+
+    created = client.post("/messages/", json={"user_message": "uno"}, headers=headers)
+    message_id = created.json()["id"]
+    assert [m["user_message"] for m in client.get("/messages/").json()] == ["uno"]
+
+    client.put(f"/messages/{message_id}", json={"user_message": "dos"}, headers=headers)
+    assert [m["user_message"] for m in client.get("/messages/").json()] == ["dos"]
+
+    client.delete(f"/messages/{message_id}", headers=headers)
+    assert client.get("/messages/").json() == []
+
+
+def test_page_read_before_an_invalidation_is_not_stored(client, seed, monkeypatch):
+    from app import crud_async
+
+    seed(users=1, messages=2)
+    get_messages = crud_async.get_messages
+
+    async def write_commits_meanwhile(*args, **kwargs):
+        rows = await get_messages(*args, **kwargs)
+        await feed_cache.invalidate()  # a concurrent POST commits here
+        return rows
+
+    monkeypatch.setattr(crud_async, "get_messages", write_commits_meanwhile)
+    assert len(client.get("/messages/").json()) == 2
+    assert asyncio.run(feed_cache.backend.get((0, 100))) is None
+
+
+def test_if_none_match_returns_304(client, seed):
+    seed(users=1, messages=2)
+    etag = client.get("/messages/").headers["ETag"]
+    response = client.get("/messages/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert client.get("/messages/", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_only_first_pages_are_cacheable():
+    assert feed_cache.page_key(0, 100, None) == (0, 100)
+    assert feed_cache.page_key(0, 100, "cursor") is None
+    assert feed_cache.page_key(5, 100, None) is None
+    assert feed_cache.page_key(feed_cache.FEED_CACHE_PAGES * 100, 100, None) is None
+
+
+def test_memory_cache_evicts_by_entries_and_bytes():
+    cache = feed_cache.MemoryFeedCache(max_entries=2, max_bytes=10, ttl=60)
+
+    async def scenario():
+        await cache.set("a", feed_cache.make_page(b"1234"), 0)
+        await cache.set("b", feed_cache.make_page(b"1234"), 0)
+        await cache.get("a")  # "b" becomes the least recently used
+        await cache.set("c", feed_cache.make_page(b"12"), 0)
+        assert await cache.get("b") is None
+        assert await cache.get("a") is not None
+        await cache.set("d", feed_cache.make_page(b"123456"), 0)
+        assert cache.size_bytes <= 10
+        await cache.set("huge", feed_cache.make_page(b"x" * 11), 0)
+        assert await cache.get("huge") is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,44 @@
+import threading
+
+import pytest
+
+from app import hashing
+
+
+def test_pool_rejects_when_queue_is_full():
+    pool = hashing.HashingPool(workers=1, queue_size=1)
+    started, release = threading.Event(), threading.Event()
+    running = pool.submit("hash", lambda: (started.set(), release.wait()))
+    queued = pool.submit("hash", lambda: None)
+    # The first job only counts as running once its worker picks it up
+    assert started.wait(5)
+
+    with pytest.raises(hashing.HashingBusy):
+        pool.submit("hash", lambda: None)
+    assert pool.queue_depth == 1
+
+    release.set()
+    running.result(timeout=5)
+    queued.result(timeout=5)
+    assert pool.queue_depth == 0
+    pool.submit("hash", lambda: None).result(timeout=5)
+
+
+def test_saturated_pool_returns_503(client, monkeypatch):
+    def busy(*args):
+        raise hashing.HashingBusy(retry_after=3)
+
+    monkeypatch.setattr(hashing.pool, "submit", busy)
+    response = client.post(
+        "/users/", json={"user_name": "a", "email": "a@example.com", "password": "x"}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+
+
+def test_hash_metrics_exposed(client, auth_headers):
+    auth_headers()
+    body = client.get("/metrics").text
+    assert 'hash_duration_seconds_count{op="hash"}' in body
+    assert 'hash_duration_seconds_count{op="verify"}' in body
+    assert "hash_queue_depth 0" in body
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+from app import auth, database, health
+
+
+def test_healthz_does_not_touch_the_database(client, count_queries):
+    with count_queries() as statements:
+        response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+    assert statements == []
+
+
+def test_readyz_after_warm_up(client):
+    # The client fixture waits for the warm-up started by the lifespan
+    assert health.state.ready
+    assert database._engine.built
+    assert auth.get_pwd_context.cache_info().currsize == 1
+    assert database.get_engine().pool.checkedin() >= 1
+
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+
+def test_readyz_unavailable(client, monkeypatch):
+    monkeypatch.setattr(health.state, "ready", False)
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["reason"] == "starting"
+
+    async def unreachable():
+        raise ConnectionError("database down")
+
+    monkeypatch.setattr(health.state, "ready", True)
+    monkeypatch.setattr(health, "_ping", unreachable)
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["reason"] == "database unreachable"
+    # Liveness does not depend on the database
+    assert client.get("/healthz").status_code == 200
+
+
+def test_import_is_lazy():
+    code = (
+        "import sys\n"
+        "import app.main\n"
+        "from app import database\n"
+        "assert not database._engine.built\n"
+        "assert 'passlib.context' not in sys.modules\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,109 @@
+from sqlalchemy import func, select
+
+from app import models, timelines
+from app.database import SessionLocal
+
+
+def user_id(client, headers):
+    return client.get("/users/me/", headers=headers).json()["id"]
+
+
+def post(client, headers, text):
+    response = client.post("/messages/", json={"user_message": text}, headers=headers)
+    return response.json()["id"]
+
+
+def timeline(client, headers, **params):
+    response = client.get("/timeline/", params=params, headers=headers)
+    assert response.status_code == 200
+    return [message["user_message"] for message in response.json()]
+
+
+def entries(message_id=None):
+    query = select(func.count()).select_from(models.TimelineEntry)
+    if message_id is not None:
+        query = query.where(models.TimelineEntry.message_id == message_id)
+    with SessionLocal() as db:
+        return db.scalar(query)
+
+
+def test_follow_fans_out_and_unfollow_removes(client, auth_headers):
+    ana, beto = auth_headers("ana"), auth_headers("beto")
+    ana_id = user_id(client, ana)
+    post(client, ana, "antes de seguir")
+    post(client, beto, "de beto")
+
+    assert client.post(f"/users/{ana_id}/follow", headers=beto).status_code == 204
+    # Idempotent, and counted once
+    assert client.post(f"/users/{ana_id}/follow", headers=beto).status_code == 204
+    with SessionLocal() as db:
+        assert db.get(models.User, ana_id).follower_count == 1
+
+    post(client, ana, "después de seguir")
+    assert timeline(client, beto) == ["después de seguir", "de beto", "antes de seguir"]
+    assert timeline(client, ana) == ["después de seguir", "antes de seguir"]
+
+    assert client.delete(f"/users/{ana_id}/follow", headers=beto).status_code == 204
+    assert timeline(client, beto) == ["de beto"]
+    assert entries() == 0
+    with SessionLocal() as db:
+        assert db.get(models.User, ana_id).follower_count == 0
+
+
+def test_follow_errors(client, auth_headers):
+    ana = auth_headers("ana")
+    assert client.post(f"/users/{user_id(client, ana)}/follow", headers=ana).status_code == 400
+    assert client.post("/users/999/follow", headers=ana).status_code == 404
+    assert client.post("/users/999/follow").status_code == 401
+    assert client.get("/timeline/").status_code == 401
+
+
+def test_timeline_is_one_statement_and_paginates(client, auth_headers, count_queries):
+    ana, beto = auth_headers("ana"), auth_headers("beto")
+    client.post(f"/users/{user_id(client, ana)}/follow", headers=beto)
+    for i in range(5):
+        post(client, ana, f"m{i}")
+
+    with count_queries() as statements:
+        response = client.get("/timeline/?limit=3", headers=beto)
+    assert len(statements) == 1
+    assert [m["user_message"] for m in response.json()] == ["m4", "m3", "m2"]
+    cursor = response.headers["X-Next-Cursor"]
+    assert timeline(client, beto, limit=3, cursor=cursor) == ["m1", "m0"]
+
+
+def test_celebrities_are_pulled_on_read(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(timelines, "TIMELINE_CELEBRITY_FOLLOWERS", 1)
+    ana, beto = auth_headers("ana"), auth_headers("beto")
+    first = post(client, ana, "antes de ser famosa")
+    client.post(f"/users/{user_id(client, ana)}/follow", headers=beto)
+    assert entries(first) == 1  # backfill
+
+    famous = post(client, ana, "ya famosa")
+    assert entries(famous) == 0
+    # The backfilled message is not repeated by the read path
+    assert timeline(client, beto) == ["ya famosa", "antes de ser famosa"]
+
+
+def test_timelines_are_trimmed(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(timelines, "TIMELINE_MAX_LENGTH", 2)
+    monkeypatch.setattr(timelines, "TIMELINE_TRIM_EVERY", 1)
+    ana, beto = auth_headers("ana"), auth_headers("beto")
+    client.post(f"/users/{user_id(client, ana)}/follow", headers=beto)
+    for i in range(4):
+        post(client, ana, f"m{i}")
+    assert entries() == 2
+    assert timeline(client, beto) == ["m3", "m2"]
+
+
+def test_bulk_and_delete(client, auth_headers):
+    ana, beto = auth_headers("ana"), auth_headers("beto")
+    client.post(f"/users/{user_id(client, ana)}/follow", headers=beto)
+    result = client.post(
+        "/messages/bulk", json=[{"user_message": "a"}, {"user_message": "b"}], headers=ana
+    ).json()
+    assert entries() == 2
+
+    client.delete(f"/messages/{result['ids'][0]}", headers=ana)
+    assert entries() == 1
+    assert timeline(client, beto) == ["b"]
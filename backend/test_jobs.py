@@ -0,0 +1,190 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app import crud, crud_async, jobs, models
+from app.database import SessionLocal
+
+calls = []
+
+
+@jobs.handler("test.record")
+async def record(value, delay=0.0, fail_times=0):
+    await asyncio.sleep(delay)
+    if sum(1 for call in calls if call == ("attempt", value)) < fail_times:
+        calls.append(("attempt", value))
+        raise RuntimeError("boom")
+    calls.append(value)
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    calls.clear()
+    monkeypatch.setattr(jobs, "JOBS_RETRY_DELAY", 0)
+
+
+def run(queue, scenario):
+    async def main():
+        await queue.start()
+        try:
+            await scenario()
+            await queue.join()
+        finally:
+            await queue.stop(drain_seconds=0.1)
+
+    asyncio.run(main())
+
+
+def test_retries_and_keyed_order():
+    queue = jobs.JobQueue(concurrency=4, outbox=False)
+
+    async def scenario():
+        await queue.enqueue("test.record", {"value": "flaky", "fail_times": 2})
+        # Later jobs are faster, but a shared key keeps them in order
+        for i in range(4):
+            await queue.enqueue(
+                "test.record", {"value": i, "delay": 0.02 * (4 - i)}, key="k"
+            )
+
+    run(queue, scenario)
+    assert calls.count(("attempt", "flaky")) == 2
+    assert "flaky" in calls
+    assert [call for call in calls if isinstance(call, int)] == [0, 1, 2, 3]
+    assert jobs.jobs_processed.value(job="test.record", result="retried") >= 2
+
+
+def test_backoff_does_not_hold_the_key(monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_RETRY_DELAY", 0.2)
+    queue = jobs.JobQueue(concurrency=2, outbox=False)
+
+    async def scenario():
+        await queue.enqueue("test.record", {"value": "flaky", "fail_times": 1}, key="k")
+        await queue.enqueue("test.record", {"value": "next"}, key="k")
+
+    run(queue, scenario)
+    # "next" ran while "flaky" waited for its retry
+    assert calls == [("attempt", "flaky"), "next", "flaky"]
+
+
+def test_concurrency_is_bounded():
+    running = peak = 0
+
+    @jobs.handler("test.slow")
+    async def slow():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    queue = jobs.JobQueue(concurrency=2, outbox=False)
+
+    async def scenario():
+        for _ in range(6):
+            await queue.enqueue("test.slow", {})
+        assert queue.depth > 0
+
+    run(queue, scenario)
+    assert peak == 2
+
+
+def test_full_queue_runs_in_the_request():
+    queue = jobs.JobQueue(concurrency=0, max_size=1, outbox=False)
+
+    async def scenario():
+        await queue.enqueue("test.record", {"value": "queued"})
+        await queue.enqueue("test.record", {"value": "inline"})
+        assert calls == ["inline"]
+        assert queue.depth == 1
+
+    async def main():
+        await queue.start()
+        await scenario()
+        await queue.stop(drain_seconds=0.01)
+
+    asyncio.run(main())
+    with pytest.raises(KeyError):
+        asyncio.run(queue.enqueue("missing", {}))
+
+
+def outbox_rows():
+    with SessionLocal() as db:
+        return db.scalars(select(models.OutboxJob)).all()
+
+
+def test_outbox_deletes_done_jobs_and_keeps_dead_letters(client, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_MAX_ATTEMPTS", 2)
+    queue = jobs.JobQueue(concurrency=1, outbox=True)
+
+    async def scenario():
+        await queue.enqueue("test.record", {"value": "ok"})
+        await queue.enqueue("test.record", {"value": "bad", "fail_times": 5})
+
+    run(queue, scenario)
+    assert "ok" in calls
+    (dead,) = outbox_rows()
+    assert dead.payload["value"] == "bad"
+    assert dead.attempts == 2
+    assert "boom" in dead.last_error
+
+
+def test_outbox_rows_left_by_a_crash_are_claimed_again(client, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+
+    with SessionLocal() as db:
+        expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+        crud.add_outbox_job(db, "test.record", None, {"value": "recovered"}, expired)
+        db.commit()
+    queue = jobs.JobQueue(concurrency=1, outbox=True)
+    # Claimed by hand below; the background poller would race for the row
+    monkeypatch.setattr(queue, "_poll_outbox", asyncio.Event().wait)
+
+    async def scenario():
+        assert await queue.claim_outbox() == 1
+        # Leased: another poller does not take it again
+        assert await queue.claim_outbox() == 0
+
+    run(queue, scenario)
+    assert calls == ["recovered"]
+    assert outbox_rows() == []
+
+
+def test_outbox_rows_share_the_transaction_of_the_write(client, monkeypatch):
+    queue = jobs.JobQueue(concurrency=1, outbox=True)
+    monkeypatch.setattr(queue, "_poll_outbox", asyncio.Event().wait)
+
+    async def scenario():
+        async with jobs.session() as db:
+            await queue.enqueue("test.record", {"value": "rolled back"}, db=db)
+            await crud_async.rollback(db)
+        async with jobs.session() as db:
+            await queue.enqueue("test.record", {"value": "committed"}, db=db)
+            # Nothing runs before the write commits
+            await asyncio.sleep(0.01)
+            assert calls == []
+            assert outbox_rows() == []
+            await queue.commit(db)
+
+    run(queue, scenario)
+    assert calls == ["committed"]
+    assert outbox_rows() == []
+
+
+def test_routes_enqueue_side_effects(client, auth_headers):
+    ana, beto = auth_headers("ana"), auth_headers("beto")
+    ana_id = client.get("/users/me/", headers=ana).json()["id"]
+    client.post(f"/users/{ana_id}/follow", headers=beto)
+
+    queue = jobs.queue = jobs.JobQueue(concurrency=2, outbox=False)
+    client.portal.call(queue.start)
+    try:
+        client.post("/messages/", json={"user_message": "en segundo plano"}, headers=ana)
+        client.portal.call(queue.join)
+        timeline = client.get("/timeline/", headers=beto).json()
+        assert [m["user_message"] for m in timeline] == ["en segundo plano"]
+        assert jobs.jobs_processed.value(job="timeline.fan_out", result="ok") >= 1
+        assert jobs.jobs_processed.value(job="realtime.publish", result="ok") >= 1
+        assert "jobs_queue_depth 0" in client.get("/metrics").text
+    finally:
+        client.portal.call(queue.stop)
@@ -0,0 +1,92 @@
+from pathlib import Path
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, text
+
+from app import models
+
+BACKEND = Path(__file__).parent
+
+
+@pytest.fixture
+def alembic_config(tmp_path):
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    config = Config(str(BACKEND / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND / "migrations"))
+    config.set_main_option("sqlalchemy.url", url)
+    yield config, create_engine(url)
+
+
+def test_migrations_match_models(alembic_config):
+    config, engine = alembic_config
+    command.upgrade(config, "head")
+
+    def include_name(name, type_, parent_names):
+        return type_ != "table" or name is None or "_fts" not in name
+
+    with engine.connect() as conn:
+        context = MigrationContext.configure(
+            conn, opts={"include_name": include_name, "compare_type": True}
+        )
+        assert compare_metadata(context, models.Base.metadata) == []
+
+    command.downgrade(config, "base")
+    with engine.connect() as conn:
+        tables = conn.scalars(
+            text("SELECT name FROM sqlite_master WHERE type = 'table'")
+        ).all()
+    assert tables == ["alembic_version"]
+
+
+def test_upgrade_backfills_existing_rows(alembic_config):
+    config, engine = alembic_config
+    # A database as the old create_all() left it
+    command.upgrade(config, "0001")
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO users (id, user_name, password_hash, email) "
+                "VALUES (1, 'ana', 'x', 'ana@example.com')"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO messages (id, user_id, user_message) "
+                "VALUES (1, 1, 'hola mundo'), (2, 1, 'otro')"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO comments (message_id, user_id, comment) "
+                "VALUES (1, 1, 'a'), (1, 1, 'b')"
+            )
+        )
+
+    command.upgrade(config, "head")
+    with engine.begin() as conn:
+        counts = dict(conn.execute(text("SELECT id, comment_count FROM messages")).all())
+        assert counts == {1: 2, 2: 0}
+        found = conn.scalars(
+            text("SELECT rowid FROM messages_fts WHERE messages_fts MATCH 'mundo'")
+        ).all()
+        assert found == [1]
+        # The triggers keep working after the upgrade
+        conn.execute(
+            text("INSERT INTO comments (message_id, user_id, comment) VALUES (2, 1, 'c')")
+        )
+        assert conn.scalar(text("SELECT comment_count FROM messages WHERE id = 2")) == 1
+
+    # Comments are deleted with their message, through the rebuilt triggers too
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+        conn.execute(text("DELETE FROM messages WHERE id = 1"))
+        conn.commit()
+        assert conn.scalar(text("SELECT count(*) FROM comments")) == 1
+        found = conn.scalars(
+            text("SELECT rowid FROM comments_fts WHERE comments_fts MATCH 'a'")
+        ).all()
+        assert found == []
@@ -0,0 +1,48 @@
+import base64
+from datetime import datetime
+
+from app import pagination
+
+
+def test_cursor_pages_cover_feed_without_duplicates(client, auth_headers):
+    headers = auth_headers()
+    created = [
+        client.post("/messages/", json={"user_message": f"post {i}"}, headers=headers).json()["id"]
+        for i in range(7)
+    ]
+
+    seen = []
+    response = client.get("/messages/", params={"limit": 3})
+    for _ in range(len(created)):
+        assert response.status_code == 200
+        seen.extend(msg["id"] for msg in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        response = client.get("/messages/", params={"limit": 3, "cursor": cursor})
+
+    assert seen == sorted(created, reverse=True)
+
+
+def test_skip_still_supported(client, auth_headers):
+    headers = auth_headers()
+    for i in range(4):
+        client.post("/messages/", json={"user_message": f"post {i}"}, headers=headers)
+
+    first_two = [m["id"] for m in client.get("/messages/", params={"limit": 2}).json()]
+    skipped = [m["id"] for m in client.get("/messages/", params={"skip": 2, "limit": 2}).json()]
+    assert not set(first_two) & set(skipped)
+
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.get("/messages/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_out_of_range_cursor_is_rejected(client):
+    for row_id in ("1e400", str(2**64), "1.5", "true"):
+        raw = f'{{"c":"2024-01-01T00:00:00","i":{row_id}}}'.encode()
+        cursor = base64.urlsafe_b64encode(raw).decode()
+        response = client.get("/messages/", params={"cursor": cursor})
+        assert response.status_code == 400, row_id
+    assert pagination.decode_cursor(pagination.encode_cursor(datetime(2024, 1, 1), 7))
@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import create_engine, exc
+
+from app import database
+
+
+def test_pool_metrics_exposed(client):
+    client.get("/messages/")
+    body = client.get("/metrics").text
+    assert 'db_pool_checkout_wait_seconds_count{pool="primary"}' in body
+    assert 'db_pool_size{pool="primary"} 5' in body
+    assert 'db_pool_checked_out{pool="primary"}' in body
+
+
+def test_pool_settings_and_timeouts(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "DB_POOL_SIZE", 1)
+    monkeypatch.setattr(database, "DB_MAX_OVERFLOW", 0)
+    monkeypatch.setattr(database, "DB_POOL_TIMEOUT", 0.05)
+    monkeypatch.setattr(database, "DB_POOL_PRE_PING", True)
+    url = f"sqlite:///{tmp_path}/pool.db"
+    engine = create_engine(url, **database.engine_options(url, name="tiny"))
+    assert engine.pool.size() == 1
+    assert engine.pool._pre_ping
+
+    held = engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    assert database.pool_timeouts.value(pool="tiny") == 1
+    assert database.pool_wait.count(pool="tiny") == 2
+    held.close()
+    engine.dispose()
+
+
+def test_statement_timeout_is_passed_to_postgres(monkeypatch):
+    monkeypatch.setattr(database, "DB_STATEMENT_TIMEOUT_MS", 1500)
+    options = database.engine_options("postgresql://u:p@h/d")
+    assert options["connect_args"]["options"] == "-c statement_timeout=1500"
+    options = database.engine_options("postgresql://u:p@h/d", is_async=True)
+    assert options["connect_args"]["server_settings"] == {"statement_timeout": "1500"}
@@ -0,0 +1,20 @@
+def test_feed_query_count_does_not_grow_with_page_size(client, seed, count_queries):
+    seed(users=30, messages=30)
+
+    with count_queries() as small:
+        assert len(client.get("/messages/", params={"limit": 3}).json()) == 3
+    with count_queries() as large:
+        assert len(client.get("/messages/", params={"limit": 30}).json()) == 30
+
+    assert len(large) == len(small) == 1
+
+
+def test_comment_listing_query_count_does_not_grow(client, seed, count_queries):
+    _, (few, many) = seed(users=20, messages=2, comments_per_message=[2, 20])
+
+    with count_queries() as small:
+        assert len(client.get(f"/messages/{few}/comments/").json()) == 2
+    with count_queries() as large:
+        assert len(client.get(f"/messages/{many}/comments/").json()) == 20
+
+    assert len(large) == len(small) == 1
@@ -0,0 +1,73 @@
+import asyncio
+
+from app import ratelimit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    store = ratelimit.MemoryStore(clock=clock)
+    limiter = ratelimit.Limiter("t", capacity=3, period=30)  # 1 token / 10 s
+
+    async def hits(n):
+        return [await store.hit(limiter, "k") for _ in range(n)]
+
+    decisions = asyncio.run(hits(4))
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert [d.remaining for d in decisions] == [2, 1, 0, 0]
+    assert decisions[-1].retry_after == 10
+
+    clock.now += 10
+    assert asyncio.run(hits(1))[0].allowed
+
+
+def test_idle_buckets_are_evicted():
+    clock = FakeClock()
+    store = ratelimit.MemoryStore(max_keys=2, clock=clock)
+    limiter = ratelimit.Limiter("t", capacity=2, period=20)
+
+    async def hit(key):
+        return await store.hit(limiter, key)
+
+    asyncio.run(hit("a"))
+    clock.now += 5
+    asyncio.run(hit("b"))
+    assert store.size("t") == 2
+    # "a" has been idle long enough to be full again: it is dropped
+    clock.now += 6
+    asyncio.run(hit("c"))
+    assert store.size("t") == 2
+    # Over max_keys the least recently used goes, even if not full
+    asyncio.run(hit("d"))
+    assert store.size("t") == 2
+
+
+def test_login_is_throttled_per_ip(client):
+    data = {"username": "nadie@example.com", "password": "x"}
+    responses = [
+        client.post("/login", data=data) for _ in range(ratelimit.login.capacity + 1)
+    ]
+    assert {r.status_code for r in responses[:-1]} == {400}
+    assert responses[0].headers["RateLimit-Limit"] == str(ratelimit.login.capacity)
+    throttled = responses[-1]
+    assert throttled.status_code == 429
+    assert throttled.headers["RateLimit-Remaining"] == "0"
+    assert int(throttled.headers["Retry-After"]) > 0
+
+
+def test_writes_are_throttled_per_user(client, auth_headers):
+    ana, bob = auth_headers(user_name="ana"), auth_headers(user_name="bob")
+    for i in range(ratelimit.messages.capacity):
+        response = client.post("/messages/", json={"user_message": f"{i}"}, headers=ana)
+        assert response.status_code == 201
+    assert response.headers["RateLimit-Remaining"] == "0"
+
+    assert client.post("/messages/", json={"user_message": "x"}, headers=ana).status_code == 429
+    assert client.post("/messages/", json={"user_message": "x"}, headers=bob).status_code == 201
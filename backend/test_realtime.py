@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+from app import realtime
+
+
+def test_writes_are_pushed_to_websocket_clients(client, auth_headers):
+    headers = auth_headers()
+    with client.websocket_connect("/ws/feed") as ws:
+        created = client.post("/messages/", json={"user_message": "hola"}, headers=headers)
+        message_id = created.json()["id"]
+        event = json.loads(ws.receive_text())
+        assert event == {"type": "message.created", "data": created.json()}
+
+        client.post(
+            "/comments/", json={"message_id": message_id, "comment": "c"}, headers=headers
+        )
+        assert json.loads(ws.receive_text())["type"] == "comment.created"
+
+        client.delete(f"/messages/{message_id}", headers=headers)
+        event = json.loads(ws.receive_text())
+        assert event["type"] == "message.deleted"
+        assert event["data"]["id"] == message_id
+
+
+def test_slow_subscriber_is_dropped():
+    hub = realtime.FeedHub(queue_size=2)
+
+    async def scenario():
+        slow = hub.subscribe()
+        fast = hub.subscribe()
+        for i in range(3):
+            hub.broadcast(str(i))
+            if not fast.empty():
+                fast.get_nowait()
+        assert slow not in hub.subscribers
+        assert slow.get_nowait() is realtime.OVERFLOW
+        assert fast in hub.subscribers
+
+    asyncio.run(scenario())
+
+
+def test_large_events_are_slimmed_for_notify():
+    sent = []
+
+    class FakeConnection:
+        def is_closed(self):
+            return False
+
+        async def execute(self, query, channel, payload):
+            sent.append(json.loads(payload))
+
+    bridge = realtime.PostgresBridge(realtime.FeedHub(), "postgresql://u:p@h/d")
+    bridge.connection = FakeConnection()
+    data = {"id": 1, "user_id": 2, "user_message": "x" * 9000}
+    payload = json.dumps({"type": "message.created", "data": data})
+    assert asyncio.run(bridge.notify("message.created", data, payload))
+    assert sent == [{"type": "message.created", "data": {"id": 1, "user_id": 2}, "partial": True}]
+
+
+def test_bridge_connects_in_the_background(monkeypatch):
+    attempts = []
+
+    async def unreachable():
+        attempts.append(1)
+        # Like asyncpg.connect to a host that does not answer
+        await asyncio.Event().wait()
+
+    async def scenario():
+        bridge = realtime.PostgresBridge(realtime.FeedHub(), "postgresql://u:p@h/d")
+        monkeypatch.setattr(bridge, "_connect", unreachable)
+        await asyncio.wait_for(bridge.start(), 0.5)
+        await asyncio.sleep(0)
+        assert attempts == [1]
+        # Nothing listening yet: the caller falls back to a local broadcast
+        assert not await bridge.notify("message.created", {}, "{}")
+        await bridge.stop()
+
+    asyncio.run(scenario())
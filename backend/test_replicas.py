@@ -0,0 +1,111 @@
+import pytest
+from sqlalchemy import event
+
+from app import database, feed_cache, main
+
+
+@pytest.fixture
+def replica_set(client, monkeypatch):
+    # Cached feed pages would hide which database served the read
+    monkeypatch.setattr(feed_cache, "backend", None)
+    replica_set = database.ReplicaSet(
+        [database.SQLALCHEMY_DATABASE_URL], health_interval=0, sticky_seconds=60
+    )
+    monkeypatch.setattr(main, "replicas", replica_set)
+    yield replica_set
+    for replica in replica_set.replicas:
+        replica.engine.dispose()
+
+
+def queries_on(engine):
+    statements = []
+    event.listen(
+        engine, "before_cursor_execute", lambda conn, cur, stmt, *a: statements.append(stmt)
+    )
+    return statements
+
+
+def test_anonymous_reads_go_to_replica(client, seed, replica_set):
+    seed(users=1, messages=2)
+    on_replica = queries_on(replica_set.replicas[0].engine)
+    assert len(client.get("/messages/").json()) == 2
+    assert on_replica
+
+
+def test_author_reads_primary_after_writing(client, auth_headers, replica_set):
+    headers = auth_headers()
+    on_replica = queries_on(replica_set.replicas[0].engine)
+    client.post("/messages/", json={"user_message": "recién escrito"}, headers=headers)
+
+    feed = client.get("/messages/", headers=headers).json()
+    assert feed[0]["user_message"] == "recién escrito"
+    assert on_replica == []
+
+    client.get("/messages/")
+    assert on_replica
+
+
+def test_only_committed_writes_stick_to_primary(client, auth_headers, replica_set):
+    headers = auth_headers()
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    replica_set._recent_writers.invalidate(user_id)
+
+    missing = client.put("/messages/999", json={"user_message": "x"}, headers=headers)
+    assert missing.status_code == 404
+    assert not replica_set.is_sticky(user_id)
+
+    client.post("/messages/", json={"user_message": "hola"}, headers=headers)
+    assert replica_set.is_sticky(user_id)
+
+
+def test_unhealthy_replica_is_skipped(client, seed, replica_set):
+    seed(users=1, messages=1)
+    replica = replica_set.replicas[0]
+    replica.mark_down()
+    on_replica = queries_on(replica.engine)
+    assert client.get("/messages/").status_code == 200
+    assert on_replica == []
+
+    replica.check()
+    assert replica.healthy
+    assert replica_set.choose() is replica
+
+
+def test_round_robin(client):
+    replica_set = database.ReplicaSet(
+        [database.SQLALCHEMY_DATABASE_URL] * 2, health_interval=0
+    )
+    picks = {replica_set.choose().name for _ in range(4)}
+    assert picks == {"replica0", "replica1"}
+
+
+def test_author_skips_feed_cache_refilled_from_stale_replica(
+    client, auth_headers, replica_set, monkeypatch
+):
+    monkeypatch.setattr(feed_cache, "backend", feed_cache.MemoryFeedCache())
+    headers = auth_headers()
+    client.get("/messages/")
+    key = feed_cache.page_key(0, 100, None)
+    stale = client.portal.call(feed_cache.backend.get, key)
+    assert stale is not None
+
+    client.post("/messages/", json={"user_message": "recién escrito"}, headers=headers)
+    # A lagging replica rebuilt the first page without the new message
+    generation = feed_cache.backend.generation
+    client.portal.call(feed_cache.backend.set, key, stale, generation)
+
+    feed = client.get("/messages/", headers=headers).json()
+    assert feed[0]["user_message"] == "recién escrito"
+    # The page read from the primary replaced the stale one
+    assert client.get("/messages/").json() == feed
+
+
+def test_timeline_reads_do_not_stick_to_primary(client, auth_headers, replica_set):
+    headers = auth_headers()
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+    # The window opened by the signup is over
+    replica_set._recent_writers.invalidate(user_id)
+    on_replica = queries_on(replica_set.replicas[0].engine)
+    assert client.get("/timeline/", headers=headers).status_code == 200
+    assert not replica_set.is_sticky(user_id)
+    assert on_replica
@@ -0,0 +1,63 @@
+import pytest
+
+from app import instrumentation
+
+COMMENTS_ROUTE = "/messages/{message_id}/comments/"
+
+
+def test_route_latency_and_statements(client, auth_headers):
+    headers = auth_headers()
+    message = client.post("/messages/", json={"user_message": "hola"}, headers=headers)
+    message_id = message.json()["id"]
+
+    before = instrumentation.request_statements.count(route=COMMENTS_ROUTE)
+    statements = instrumentation.request_statements.total(route=COMMENTS_ROUTE)
+    client.get(f"/messages/{message_id}/comments/")
+    client.get(f"/messages/{message_id}/comments/")
+    assert instrumentation.request_statements.count(route=COMMENTS_ROUTE) == before + 2
+    assert instrumentation.request_statements.total(route=COMMENTS_ROUTE) == statements + 2
+    assert instrumentation.request_db_time.total(route=COMMENTS_ROUTE) > 0
+
+    client.get("/nada")
+    body = client.get("/metrics").text
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        f'route="{COMMENTS_ROUTE}",status="200"}}'
+    ) in body
+    assert 'route="unmatched",status="404"' in body
+    assert 'http_request_db_statements_bucket{route="/messages/",le="1"}' in body
+
+
+def test_slow_queries_are_sampled_without_literals(client, monkeypatch, caplog):
+    monkeypatch.setattr(instrumentation, "SLOW_QUERY_MS", 0)
+    before = instrumentation.slow_queries.value(route="/messages/")
+    client.get("/messages/?limit=7")
+    assert instrumentation.slow_queries.value(route="/messages/") > before
+    assert "Slow query" in caplog.text
+
+    body = client.get("/metrics").text
+    assert 'db_slow_query_seconds{route="/messages/",statement="SELECT messages.id' in body
+
+
+def test_redact_hides_literals():
+    statement = "SELECT * FROM t1 WHERE name = 'o''brien' AND id = 42 AND x = $1\n LIMIT ?"
+    assert instrumentation.redact(statement) == (
+        "SELECT * FROM t1 WHERE name = ? AND id = ? AND x = $1 LIMIT ?"
+    )
+
+
+def test_crud_calls_are_spans(client, monkeypatch):
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter,
+    )
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(instrumentation, "tracer", provider.get_tracer("test"))
+
+    client.get("/messages/")
+    assert "crud.get_messages" in [span.name for span in exporter.get_finished_spans()]
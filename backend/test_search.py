@@ -0,0 +1,69 @@
+import base64
+
+
+def test_search_ranks_and_paginates(client, auth_headers):
+    headers = auth_headers()
+    texts = [
+        "el café de la mañana",
+        "café, café y más café",
+        "hoy llueve",
+        "un cafe sin tilde también cuenta",
+    ]
+    for text in texts:
+        client.post("/messages/", json={"user_message": text}, headers=headers)
+
+    hits = client.get("/search", params={"q": "café"}).json()
+    assert {hit["text"] for hit in hits} == set(texts) - {"hoy llueve"}
+    assert hits[0]["text"] == "café, café y más café"
+    assert [hit["rank"] for hit in hits] == sorted(
+        (hit["rank"] for hit in hits), reverse=True
+    )
+
+    seen, cursor = [], None
+    for _ in range(len(hits)):
+        params = {"q": "café", "limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/search", params=params)
+        seen += [hit["id"] for hit in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [hit["id"] for hit in hits]
+
+
+def test_search_follows_writes(client, auth_headers):
+    headers = auth_headers()
+    message_id = client.post(
+        "/messages/", json={"user_message": "hola mundo"}, headers=headers
+    ).json()["id"]
+    comment_id = client.post(
+        "/comments/", json={"message_id": message_id, "comment": "qué buen post"},
+        headers=headers,
+    ).json()["id"]
+
+    hits = client.get("/search", params={"q": "post", "type": "comments"}).json()
+    assert [(h["id"], h["message_id"]) for h in hits] == [(comment_id, message_id)]
+
+    client.put(f"/messages/{message_id}", json={"user_message": "adiós"}, headers=headers)
+    assert client.get("/search", params={"q": "mundo"}).json() == []
+    assert len(client.get("/search", params={"q": "adiós"}).json()) == 1
+
+    client.delete(f"/messages/{message_id}", headers=headers)
+    assert client.get("/search", params={"q": "adiós"}).json() == []
+    assert client.get("/search", params={"q": "post", "type": "comments"}).json() == []
+
+
+def test_search_input_is_not_query_syntax(client, auth_headers):
+    headers = auth_headers()
+    client.post("/messages/", json={"user_message": 'dijo "hola" OR NOT'}, headers=headers)
+    assert client.get("/search", params={"q": '"hola" OR ('}).status_code == 200
+    assert client.get("/search", params={"q": "x", "cursor": "basura"}).status_code == 400
+
+
+def test_search_rejects_out_of_range_cursor(client, auth_headers):
+    client.post("/messages/", json={"user_message": "café"}, headers=auth_headers())
+    for raw in ('{"r":1e400,"i":1}', '{"r":1.5,"i":1e400}', f'{{"r":1,"i":{2**64}}}'):
+        cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+        response = client.get("/search", params={"q": "café", "cursor": cursor})
+        assert response.status_code == 400, raw
@@ -0,0 +1,63 @@
+from sqlalchemy import text
+
+from app.database import engine
+
+
+def walk(client, path, limit):
+    seen, params = [], {"limit": limit}
+    for _ in range(50):
+        response = client.get(path, params=params)
+        assert response.status_code == 200
+        seen.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return seen
+        params = {"limit": limit, "cursor": cursor}
+    raise AssertionError("pagination did not terminate")
+
+
+def test_user_timelines_only_contain_that_user(client, auth_headers):
+    ana, bob = auth_headers(user_name="ana"), auth_headers(user_name="bob")
+    ana_id = client.get("/users/me/", headers=ana).json()["id"]
+    ana_messages, bob_messages = [], []
+    for i in range(5):
+        for headers, ids in ((ana, ana_messages), (bob, bob_messages)):
+            ids.append(
+                client.post(
+                    "/messages/", json={"user_message": f"post {i}"}, headers=headers
+                ).json()["id"]
+            )
+    ana_comments = [
+        client.post(
+            "/comments/", json={"message_id": message_id, "comment": "c"}, headers=ana
+        ).json()["id"]
+        for message_id in bob_messages
+    ]
+
+    assert walk(client, f"/users/{ana_id}/messages/", 2) == ana_messages[::-1]
+    assert walk(client, f"/users/{ana_id}/comments/", 2) == ana_comments[::-1]
+
+
+def test_unknown_user_is_not_found(client, auth_headers):
+    user_id = client.get("/users/me/", headers=auth_headers()).json()["id"]
+    assert client.get(f"/users/{user_id}/messages/").json() == []
+    assert client.get("/users/999/messages/").status_code == 404
+    assert client.get("/users/999/comments/").status_code == 404
+
+
+def test_timeline_queries_use_indexes(client):
+    plans = {
+        "SELECT id FROM messages WHERE user_id = 1 "
+        "ORDER BY created_at DESC, id DESC LIMIT 20": "ix_messages_user_id_created_at_id",
+        "SELECT id FROM comments WHERE message_id = 1 "
+        "ORDER BY created_at": "ix_comments_message_id_created_at",
+        "SELECT id FROM comments WHERE user_id = 1 "
+        "ORDER BY created_at DESC, id DESC LIMIT 20": "ix_comments_user_id_created_at_id",
+    }
+    with engine.connect() as conn:
+        for query, index in plans.items():
+            plan = " ".join(
+                row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {query}"))
+            )
+            assert index in plan
+            assert "TEMP B-TREE" not in plan
@@ -0,0 +1,91 @@
+"""Statements and latency per write. Run with -s to see the comparison with the
+old commit()+refresh() path:
+
+    python -m pytest -s test_write_roundtrips.py
+"""
+import itertools
+import statistics
+import time
+
+from app import crud, models, schemas
+from app.database import SessionLocal
+
+
+def measure(count_queries, write, repeat=30):
+    samples, statements = [], None
+    for _ in range(repeat):
+        with count_queries() as executed:
+            started = time.perf_counter()
+            write()
+            samples.append((time.perf_counter() - started) * 1000)
+        statements = len(executed)
+    return statements, statistics.median(samples)
+
+
+def test_each_write_is_a_single_statement(client, seed, count_queries):
+    (user_id,), (message_id,) = seed(users=1, messages=1)
+    db = SessionLocal()
+    comment = crud.create_comment(
+        db, schemas.CommentCreate(message_id=message_id, comment="c"), user_id
+    )
+    edits = itertools.count()
+
+    # What the writes used to do: commit, then SELECT the row back; updates
+    # also loaded the row first to check ownership
+    def legacy_create(write):
+        def run():
+            obj = write()
+            db.expire(obj)
+            db.refresh(obj)
+
+        return run
+
+    def legacy_update(model, pk, field):
+        def run():
+            obj = db.get(model, pk, populate_existing=True)
+            setattr(obj, field, f"editado {next(edits)}")
+            db.commit()
+            db.expire(obj)
+            db.refresh(obj)
+
+        return run
+
+    def new_message():
+        return crud.create_message(db, schemas.MessageCreate(user_message="m"), user_id)
+
+    def new_comment():
+        return crud.create_comment(
+            db, schemas.CommentCreate(message_id=message_id, comment="c"), user_id
+        )
+
+    writes = {
+        "create_message": (new_message, legacy_create(new_message)),
+        "update_message": (
+            lambda: crud.update_message(
+                db, message_id, user_id, f"editado {next(edits)}"
+            ),
+            legacy_update(models.Message, message_id, "user_message"),
+        ),
+        "create_comment": (new_comment, legacy_create(new_comment)),
+        "update_comment": (
+            lambda: crud.update_comment(
+                db, comment.id, user_id, f"editado {next(edits)}"
+            ),
+            legacy_update(models.Comment, comment.id, "comment"),
+        ),
+    }
+
+    print(f"\n{'write':<16} {'stmts':>5} {'ms':>7} {'old stmts':>9} {'old ms':>7}")
+    for name, (write, old_write) in writes.items():
+        statements, latency = measure(count_queries, write)
+        old_statements, old_latency = measure(count_queries, old_write)
+        print(
+            f"{name:<16} {statements:>5} {latency:>7.3f}"
+            f" {old_statements:>9} {old_latency:>7.3f}"
+        )
+        assert statements == 1
+        assert old_statements > 1
+
+    # Server defaults are populated without a refresh
+    assert new_message().created_at is not None
+    db.close()
@@ -53,8 +53,17 @@ export const api = {
     createMessage: (data) => fetchApi('/messages/', { method: 'POST', body: JSON.stringify(data) }),
     updateMessage: (id, data) => fetchApi(`/messages/${id}`, { method: 'PUT', body: JSON.stringify(data) }),
     deleteMessage: (id) => fetchApi(`/messages/${id}`, { method: 'DELETE' }),
+    getUserMessages: (userId, cursor) => fetchApi(`/users/${userId}/messages/${cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''}`),
+    getUserComments: (userId, cursor) => fetchApi(`/users/${userId}/comments/${cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''}`),
+    getTimeline: (cursor) => fetchApi(`/timeline/${cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''}`),
+    followUser: (userId) => fetchApi(`/users/${userId}/follow`, { method: 'POST' }),
+    unfollowUser: (userId) => fetchApi(`/users/${userId}/follow`, { method: 'DELETE' }),
     getComments: (messageId) => fetchApi(`/messages/${messageId}/comments/`),
+    getCommentsBatch: (messageIds, limit = 20) => fetchApi(`/comments/?message_ids=${messageIds.join(',')}&limit=${limit}`),
     createComment: (data) => fetchApi('/comments/', { method: 'POST', body: JSON.stringify(data) }),
     updateComment: (id, data) => fetchApi(`/comments/${id}`, { method: 'PUT', body: JSON.stringify(data) }),
     deleteComment: (id) => fetchApi(`/comments/${id}`, { method: 'DELETE' }),
 };
+
+// Real-time feed events: { type: 'message.created' | 'comment.deleted' | ..., data }
+export const openFeedSocket = () => new WebSocket(`${API_BASE.replace(/^http/, 'ws')}/ws/feed`);
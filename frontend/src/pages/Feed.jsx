@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useAuth } from '../contexts/AuthContext';
-import { api } from '../lib/api';
+import { api, openFeedSocket } from '../lib/api';
 import { Send, Trash2, Edit2, MessageSquare, Plus, X, LogOut, Loader2 } from 'lucide-react';
 
 const CommentItem = ({ comment, messageId, currentUser, onUpdate, onDelete }) => {
@@ -69,7 +69,10 @@ const CommentItem = ({ comment, messageId, currentUser, onUpdate, onDelete }) =>
 };
 
 
-const MessageItem = ({ message, currentUser, onUpdateMessage, onDeleteMessage }) => {
+// Comments prefetched per message in one request; longer threads load on demand
+const COMMENTS_PREFETCH_LIMIT = 20;
+
+const MessageItem = ({ message, currentUser, prefetchedComments, onUpdateMessage, onDeleteMessage }) => {
     const [isEditing, setIsEditing] = useState(false);
     const [editContent, setEditContent] = useState(message.user_message);
 
@@ -94,7 +97,16 @@ const MessageItem = ({ message, currentUser, onUpdateMessage, onDeleteMessage })
     };
 
     const toggleComments = () => {
-        if (!showComments) loadComments();
+        if (!showComments) {
+            if (message.comment_count === 0) {
+                setComments([]);
+            } else if (prefetchedComments && prefetchedComments.length >= message.comment_count) {
+                // The prefetch (kept in sync by the socket) already holds the whole thread
+                setComments(prefetchedComments);
+            } else {
+                loadComments();
+            }
+        }
         setShowComments(!showComments);
     };
 
@@ -125,7 +137,7 @@ const MessageItem = ({ message, currentUser, onUpdateMessage, onDeleteMessage })
         if (!newComment.trim()) return;
         try {
             const added = await api.createComment({ message_id: message.id, comment: newComment });
-            setComments([...comments, added]);
+            setComments(prev => prev.some(c => c.id === added.id) ? prev : [...prev, added]);
             setNewComment("");
         } catch (err) {
             alert(`Error agregando el comentario: ${err.message}`);
@@ -133,11 +145,11 @@ const MessageItem = ({ message, currentUser, onUpdateMessage, onDeleteMessage })
     };
 
     const updateCommentState = (commentId, updatedComment) => {
-        setComments(comments.map(c => c.id === commentId ? updatedComment : c));
+        setComments(prev => prev.map(c => c.id === commentId ? updatedComment : c));
     };
 
     const deleteCommentState = (commentId) => {
-        setComments(comments.filter(c => c.id !== commentId));
+        setComments(prev => prev.filter(c => c.id !== commentId));
     };
 
     return (
@@ -184,7 +196,7 @@ const MessageItem = ({ message, currentUser, onUpdateMessage, onDeleteMessage })
             <div className="bg-slate-50 border-t border-slate-100 px-5 py-3 flex justify-between items-center cursor-pointer hover:bg-slate-100/70 transition-colors" onClick={toggleComments}>
                 <div className="flex items-center space-x-2 text-slate-600 text-sm font-medium">
                     <MessageSquare className="w-4 h-4" />
-                    <span>{showComments ? 'Ocultar comentarios' : 'Ver comentarios'}</span>
+                    <span>{showComments ? 'Ocultar comentarios' : `Ver comentarios (${message.comment_count ?? 0})`}</span>
                 </div>
             </div>
 
@@ -237,6 +249,7 @@ const MessageItem = ({ message, currentUser, onUpdateMessage, onDeleteMessage })
 export const Feed = () => {
     const { user, logout } = useAuth();
     const [messages, setMessages] = useState([]);
+    const [commentsByMessage, setCommentsByMessage] = useState({});
     const [newMessage, setNewMessage] = useState("");
     const [loading, setLoading] = useState(true);
 
@@ -244,11 +257,47 @@ export const Feed = () => {
         loadMessages();
     }, []);
 
+    // Live updates instead of re-fetching the whole feed
+    useEffect(() => {
+        const socket = openFeedSocket();
+        socket.onmessage = (e) => {
+            const { type, data } = JSON.parse(e.data);
+            if (type === 'message.created') {
+                setMessages(prev => prev.some(m => m.id === data.id) ? prev : [data, ...prev]);
+            } else if (type === 'message.updated') {
+                setMessages(prev => prev.map(m => m.id === data.id ? { ...m, ...data } : m));
+            } else if (type === 'message.deleted') {
+                setMessages(prev => prev.filter(m => m.id !== data.id));
+            } else if (type.startsWith('comment.')) {
+                if (type === 'comment.created' || type === 'comment.deleted') {
+                    const delta = type === 'comment.created' ? 1 : -1;
+                    setMessages(prev => prev.map(m => m.id === data.message_id
+                        ? { ...m, comment_count: (m.comment_count ?? 0) + delta }
+                        : m));
+                }
+                setCommentsByMessage(prev => {
+                    const current = (prev[data.message_id] || []).filter(c => c.id !== data.id);
+                    return {
+                        ...prev,
+                        [data.message_id]: type === 'comment.deleted' ? current : [...current, data],
+                    };
+                });
+            }
+        };
+        return () => socket.close();
+    }, []);
+
     const loadMessages = async () => {
         try {
             const data = await api.getMessages();
             // Assume latest first
             setMessages(data.reverse());
+            // comment_count tells which posts have a thread worth prefetching
+            const withComments = data.filter(m => m.comment_count > 0).map(m => m.id);
+            if (withComments.length > 0) {
+                const grouped = await api.getCommentsBatch(withComments, COMMENTS_PREFETCH_LIMIT);
+                setCommentsByMessage(grouped);
+            }
         } catch (err) {
             console.error(err);
         } finally {
@@ -261,7 +310,8 @@ export const Feed = () => {
         if (!newMessage.trim()) return;
         try {
             const added = await api.createMessage({ user_message: newMessage });
-            setMessages([added, ...messages]);
+            // The socket's message.created may have arrived before this response
+            setMessages(prev => prev.some(m => m.id === added.id) ? prev : [added, ...prev]);
             setNewMessage("");
         } catch (err) {
             alert("Error publicando el mensaje");
@@ -269,11 +319,11 @@ export const Feed = () => {
     };
 
     const updateMessageState = (msgId, updatedMsg) => {
-        setMessages(messages.map(m => m.id === msgId ? updatedMsg : m));
+        setMessages(prev => prev.map(m => m.id === msgId ? updatedMsg : m));
     };
 
     const deleteMessageState = (msgId) => {
-        setMessages(messages.filter(m => m.id !== msgId));
+        setMessages(prev => prev.filter(m => m.id !== msgId));
     };
 
     return (
@@ -342,6 +392,7 @@ export const Feed = () => {
                                 key={msg.id}
                                 message={msg}
                                 currentUser={user}
+                                prefetchedComments={commentsByMessage[msg.id]}
                                 onUpdateMessage={updateMessageState}
                                 onDeleteMessage={deleteMessageState}
                             />